@@ -0,0 +1,73 @@
+import asyncio
+
+from google.genai import errors
+
+from functions.tracing import span
+from main import AIAssistant, MODEL_NAME
+
+# Status codes worth retrying: rate limiting and transient server overload
+RETRYABLE_STATUS_CODES = {429, 500, 503}
+MAX_RETRIES = 4
+RETRY_BASE_DELAY = 1.0
+
+
+class AsyncAIAssistant(AIAssistant):
+    """AI Assistant running the agent loop on the async Gemini client."""
+
+    async def _generate_content(self):
+        """Call the async generate_content API, backing off on rate limits."""
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                with self._model_span() as model_span:
+                    model_span.set(attempt=attempt + 1)
+                    response = await self.client.aio.models.generate_content(
+                        model=MODEL_NAME,
+                        contents=self._request_contents(),
+                        config=self._create_config()
+                    )
+                    self._trace_response(model_span, response)
+                return response
+            except errors.APIError as e:
+                if e.code not in RETRYABLE_STATUS_CODES or attempt == MAX_RETRIES:
+                    raise
+                delay = RETRY_BASE_DELAY * 2 ** attempt
+                self._log(f"API returned {e.code}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def generate_response(self, user_prompt: str) -> str:
+        """Generate response for user prompt, handling function calls if needed."""
+        with span("prompt", "agent", prompt=user_prompt) as prompt_span:
+            self._start_conversation(user_prompt)
+
+            while not self.budget.exhausted():
+                iteration = self.budget.turns + 1
+                self._log(f"Iteration {iteration}")
+                prompt_span.set(iterations=iteration)
+                memo_before = (self.memo.repeats, self.memo.progress)
+                response = None
+
+                try:
+                    self._compact_context()
+                    response = await self._generate_content()
+
+                    self._record_response(response)
+
+                    # Tools are blocking file and process operations, keep them off the event loop
+                    if response.function_calls:
+                        self._log("Function calls detected, processing...")
+                        await asyncio.to_thread(self._handle_function_calls, response)
+                    else:
+                        final_text = self._extract_final_text(response)
+                        if final_text:
+                            return final_text
+
+                except Exception as e:
+                    self._log(f"Error in iteration {iteration}: {e}")
+                    if iteration == 1:
+                        raise
+                    else:
+                        break
+
+                self._end_turn(prompt_span, response, memo_before)
+
+            return self._fallback_response()
@@ -0,0 +1,160 @@
+import asyncio
+import io
+import json
+import os
+import re
+import sys
+import time
+
+from dotenv import load_dotenv
+
+from async_agent import AsyncAIAssistant
+from context_compactor import DEFAULT_CONTEXT_BUDGET
+from main import (
+    MAX_ITERATIONS,
+    REPLAY_FLAG,
+    create_client_from_arguments,
+    get_flag_value,
+    parse_arguments,
+    parse_context_budget,
+    parse_max_iterations,
+    parse_max_workers,
+)
+
+# Constants
+CONCURRENCY_FLAG = "--concurrency"
+OUTPUT_FLAG = "--output"
+DEFAULT_CONCURRENCY = 8
+DEFAULT_OUTPUT = "batch_results.jsonl"
+
+# Matches the example commands in README.md, e.g. python main.py "What files are here?"
+README_COMMAND_PATTERN = re.compile(r'^\s*python main\.py "(.+)"\s*$')
+
+USAGE_MESSAGE = """AI Code Assistant - batch runner
+
+Usage: python batch.py <prompts file> [--concurrency=N] [--output=results.jsonl] [--workers=N]
+                       [--context-budget=N] [--max-iterations=N] [--record=FILE | --replay=FILE]
+                       [--base-url=URL] [--verbose]
+
+The prompts file is either JSONL with a "prompt" (and optional "id" and
+"working_dir", the directory that prompt's tools run in) per line,
+a markdown file whose `python main.py "..."` commands are run (e.g. README.md),
+or plain text with one prompt per line (blank lines and # comments are skipped).
+"""
+
+
+def load_prompts(path: str) -> list[dict]:
+    """Load prompts from a JSONL, README-style or plain text file."""
+    with open(path, 'r') as file:
+        lines = file.read().splitlines()
+
+    if path.endswith(".jsonl"):
+        prompts = []
+        for line in lines:
+            if line.strip():
+                record = json.loads(line)
+                working_dir = record.get("working_dir")
+                if working_dir is not None and not os.path.isdir(working_dir):
+                    raise ValueError(f"Working directory {working_dir!r} of prompt {record.get('id')!r} "
+                                     f"is not a directory")
+                prompts.append({"id": record.get("id", len(prompts) + 1), "prompt": record["prompt"],
+                                "working_dir": working_dir})
+        return prompts
+
+    commands = [match.group(1) for match in map(README_COMMAND_PATTERN.match, lines) if match]
+    if commands:
+        texts = commands
+    else:
+        texts = [line.strip() for line in lines if line.strip() and not line.lstrip().startswith("#")]
+    return [{"id": i, "prompt": text} for i, text in enumerate(texts, 1)]
+
+
+async def run_prompt(client, item: dict, semaphore: asyncio.Semaphore, verbose: bool, max_workers: int,
+                     context_budget: int, max_iterations: int = MAX_ITERATIONS) -> dict:
+    """Run one conversation under the concurrency cap and return its result record."""
+    async with semaphore:
+        output = io.StringIO()
+        assistant = AsyncAIAssistant(None, verbose, max_workers, client=client, output=output,
+                                     context_budget=context_budget, max_iterations=max_iterations,
+                                     working_dir=item.get("working_dir"))
+        start = time.perf_counter()
+        record = {"id": item["id"], "prompt": item["prompt"]}
+        try:
+            record["response"] = await assistant.generate_response(item["prompt"])
+            record["error"] = None
+        except Exception as e:
+            record["response"] = None
+            record["error"] = f"{type(e).__name__}: {e}"
+        record["elapsed_s"] = round(time.perf_counter() - start, 3)
+        record["context_tokens_saved"] = assistant.context.tokens_saved
+        record["wasted_turns"] = assistant.budget.wasted_turns
+        record["repeated_calls"] = assistant.memo.repeats
+        record["output"] = output.getvalue()
+        return record
+
+
+async def run_batch(client, prompts: list[dict], output_path: str, concurrency: int,
+                    verbose: bool = False, max_workers: int = 1,
+                    context_budget: int = DEFAULT_CONTEXT_BUDGET, max_iterations: int = MAX_ITERATIONS) -> int:
+    """Run all prompts with at most `concurrency` conversations in flight; return the failure count."""
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = [
+        asyncio.create_task(run_prompt(client, item, semaphore, verbose, max_workers, context_budget,
+                                       max_iterations))
+        for item in prompts
+    ]
+    failures = 0
+
+    # Results are written as they complete so a partial run still leaves usable output
+    with open(output_path, 'w') as output_file:
+        for completed in asyncio.as_completed(tasks):
+            record = await completed
+            failures += record["error"] is not None
+            output_file.write(json.dumps(record) + "\n")
+            output_file.flush()
+            status = "error" if record["error"] else "ok"
+            print(f"[{status}] #{record['id']} ({record['elapsed_s']}s) {record['prompt']}")
+    return failures
+
+
+def main():
+    """Batch entry point."""
+    load_dotenv()
+
+    args, verbose = parse_arguments()
+    if not args:
+        print(USAGE_MESSAGE)
+        sys.exit(1)
+
+    try:
+        client = create_client_from_arguments()
+        max_workers = parse_max_workers()
+        context_budget = parse_context_budget()
+        max_iterations = parse_max_iterations()
+        concurrency = int(get_flag_value(CONCURRENCY_FLAG, str(DEFAULT_CONCURRENCY)))
+        if concurrency < 1:
+            raise ValueError(f"{CONCURRENCY_FLAG} must be at least 1, got {concurrency}")
+        output_path = get_flag_value(OUTPUT_FLAG, DEFAULT_OUTPUT)
+        prompts = load_prompts(args[0])
+        texts = [item["prompt"] for item in prompts]
+        if get_flag_value(REPLAY_FLAG) and concurrency > 1 and len(set(texts)) < len(texts):
+            # Replayed responses are matched to conversations by their first message
+            raise ValueError(f"a prompt appears more than once, so concurrent replays could swap their "
+                             f"responses; use {CONCURRENCY_FLAG}=1")
+    except (ValueError, OSError) as e:
+        print(f"Configuration error: {e}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    failures = asyncio.run(run_batch(client, prompts, output_path, concurrency, verbose, max_workers,
+                                     context_budget, max_iterations))
+    elapsed = time.perf_counter() - start
+
+    print(f"Ran {len(prompts)} prompts in {elapsed:.1f}s with concurrency {concurrency}; "
+          f"{failures} failed. Results written to {output_path}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,481 @@
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from main import AIAssistant, get_flag_value
+from result_shaper import ResultShaper
+
+# The calculator package is imported as `pkg`, the way calculator/main.py sees it
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "calculator"))
+
+# Constants
+OUTPUT_FLAG = "--output"
+COMPARE_FLAG = "--compare"
+THRESHOLD_FLAG = "--threshold"
+ONLY_FLAG = "--only"
+QUICK_FLAG = "--quick"
+FULL_FLAG = "--full"
+DEFAULT_OUTPUT = "bench_results.json"
+DEFAULT_THRESHOLD = 0.20
+
+KB = 1024
+MB = 1024 * KB
+GB = 1024 * MB
+
+USAGE_MESSAGE = """Benchmark suite
+
+Usage: python benchmarks.py [--only=group,...] [--quick | --full] [--output=bench_results.json]
+                            [--compare=baseline.json] [--threshold=0.2]
+
+Groups: calculator, files_info, file_content, search_code, run_python, agent_loop, cli
+--quick uses smaller inputs, --full adds the 1 GB get_file_content and
+100k-file search_code cases.
+With --compare, results slower than the baseline by more than the threshold
+(a fraction, default 0.2) are reported as regressions and the exit code is 1.
+"""
+
+
+def measure(fn, repeat: int = 5, min_time: float = 0.05) -> dict:
+    """Time fn, looping enough per sample to run for at least min_time seconds."""
+    fn()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2 if elapsed == 0 else max(2, int(min_time / elapsed) + 1)
+
+    samples = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    return {
+        "seconds": statistics.median(samples),
+        "min_seconds": min(samples),
+        "loops": number,
+        "repeat": repeat,
+    }
+
+
+def bench_calculator(quick: bool) -> dict:
+    from pkg import calculator
+    from pkg.render import render
+
+    results = {}
+    expressions = {
+        "simple": "3 + 5",
+        "nested": "2 * ( 3 + 4 ) / 2 - ( 8 - 3 ) * 7",
+        "long": " + ".join(f"( {i} * {i + 1} / 3 )" for i in range(50)),
+    }
+    for name, expression in expressions.items():
+        results[f"evaluate/{name}/cached"] = measure(lambda: calculator.evaluate(expression))
+
+        def uncached():
+            calculator.cache_clear()
+            calculator.evaluate(expression)
+        results[f"evaluate/{name}/uncached"] = measure(uncached)
+
+    results["render/simple"] = measure(lambda: render("3 + 5", 8))
+    results["render/long"] = measure(lambda: render(expressions["long"], 123456789))
+
+    # Streaming evaluation keeps only the stacks, however long the input is
+    streamed = _make_expression(MB)
+    results["evaluate_stream/string/1MB"] = measure(lambda: calculator.evaluate_stream(streamed), repeat=3)
+    tracemalloc.start()
+    calculator.evaluate_stream(streamed)
+    results["evaluate_stream/string/1MB"]["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    label, size = ("10MB", 10 * MB) if quick else ("100MB", 100 * MB)
+    root = tempfile.mkdtemp(prefix="bench_expression_")
+    try:
+        path = os.path.join(root, "expression.txt")
+        unit = _make_expression(MB)
+        with open(path, 'w') as file:
+            for _ in range(size // len(unit)):
+                file.write(unit + " + ")
+            file.write("1\n")
+
+        def from_file():
+            with open(path, 'r') as file:
+                calculator.evaluate_stream(file)
+
+        results[f"evaluate_stream/file/{label}"] = measure(from_file, repeat=1, min_time=0)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    # Line streaming mode of calculator/main.py; both CLIs are called main, so it is loaded by path
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(
+        "calculator_main", os.path.join(os.path.dirname(os.path.abspath(__file__)), "calculator", "main.py"))
+    calculator_main = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(calculator_main)
+
+    count = 20000 if quick else 100000
+    distinct = [f"{i} * ( {i % 97} + 3 ) - {i % 13} / 2" for i in range(count)]
+    # 500 expressions, each seen count / 500 times
+    inputs = {"distinct": distinct, "repeated": [distinct[i % 500] for i in range(count)]}
+    for name, lines in inputs.items():
+        for output_format in ("compact", "box"):
+            def run():
+                calculator.cache_clear()
+                calculator_main.evaluate_lines(lines, io.StringIO(), output_format == "compact")
+            key = f"evaluate_lines/{name}/{output_format}/{count}"
+            results[key] = measure(run, repeat=3, min_time=0)
+            results[key]["lines_per_s"] = round(count / results[key]["seconds"])
+    return results
+
+
+def _make_expression(size: int) -> str:
+    """A well-formed expression of about size characters, nested a few levels deep."""
+    unit = "( 12 + 34 * ( 5 - 6 ) / 7 ) * 2 - 3"
+    return " + ".join([unit] * (size // (len(unit) + 3)))
+
+
+def _make_tree(root: str, files: int, per_dir: int = 100) -> None:
+    for i in range(files):
+        directory = os.path.join(root, f"d{i // (per_dir * 10)}", f"s{i // per_dir}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"f{i}.py"), 'w') as file:
+            file.write("x = 1\n")
+
+
+def bench_files_info(quick: bool) -> dict:
+    from functions import tree_index
+    from functions.get_files_info import get_files_info
+
+    results = {}
+    sizes = [100, 1000] if quick else [100, 1000, 10000, 50000]
+    for size in sizes:
+        root = tempfile.mkdtemp(prefix="bench_tree_")
+        try:
+            _make_tree(root, size)
+            flat = os.path.join(root, "flat")
+            os.makedirs(flat)
+            for i in range(min(size, 2000)):
+                open(os.path.join(flat, f"f{i}.txt"), 'w').close()
+
+            def cold_recursive():
+                tree_index._indexes.clear()
+                get_files_info(root, ".", recursive=True)
+
+            results[f"get_files_info/recursive_cold/{size}"] = measure(cold_recursive, repeat=3)
+            results[f"get_files_info/recursive_warm/{size}"] = measure(
+                lambda: get_files_info(root, ".", recursive=True))
+            results[f"get_files_info/flat/{min(size, 2000)}"] = measure(lambda: get_files_info(root, "flat"))
+
+            # What the listing costs in the prompt, as sent before and after result shaping
+            listing = get_files_info(root, "flat")
+            shaper = ResultShaper(byte_budget=0)
+            name = f"result_shaping/flat/{min(size, 2000)}"
+            results[name] = measure(lambda: shaper.shape("get_files_info", listing))
+            _, results[name]["raw_tokens"], results[name]["tokens"] = shaper.shape("get_files_info", listing)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+            tree_index._indexes.clear()
+    return results
+
+
+def _write_file(path: str, size: int) -> None:
+    line = b"The quick brown fox jumps over the lazy dog 0123456789\n"
+    block = line * (MB // len(line) + 1)
+    with open(path, 'wb') as file:
+        remaining = size
+        while remaining > 0:
+            chunk = block[:min(remaining, len(block))]
+            file.write(chunk)
+            remaining -= len(chunk)
+
+
+def bench_file_content(quick: bool, full: bool) -> dict:
+    from functions import get_file_content as module
+
+    results = {}
+    sizes = [("1KB", KB), ("1MB", MB)]
+    if not quick:
+        sizes.append(("100MB", 100 * MB))
+    if full:
+        sizes.append(("1GB", GB))
+    root = tempfile.mkdtemp(prefix="bench_files_")
+    try:
+        for label, size in sizes:
+            path = os.path.join(root, f"{label}.txt")
+            _write_file(path, size)
+            repeat = 3 if size >= 100 * MB else 5
+
+            def cold():
+                module._count_lines.cache_clear()
+                module.get_file_content(root, f"{label}.txt")
+
+            results[f"get_file_content/first_page_cold/{label}"] = measure(cold, repeat=repeat)
+            results[f"get_file_content/first_page_warm/{label}"] = measure(
+                lambda: module.get_file_content(root, f"{label}.txt"), repeat=repeat)
+            results[f"get_file_content/middle_offset/{label}"] = measure(
+                lambda: module.get_file_content(root, f"{label}.txt", offset=size // 2, length=4 * KB),
+                repeat=repeat)
+            os.remove(path)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+SOURCE_WORDS = ["parse", "token", "render", "value", "result", "config", "handler", "request"]
+
+
+def _make_source_tree(root: str, files: int, per_dir: int = 100) -> None:
+    """Small Python modules whose function names repeat across files, like a real code base."""
+    for i in range(files):
+        directory = os.path.join(root, f"d{i // (per_dir * 10)}", f"s{i // per_dir}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"m{i}.py"), 'w') as file:
+            file.write(f"# module {i}\nimport os\n\n")
+            for j in range(8):
+                first, second = SOURCE_WORDS[(i + j) % 8], SOURCE_WORDS[(i * 3 + j) % 8]
+                file.write(f"def {first}_{second}_{j}(x):\n    return {second}(x) + {i * 8 + j}\n\n")
+
+
+def bench_search_code(quick: bool, full: bool) -> dict:
+    from functions import code_index, tree_index
+    from functions.search_code import search_code
+
+    results = {}
+    sizes = [1000] if quick else [1000, 10000]
+    if full:
+        sizes.append(100000)
+    for size in sizes:
+        root = tempfile.mkdtemp(prefix="bench_search_")
+        try:
+            _make_source_tree(root, size)
+
+            def build():
+                code_index._indexes.clear()
+                tree_index._indexes.clear()
+                search_code(root, "handler_config_3")
+
+            results[f"search_code/build/{size}"] = measure(build, repeat=1 if size >= 100000 else 3, min_time=0)
+            results[f"search_code/literal_rare/{size}"] = measure(lambda: search_code(root, f"module {size - 1}"))
+            results[f"search_code/literal_common/{size}"] = measure(lambda: search_code(root, "import os"))
+            results[f"search_code/regex/{size}"] = measure(
+                lambda: search_code(root, r"def \w+_request_7\(", regex=True, include="d0/**/*.py"))
+
+            edited = os.path.join("d0", "s0", "m0.py")
+            counter = iter(range(10 ** 9))
+
+            def after_edit():
+                with open(os.path.join(root, edited), 'a') as file:
+                    file.write(f"marker_{next(counter)} = 1\n")
+                tree_index.get_tree_index(root).invalidate(edited)
+                search_code(root, "marker_")
+
+            results[f"search_code/after_edit/{size}"] = measure(after_edit)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+            code_index._indexes.clear()
+            tree_index._indexes.clear()
+    return results
+
+
+def bench_run_python(quick: bool) -> dict:
+    from functions import run_python
+
+    results = {}
+    root = tempfile.mkdtemp(prefix="bench_run_")
+    workdir = os.path.join(root, "work")
+    os.makedirs(workdir)
+    with open(os.path.join(workdir, "hello.py"), 'w') as file:
+        file.write('print("hello")\n')
+    with open(os.path.join(workdir, "flood.py"), 'w') as file:
+        file.write('import sys\nline = "x" * 1023 + "\\n"\nwhile True:\n    sys.stdout.write(line)\n')
+    with open(os.path.join(workdir, "unit.py"), 'w') as file:
+        file.write("import unittest\n\nclass T(unittest.TestCase):\n    def test(self):\n        pass\n\n"
+                   "unittest.main()\n")
+    original_backend = run_python.PYTHON_BACKEND
+    try:
+        for backend in ("subprocess", "pool"):
+            run_python.PYTHON_BACKEND = backend
+            for script in ("hello.py", "unit.py"):
+                results[f"run_python_file/{backend}/{script}"] = measure(
+                    lambda: run_python.run_python_file(workdir, script), repeat=3, min_time=0.2)
+
+            # A script printing without end is stopped at the output limit; the host keeps only head and tail
+            name = f"run_python_file/{backend}/flood.py"
+            results[name] = measure(lambda: run_python.run_python_file(workdir, "flood.py"), repeat=3)
+            tracemalloc.start()
+            run_python.run_python_file(workdir, "flood.py")
+            results[name]["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        # run_tests against the same module: every run executes it, or only the first one does
+        from functions import run_tests
+        run_python.PYTHON_BACKEND = original_backend
+        with open(os.path.join(workdir, "test_unit.py"), 'w') as file:
+            file.write("import unittest\n\nclass T(unittest.TestCase):\n    def test(self):\n        pass\n")
+        results["run_tests/uncached"] = measure(lambda: run_tests.run_tests(workdir, use_cache=False),
+                                                repeat=3, min_time=0.2)
+        results["run_tests/cached"] = measure(lambda: run_tests.run_tests(workdir))
+    finally:
+        run_python.PYTHON_BACKEND = original_backend
+        shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+def _agent_responses(turns: int) -> list:
+    from google.genai import types
+
+    responses = []
+    for i in range(turns):
+        calls = [
+            types.Part(function_call=types.FunctionCall(name="get_files_info", args={"directory": "pkg"})),
+            # A different range each turn; identical calls would be answered from the call memo
+            types.Part(function_call=types.FunctionCall(name="get_file_content",
+                                                        args={"file_path": "pkg/calculator.py",
+                                                              "start_line": i + 1})),
+        ]
+        responses.append(types.GenerateContentResponse(
+            candidates=[types.Candidate(content=types.Content(role="model", parts=calls))],
+            usage_metadata=types.GenerateContentResponseUsageMetadata(prompt_token_count=1000 * (i + 1)),
+        ))
+    responses.append(types.GenerateContentResponse(
+        candidates=[types.Candidate(content=types.Content(role="model", parts=[types.Part(text="Done.")]))],
+    ))
+    return responses
+
+
+def bench_agent_loop(quick: bool) -> dict:
+    from transport import ReplayClient
+
+    results = {}
+    for turns in (1, 5) if quick else (1, 5, 20):
+        responses = _agent_responses(turns)
+
+        for stream in (False, True):
+            def run():
+                client = ReplayClient(responses=responses)
+                assistant = AIAssistant(None, client=client, output=io.StringIO(), stream=stream)
+                assistant.generate_response("Explain the calculator")
+
+            results[f"agent_loop/{'stream_turns' if stream else 'turns'}/{turns}"] = measure(run, repeat=3)
+    return results
+
+
+def bench_cli(quick: bool) -> dict:
+    """Process startup for the paths that never reach the model."""
+    import subprocess
+
+    results = {}
+    root = os.path.dirname(os.path.abspath(__file__))
+    env = {key: value for key, value in os.environ.items() if key != "GEMINI_API_KEY"}
+    cases = {
+        "cli/main_usage": ([sys.executable, "main.py"], root),
+        "cli/main_config_error": ([sys.executable, "main.py", "hi"], root),
+        "cli/main_import": ([sys.executable, "-c", "import main"], root),
+        "cli/calculator_usage": ([sys.executable, "main.py"], os.path.join(root, "calculator")),
+        "cli/calculator": ([sys.executable, "main.py", "3 + 5"], os.path.join(root, "calculator")),
+    }
+    for name, (command, cwd) in cases.items():
+        results[name] = measure(lambda: subprocess.run(command, cwd=cwd, env=env, capture_output=True),
+                                repeat=3, min_time=0.2)
+    return results
+
+
+BENCHMARKS = {
+    "calculator": lambda quick, full: bench_calculator(quick),
+    "files_info": lambda quick, full: bench_files_info(quick),
+    "file_content": bench_file_content,
+    "search_code": bench_search_code,
+    "run_python": lambda quick, full: bench_run_python(quick),
+    "agent_loop": lambda quick, full: bench_agent_loop(quick),
+    "cli": lambda quick, full: bench_cli(quick),
+}
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Print a comparison table and return the names of regressed benchmarks."""
+    regressions = []
+    print(f"\n{'benchmark':<50} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        # The fastest sample is the least affected by scheduler and cache noise
+        before, after = baseline[name]["min_seconds"], result["min_seconds"]
+        change = (after - before) / before if before else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "  improved"
+        print(f"{name:<50} {_format_seconds(before):>12} {_format_seconds(after):>12} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.2f}s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds * 1e6:.2f}us"
+
+
+def main():
+    """Run the selected benchmark groups and write the results as JSON."""
+    if "--help" in sys.argv:
+        print(USAGE_MESSAGE)
+        return
+
+    quick = QUICK_FLAG in sys.argv
+    full = FULL_FLAG in sys.argv
+    only = get_flag_value(ONLY_FLAG)
+    groups = only.split(",") if only else list(BENCHMARKS)
+    unknown = [group for group in groups if group not in BENCHMARKS]
+    if unknown:
+        print(f"Unknown benchmark group(s): {', '.join(unknown)}")
+        sys.exit(1)
+
+    results = {}
+    for group in groups:
+        print(f"Running {group}...")
+        for name, result in BENCHMARKS[group](quick, full).items():
+            results[name] = result
+            print(f"  {name:<48} {_format_seconds(result['seconds']):>12}")
+
+    output_path = get_flag_value(OUTPUT_FLAG, DEFAULT_OUTPUT)
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "quick": quick,
+        },
+        "results": results,
+    }
+    with open(output_path, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"\nResults written to {output_path}")
+
+    baseline_path = get_flag_value(COMPARE_FLAG)
+    if baseline_path:
+        with open(baseline_path, 'r') as file:
+            baseline = json.load(file)["results"]
+        threshold = float(get_flag_value(THRESHOLD_FLAG, str(DEFAULT_THRESHOLD)))
+        regressions = compare(results, baseline, threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {threshold:.0%}")
+            sys.exit(1)
+        print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,23 +4,95 @@ import shutil
 from pkg.calculator import evaluate
 from pkg.render import render
 
+CLEAN_PYCACHE_FLAG = "--clean-pycache"
+STREAM_FLAG = "--stream"
+FILE_FLAG = "--file"
+FORMAT_FLAG = "--format"
+FORMATS = ("box", "compact")
+
+# Output of this many expressions is written at once in streaming mode
+OUTPUT_BATCH_LINES = 4096
+
 
 def clean_pycache():
-    """Clean up Python cache directories."""
-    for root, dirs, files in os.walk("."):
-        for d in dirs:
-            if d == "__pycache__":
-                shutil.rmtree(os.path.join(root, d), ignore_errors=True)
+    """Clean up the calculator package's cache directory."""
+    # Only pkg/ is imported, so there is no need to walk the tree
+    package_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pkg")
+    shutil.rmtree(os.path.join(package_dir, "__pycache__"), ignore_errors=True)
+
+def get_flag_value(flag, default=None):
+    """Return the value of a --flag=value option, or the default."""
+    prefix = f"{flag}="
+    for arg in sys.argv[1:]:
+        if arg.startswith(prefix):
+            return arg[len(prefix):]
+    return default
+
+def evaluate_lines(lines, output, compact=False):
+    """
+    Evaluate one expression per line and write a result for each, returning the number of errors.
+
+    Blank lines are skipped. A line that fails is reported and evaluation
+    continues with the next one. Compact output is one tab-separated
+    "<line number>\t<result>" (or "<line number>\tError: <message>") per
+    expression; otherwise each result is rendered as a box.
+    """
+    errors = 0
+    pending = []
+    for number, line in enumerate(lines, 1):
+        expr = line.strip()
+        if not expr:
+            continue
+        try:
+            result = evaluate(expr)
+            pending.append(f"{number}\t{result}" if compact else render(expr, result))
+        except Exception as e:
+            errors += 1
+            pending.append(f"{number}\tError: {e}" if compact else f"Error on line {number}: {e}")
+        if len(pending) >= OUTPUT_BATCH_LINES:
+            pending.append("")
+            output.write("\n".join(pending))
+            pending.clear()
+    if pending:
+        pending.append("")
+        output.write("\n".join(pending))
+    output.flush()
+    return errors
+
+def stream(path, output_format):
+    """Evaluate the expressions in a file, or stdin without one; return the exit code."""
+    if output_format not in FORMATS:
+        print(f"Error: {FORMAT_FLAG} must be one of {', '.join(FORMATS)}, got {output_format!r}")
+        return 2
+    compact = output_format == "compact"
+    if path is None:
+        return 1 if evaluate_lines(sys.stdin, sys.stdout, compact) else 0
+    try:
+        with open(path, 'r') as lines:
+            return 1 if evaluate_lines(lines, sys.stdout, compact) else 0
+    except OSError as e:
+        print(f"Error: {e}")
+        return 2
 
 def main():
     """Main function for the calculator application."""
-    if len(sys.argv) <= 1:
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    path = get_flag_value(FILE_FLAG)
+    if STREAM_FLAG in sys.argv or path is not None:
+        try:
+            return stream(path, get_flag_value(FORMAT_FLAG, "box"))
+        finally:
+            if CLEAN_PYCACHE_FLAG in sys.argv:
+                clean_pycache()
+    if not args:
         print("Calculator App")
         print('Usage: python main.py "<expression>"')
+        print('       python main.py --stream [--format=box|compact] < expressions.txt')
+        print('       python main.py --file=expressions.txt [--format=box|compact]')
         print('Example: python main.py "3 + 5"')
         return
     
-    expr = sys.argv[1]
+    expr = args[0]
     try:
         result = evaluate(expr)
         fancy_output = render(expr, result)  # Create the box!
@@ -28,8 +100,9 @@ def main():
     except Exception as e:
         print(f"Error: {e}")
     finally:
-        # Clean up cache files after execution
-        clean_pycache()
+        # Clean up cache files after execution when asked to
+        if CLEAN_PYCACHE_FLAG in sys.argv:
+            clean_pycache()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
@@ -1,49 +1,248 @@
 # --- calculator/pkg/calculator.py ---
 
+import operator
+from functools import lru_cache
+
 precedence = {'+': 2, '-': 2, '*': 3, '/': 3}
 
-def evaluate(expression):
-    def get_tokens(expr):
-        return expr.replace('(', ' ( ').replace(')', ' ) ').split()
+# Python operators used when a compiled expression is turned into a code object
+python_operators = {'+': '+', '-': '-', '*': '*', '/': '//'}
 
-    def shunting_yard(tokens):
-        output = []
-        stack = []
-        for token in tokens:
-            if token.isdigit():
-                output.append(int(token))
-            elif token in precedence:
-                while stack and stack[-1] in precedence and precedence[token] <= precedence[stack[-1]]:
-                    output.append(stack.pop())
-                stack.append(token)
-            elif token == '(':
-                stack.append(token)
-            elif token == ')':
-                while stack and stack[-1] != '(':
-                    output.append(stack.pop())
-                stack.pop()
-        while stack:
-            output.append(stack.pop())
-        return output
-
-    def eval_rpn(rpn):
+# Functions applying each operator in RPN evaluation
+operations = {'+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.floordiv}
+
+# Precedence of what can sit on the operator stack; '(' binds loosest so nothing pops past it
+_stack_precedence = {'(': 0, **precedence}
+
+COMPILE_CACHE_SIZE = 4096
+
+# Evaluations of a cached expression after which it is compiled to a code object
+COMPILE_AFTER_CALLS = 2
+
+# Longer expressions are evaluated in one streaming pass instead of being compiled and cached
+STREAM_THRESHOLD = 64 * 1024
+
+# Characters read from a file per step of evaluate_stream
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Compiled expressions only contain literals, so they need no builtins
+_EVAL_GLOBALS = {'__builtins__': {}}
+
+def get_tokens(expr):
+    return expr.replace('(', ' ( ').replace(')', ' ) ').split()
+
+class Name(str):
+    """A variable reference in RPN produced with names=True."""
+
+def shunting_yard(tokens, names=False):
+    output = []
+    stack = []
+    for token in tokens:
+        if token.isdigit():
+            output.append(int(token))
+        elif names and token.isidentifier():
+            output.append(Name(token))
+        elif token in precedence:
+            while stack and stack[-1] in precedence and precedence[token] <= precedence[stack[-1]]:
+                output.append(stack.pop())
+            stack.append(token)
+        elif token == '(':
+            stack.append(token)
+        elif token == ')':
+            while stack and stack[-1] != '(':
+                output.append(stack.pop())
+            stack.pop()
+    while stack:
+        output.append(stack.pop())
+    return output
+
+def eval_rpn(rpn):
+    stack = []
+    for token in rpn:
+        if isinstance(token, int):
+            stack.append(token)
+        else:
+            b = stack.pop()
+            a = stack.pop()
+            if token == '+':
+                stack.append(a + b)
+            elif token == '-':
+                stack.append(a - b)
+            elif token == '*':
+                stack.append(a * b)
+            elif token == '/':
+                stack.append(a // b)
+    return stack[0]
+
+class CompiledExpression:
+    """An expression parsed once into RPN and, when well formed, a Python code object."""
+
+    __slots__ = ('rpn', 'code', 'calls')
+
+    def __init__(self, rpn):
+        self.rpn = tuple(rpn)
+        self.code = None
+        self.calls = 0
+
+    @staticmethod
+    def _to_code(rpn):
+        # Only RPN that eval_rpn runs without popping an empty stack or hitting a
+        # stray '(' becomes a code object; anything else keeps eval_rpn's behaviour
         stack = []
         for token in rpn:
             if isinstance(token, int):
-                stack.append(token)
-            else:
+                stack.append(repr(token))
+            elif token in python_operators and len(stack) >= 2:
                 b = stack.pop()
                 a = stack.pop()
-                if token == '+':
-                    stack.append(a + b)
-                elif token == '-':
-                    stack.append(a - b)
-                elif token == '*':
-                    stack.append(a * b)
-                elif token == '/':
-                    stack.append(a // b)
-        return stack[0]
-
-    tokens = get_tokens(expression)
-    rpn = shunting_yard(tokens)
-    return eval_rpn(rpn)
\ No newline at end of file
+                stack.append(f"({a}{python_operators[token]}{b})")
+            else:
+                return None
+        if not stack:
+            return None
+        # Every leftover operand is still evaluated, in order, as eval_rpn does
+        source = stack[0] if len(stack) == 1 else f"({', '.join(stack)},)[0]"
+        try:
+            return compile(source, '<expression>', 'eval')
+        except (SyntaxError, RecursionError, MemoryError, ValueError):
+            return None
+
+    def __call__(self):
+        if self.code is not None:
+            return eval(self.code, _EVAL_GLOBALS)
+        # compile() costs far more than one eval_rpn, so only expressions that recur are compiled
+        self.calls += 1
+        if self.calls == COMPILE_AFTER_CALLS:
+            self.code = self._to_code(self.rpn)
+            if self.code is not None:
+                return eval(self.code, _EVAL_GLOBALS)
+        return eval_rpn(self.rpn)
+
+@lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def _compile_tokens(tokens):
+    return CompiledExpression(shunting_yard(tokens))
+
+@lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_expression(expression):
+    # Expressions are looked up verbatim first; differently spaced spellings of
+    # the same expression share one compiled object through the token cache
+    return _compile_tokens(tuple(get_tokens(expression)))
+
+def cache_info():
+    return {'expressions': compile_expression.cache_info(), 'normalized': _compile_tokens.cache_info()}
+
+def cache_clear():
+    compile_expression.cache_clear()
+    _compile_tokens.cache_clear()
+
+def _chunks(source, chunk_size):
+    if isinstance(source, str):
+        for start in range(0, len(source), chunk_size):
+            yield source[start:start + chunk_size]
+        return
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+def _is_separator(char):
+    return char.isspace() or char in '()'
+
+def _token_batches(source, chunk_size):
+    """Yield the tokens get_tokens would produce, one list per chunk read from the source."""
+    partial = []  # pieces of a token cut by chunk boundaries
+    for chunk in _chunks(source, chunk_size):
+        tokens = get_tokens(chunk)
+        if not tokens:
+            if partial:
+                yield [''.join(partial)]
+                partial = []
+            continue
+        ends_inside = not _is_separator(chunk[-1])
+        if partial:
+            if not _is_separator(chunk[0]):
+                partial.append(tokens[0])
+                if len(tokens) == 1 and ends_inside:
+                    continue
+                tokens[0] = ''.join(partial)
+            else:
+                yield [''.join(partial)]
+            partial = []
+        if ends_inside:
+            partial.append(tokens.pop())
+        yield tokens
+    if partial:
+        yield [''.join(partial)]
+
+def stream_tokens(source, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield the tokens get_tokens would produce, reading the source one chunk at a time."""
+    for tokens in _token_batches(source, chunk_size):
+        yield from tokens
+
+class StreamEvaluator:
+    """
+    Evaluates tokens fed in any number of batches, with an operand and an operator stack.
+
+    Operators are applied in the order shunting_yard would emit them, so the
+    result is the one eval_rpn gives, but neither the token list nor the RPN
+    is ever built: memory stays proportional to the nesting depth. Input that
+    is malformed in more than one way may report a different one of its
+    errors first, since evaluation cannot wait for the end of the input.
+    """
+
+    __slots__ = ('operands', 'operators')
+
+    def __init__(self):
+        self.operands = []
+        self.operators = []
+
+    def feed(self, tokens):
+        operands, operators = self.operands, self.operators
+        push, pop = operands.append, operands.pop
+        push_operator, pop_operator = operators.append, operators.pop
+        ranks, stack_ranks = precedence, _stack_precedence
+        for token in tokens:
+            rank = ranks.get(token)
+            if rank is not None:
+                while operators and rank <= stack_ranks[operators[-1]]:
+                    b = pop()
+                    push(operations[pop_operator()](pop(), b))
+                push_operator(token)
+            elif token.isdigit():
+                push(int(token))
+            elif token == '(':
+                push_operator(token)
+            elif token == ')':
+                while operators and operators[-1] != '(':
+                    b = pop()
+                    push(operations[pop_operator()](pop(), b))
+                pop_operator()
+
+    def result(self):
+        operands, operators = self.operands, self.operators
+        while operators:
+            token = operators.pop()
+            b = operands.pop()
+            a = operands.pop()
+            # A '(' left open is popped like an operator and, as in eval_rpn, consumes its operands
+            if token != '(':
+                operands.append(operations[token](a, b))
+        return operands[0]
+
+def evaluate_tokens(tokens):
+    evaluator = StreamEvaluator()
+    evaluator.feed(tokens)
+    return evaluator.result()
+
+def evaluate_stream(source, chunk_size=STREAM_CHUNK_SIZE):
+    """Evaluate an expression from a string or a text file object (e.g. sys.stdin) incrementally."""
+    evaluator = StreamEvaluator()
+    for tokens in _token_batches(source, chunk_size):
+        evaluator.feed(tokens)
+    return evaluator.result()
+
+def evaluate(expression):
+    if len(expression) > STREAM_THRESHOLD:
+        return evaluate_stream(expression)
+    return compile_expression(expression)()
@@ -8,16 +8,15 @@ def render(expression, result):
 
     box_width = max(len(expression), len(result_str)) + 4
 
-    box = []
-    box.append("┌" + "─" * box_width + "┐")
-    box.append(
-        "│" + " " * 2 + expression + " " * (box_width - len(expression) - 2) + "│"
+    # Built as one string; streaming mode renders a box per expression
+    border = "─" * box_width
+    blank = "│" + " " * box_width + "│"
+    return (
+        f"┌{border}┐\n"
+        f"│  {expression.ljust(box_width - 2)}│\n"
+        f"{blank}\n"
+        f"│  ={' ' * (box_width - 3)}│\n"
+        f"{blank}\n"
+        f"│  {result_str.ljust(box_width - 2)}│\n"
+        f"└{border}┘"
     )
-    box.append("│" + " " * box_width + "│")
-    box.append("│" + " " * 2 + "=" + " " * (box_width - 3) + "│")
-    box.append("│" + " " * box_width + "│")
-    box.append(
-        "│" + " " * 2 + result_str + " " * (box_width - len(result_str) - 2) + "│"
-    )
-    box.append("└" + "─" * box_width + "┘")
-    return "\n".join(box)
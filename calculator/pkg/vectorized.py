@@ -0,0 +1,77 @@
+# --- calculator/pkg/vectorized.py ---
+
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError as e:
+    # numpy is an optional dependency of the project, only needed here
+    raise ImportError("evaluate_batch needs numpy, which is an optional dependency; "
+                      "install it with: uv sync --extra vectorized") from e
+
+from .calculator import COMPILE_CACHE_SIZE, Name, get_tokens, shunting_yard
+
+# Same operators as evaluate: '/' is floor division
+array_operators = {'+': np.add, '-': np.subtract, '*': np.multiply, '/': np.floor_divide}
+
+class BatchExpression:
+    """
+    An expression with named variables, compiled once to RPN and evaluated as
+    whole-array NumPy operations.
+
+    Integer inputs use NumPy's fixed-width integers, so unlike evaluate()
+    results wrap around instead of growing without bound.
+    """
+
+    __slots__ = ('rpn', 'names')
+
+    def __init__(self, rpn):
+        self.rpn = tuple(rpn)
+        self.names = tuple(dict.fromkeys(token for token in self.rpn if isinstance(token, Name)))
+        depth = 0
+        for token in self.rpn:
+            if isinstance(token, (int, Name)):
+                depth += 1
+            elif token in array_operators and depth >= 2:
+                depth -= 1
+            else:
+                raise ValueError(f"Malformed expression near {token!r}")
+        if depth != 1:
+            raise ValueError("Malformed expression: operands without operators")
+
+    def __call__(self, variables):
+        stack = []
+        zero_division = False
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            for token in self.rpn:
+                if isinstance(token, Name):
+                    if token not in variables:
+                        raise NameError(f"name {str(token)!r} is not defined")
+                    stack.append(variables[token])
+                elif isinstance(token, int):
+                    stack.append(token)
+                else:
+                    b = stack.pop()
+                    a = stack.pop()
+                    if token == '/':
+                        # Division by zero is reported per element instead of raising
+                        zero_division = zero_division | (np.asarray(b) == 0)
+                    stack.append(array_operators[token](a, b))
+        result = np.asarray(stack[0])
+        return np.ma.masked_array(result, mask=np.broadcast_to(zero_division, result.shape))
+
+@lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_batch(expression):
+    return BatchExpression(shunting_yard(get_tokens(expression), names=True))
+
+def evaluate_batch(expression, variables=None, **kwargs):
+    """
+    Evaluate an expression such as "(a + b) * c / 2" over arrays of values.
+
+    Variables may be NumPy arrays, any buffer-protocol object or sequence, or
+    scalars, and are broadcast against each other. Returns a masked array in
+    which elements whose computation divided by zero are masked.
+    """
+    values = {**(variables or {}), **kwargs}
+    arrays = {name: np.asarray(value) for name, value in values.items()}
+    return compile_batch(expression)(arrays)
@@ -1,5 +1,17 @@
 import unittest
 
+import io
+
+from main import evaluate_lines
+from pkg.calculator import cache_clear, cache_info, compile_expression, evaluate, evaluate_stream
+from pkg.render import render
+
+try:
+    import numpy
+    from pkg.vectorized import evaluate_batch
+except ImportError:
+    numpy = None
+
 class TestGetFileContent(unittest.TestCase):
     
     def test_lorem_txt(self):
@@ -47,5 +59,86 @@ class TestGetFileContent(unittest.TestCase):
         except Exception as e:
             return f"Error: Cannot read {file_path}: {e}"
 
+class TestEvaluate(unittest.TestCase):
+
+    def setUp(self):
+        cache_clear()
+
+    def test_precedence(self):
+        self.assertEqual(evaluate("2 + 3 * 4"), 14)
+
+    def test_parentheses(self):
+        self.assertEqual(evaluate("(2 + 3) * 4"), 20)
+
+    def test_integer_division(self):
+        self.assertEqual(evaluate("7 / 2"), 3)
+        self.assertEqual(evaluate("0 - 7 / 2"), -3)
+
+    def test_division_by_zero(self):
+        with self.assertRaises(ZeroDivisionError):
+            evaluate("1 / 0")
+
+    def test_cache_reuses_compiled_expression(self):
+        evaluate("3 + 5")
+        evaluate("3 + 5")
+        self.assertEqual(cache_info()["expressions"].hits, 1)
+
+    def test_spacing_variants_share_compiled_expression(self):
+        self.assertIs(compile_expression("(3 + 5)"), compile_expression("( 3  +  5 )"))
+
+    def test_compiled_only_once_repeated(self):
+        evaluate("3 + 5")
+        self.assertIsNone(compile_expression("3 + 5").code)
+        self.assertEqual(evaluate("3 + 5"), 8)
+        self.assertIsNotNone(compile_expression("3 + 5").code)
+
+class TestEvaluateStream(unittest.TestCase):
+
+    def test_matches_evaluate(self):
+        for expression in ["2 + 3 * 4", "(2 + 3) * 4", "0 - 7 / 2", "((1 + 2) * (3 + 4)) / 5 - 6"]:
+            self.assertEqual(evaluate_stream(expression), evaluate(expression))
+
+    def test_tokens_split_across_chunks(self):
+        expression = "(123 + 4567) * 89 - 10 / (11 + 12)"
+        for chunk_size in range(1, len(expression) + 1):
+            self.assertEqual(evaluate_stream(io.StringIO(expression), chunk_size), evaluate(expression))
+
+    def test_long_expression(self):
+        expression = " + ".join(["(1 * 2)"] * 100000)
+        self.assertEqual(evaluate_stream(expression, 1000), 200000)
+        self.assertEqual(evaluate(expression), 200000)
+
+    def test_division_by_zero(self):
+        with self.assertRaises(ZeroDivisionError):
+            evaluate_stream(io.StringIO("1 / (2 - 2)"))
+
+class TestEvaluateLines(unittest.TestCase):
+
+    def test_compact_reports_errors_per_line(self):
+        output = io.StringIO()
+        errors = evaluate_lines(io.StringIO("3 + 5\n\n1 / 0\n(2 + 3) * 4\n"), output, compact=True)
+        self.assertEqual(errors, 1)
+        self.assertEqual(output.getvalue(),
+                         "1\t8\n3\tError: integer division or modulo by zero\n4\t20\n")
+
+    def test_box_output_matches_render(self):
+        output = io.StringIO()
+        evaluate_lines(["3 + 5", "7 / 2"], output)
+        self.assertEqual(output.getvalue(), render("3 + 5", 8) + "\n" + render("7 / 2", 3) + "\n")
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class TestEvaluateBatch(unittest.TestCase):
+
+    def test_matches_scalar_evaluate(self):
+        a, b, c = [1, 7, 20], [2, 3, 5], [3, 4, 9]
+        result = evaluate_batch("(a + b) * c / 2", a=a, b=b, c=c)
+        expected = [evaluate(f"({x} + {y}) * {z} / 2") for x, y, z in zip(a, b, c)]
+        self.assertEqual(result.tolist(), expected)
+
+    def test_division_by_zero_is_masked_per_element(self):
+        result = evaluate_batch("a / b", a=[4, 4, 4], b=[2, 0, 1])
+        self.assertEqual(result.mask.tolist(), [False, True, False])
+        self.assertEqual(result.compressed().tolist(), [2, 4])
+
 if __name__ == "__main__":
     unittest.main()
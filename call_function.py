@@ -1,33 +1,96 @@
+import contextvars
+import inspect
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 from google.genai import types
 
 from functions.get_files_info import get_files_info
 from functions.get_file_content import get_file_content
+from functions.search_code import search_code
 from functions.run_python import run_python_file
+from functions.run_tests import run_tests
 from functions.write_file_content import write_file
-
-# Configuration
-WORKING_DIR = "./calculator"
+from functions.edit_file import edit_file
+from functions.tracing import current_span, span, tracing_enabled
+from tool_cache import CallMemo
+from workspace import Workspace, default_workspace
 
 # Function registry - defined once at module level
 FUNCTION_REGISTRY = {
     "get_files_info": get_files_info,
     "get_file_content": get_file_content,
+    "search_code": search_code,
     "run_python_file": run_python_file,
+    "run_tests": run_tests,
     "write_file": write_file,
+    "edit_file": edit_file,
 }
 
+# Tools that never modify the working directory and may run concurrently
+READ_ONLY_FUNCTIONS = {"get_files_info", "get_file_content", "search_code"}
+
+# Tools that run code and take the workspace's run limits
+LIMITED_FUNCTIONS = {"run_python_file", "run_tests"}
+
+# Argument naming the path a tool operates on, used to order conflicting calls
+PATH_ARGUMENTS = ("file_path", "directory")
+
+# Added to a repeated call's result, so the model sees it is going in circles
+REPEATED_CALL_NOTE = "Same call as earlier with nothing changed since; this is the same result."
+
 # Schema definition
 available_functions = types.Tool(
     function_declarations=[
         types.FunctionDeclaration(
             name="get_files_info",
-            description="List files and directories under a given relative path.",
+            description=(
+                "List files and directories under a given relative path. With recursive=true the "
+                "whole subtree is listed in pages (follow next_cursor) together with a summary of "
+                "file counts, sizes and extensions. Entries matched by .gitignore are skipped."
+            ),
             parameters=types.Schema(
                 type=types.Type.OBJECT,
                 properties={
                     "directory": types.Schema(
                         type=types.Type.STRING,
                         description="Relative path to list (e.g., '.', 'pkg', 'src/utils')"
+                    ),
+                    "recursive": types.Schema(
+                        type=types.Type.BOOLEAN,
+                        description="List the whole subtree instead of one level (default false)"
+                    ),
+                    "max_depth": types.Schema(
+                        type=types.Type.INTEGER,
+                        description="Maximum depth for recursive listings; 1 lists direct children only"
+                    ),
+                    "pattern": types.Schema(
+                        type=types.Type.STRING,
+                        description="Only include entries matching this glob, e.g. '*.py' or 'pkg/**/*.py'"
+                    ),
+                    "ignore": types.Schema(
+                        type=types.Type.ARRAY,
+                        items=types.Schema(type=types.Type.STRING),
+                        description="Globs of entries (and directories to skip entirely) to leave out"
+                    ),
+                    "respect_gitignore": types.Schema(
+                        type=types.Type.BOOLEAN,
+                        description="Skip entries matched by .gitignore files (default true)"
+                    ),
+                    "cursor": types.Schema(
+                        type=types.Type.STRING,
+                        description="next_cursor from a previous call, to fetch the next page"
+                    ),
+                    "limit": types.Schema(
+                        type=types.Type.INTEGER,
+                        description="Maximum entries per page, at least 1 (default 200 for recursive listings)"
+                    ),
+                    "fields": types.Schema(
+                        type=types.Type.ARRAY,
+                        items=types.Schema(type=types.Type.STRING),
+                        description="Entry fields to return (default relpath, is_dir, size); also name, "
+                                    "is_file, is_symlink, mode, modified_iso, modified_ts"
                     )
                 },
                 required=["directory"]
@@ -35,18 +98,82 @@ available_functions = types.Tool(
         ),
         types.FunctionDeclaration(
             name="get_file_content",
-            description="Read the contents of a specified file.",
+            description=(
+                "Read the contents of a specified file, at most 10000 bytes per call. "
+                "The result includes total_bytes and total_lines; page through large files "
+                "with offset/length or start_line/end_line."
+            ),
             parameters=types.Schema(
                 type=types.Type.OBJECT,
                 properties={
                     "file_path": types.Schema(
                         type=types.Type.STRING,
                         description="Path to the file"
+                    ),
+                    "offset": types.Schema(
+                        type=types.Type.INTEGER,
+                        description="Byte offset to start reading from (default 0)"
+                    ),
+                    "length": types.Schema(
+                        type=types.Type.INTEGER,
+                        description="Number of bytes to read from offset"
+                    ),
+                    "start_line": types.Schema(
+                        type=types.Type.INTEGER,
+                        description="First line to read, 1-based (cannot be combined with offset/length)"
+                    ),
+                    "end_line": types.Schema(
+                        type=types.Type.INTEGER,
+                        description="Last line to read, inclusive"
                     )
                 },
                 required=["file_path"]
             )
         ),
+        types.FunctionDeclaration(
+            name="search_code",
+            description=(
+                "Search the contents of every text file in the working directory for a string or "
+                "regular expression and return the matching lines with their paths and line numbers. "
+                "Backed by an index, so it is fast even on large trees; prefer it to reading files "
+                "one by one when looking for where something is defined or used."
+            ),
+            parameters=types.Schema(
+                type=types.Type.OBJECT,
+                properties={
+                    "query": types.Schema(
+                        type=types.Type.STRING,
+                        description="Text to find, e.g. 'def evaluate'; a regular expression if regex is true"
+                    ),
+                    "regex": types.Schema(
+                        type=types.Type.BOOLEAN,
+                        description="Treat query as a Python regular expression (default false)"
+                    ),
+                    "ignore_case": types.Schema(
+                        type=types.Type.BOOLEAN,
+                        description="Match regardless of case (default false)"
+                    ),
+                    "include": types.Schema(
+                        type=types.Type.STRING,
+                        description="Only search files matching this glob, e.g. '*.py' or 'pkg/**/*.py'"
+                    ),
+                    "max_results": types.Schema(
+                        type=types.Type.INTEGER,
+                        description="Maximum matching lines to return (default 50)"
+                    ),
+                    "context_lines": types.Schema(
+                        type=types.Type.INTEGER,
+                        description="Lines of context to include before and after each match (default 0, max 10)"
+                    ),
+                    "fields": types.Schema(
+                        type=types.Type.ARRAY,
+                        items=types.Schema(type=types.Type.STRING),
+                        description="Match fields to return (default all: path, line, text, before, after)"
+                    )
+                },
+                required=["query"]
+            )
+        ),
         types.FunctionDeclaration(
             name="run_python_file",
             description="Execute a specified Python file with optional arguments.",
@@ -66,6 +193,30 @@ available_functions = types.Tool(
                 required=["file_path"]
             )
         ),
+        types.FunctionDeclaration(
+            name="run_tests",
+            description=(
+                "Run unittest tests and return a structured result per test: passed, failed, error or "
+                "skipped, with the traceback of each failure. Without test_ids every test*.py module "
+                "runs. Results are reused while neither the tests nor the code they import changed, "
+                "so rerunning after an unrelated edit is instant."
+            ),
+            parameters=types.Schema(
+                type=types.Type.OBJECT,
+                properties={
+                    "test_ids": types.Schema(
+                        type=types.Type.ARRAY,
+                        items=types.Schema(type=types.Type.STRING),
+                        description="Test modules, classes or methods, e.g. 'tests', 'tests.TestEvaluate' "
+                                    "or 'tests.TestEvaluate.test_precedence'"
+                    ),
+                    "use_cache": types.Schema(
+                        type=types.Type.BOOLEAN,
+                        description="Reuse results of unchanged tests (default true)"
+                    )
+                }
+            )
+        ),
         types.FunctionDeclaration(
             name="write_file",
             description="Write or overwrite a specified file with given content.",
@@ -83,6 +234,51 @@ available_functions = types.Tool(
                 },
                 required=["file_path", "content"]
             )
+        ),
+        types.FunctionDeclaration(
+            name="edit_file",
+            description=(
+                "Change part of an existing file without resending all of it. Pass either `edits`, "
+                "search/replace blocks applied in order (each search text must match exactly once, "
+                "including indentation), or `diff`, a unified diff of this one file. Nothing is written "
+                "unless every block applies; mismatches report the closest text in the file."
+            ),
+            parameters=types.Schema(
+                type=types.Type.OBJECT,
+                properties={
+                    "file_path": types.Schema(
+                        type=types.Type.STRING,
+                        description="Path to the file"
+                    ),
+                    "edits": types.Schema(
+                        type=types.Type.ARRAY,
+                        items=types.Schema(
+                            type=types.Type.OBJECT,
+                            properties={
+                                "search": types.Schema(
+                                    type=types.Type.STRING,
+                                    description="Exact text to find, with a few surrounding lines if needed to be unique"
+                                ),
+                                "replace": types.Schema(
+                                    type=types.Type.STRING,
+                                    description="Text to put in its place"
+                                ),
+                                "replace_all": types.Schema(
+                                    type=types.Type.BOOLEAN,
+                                    description="Replace every occurrence instead of requiring a unique match"
+                                )
+                            },
+                            required=["search", "replace"]
+                        ),
+                        description="Search/replace blocks (cannot be combined with diff)"
+                    ),
+                    "diff": types.Schema(
+                        type=types.Type.STRING,
+                        description="Unified diff with @@ hunks for this file (cannot be combined with edits)"
+                    )
+                },
+                required=["file_path"]
+            )
         )
     ]
 )
@@ -100,45 +296,207 @@ def _create_function_response(function_name: str, response_data: dict) -> types.
         ],
     )
 
-def _execute_function(function_name: str, args: dict) -> dict:
+def _execute_function(function_name: str, args: dict, workspace: Workspace) -> dict:
     """Execute the actual function call and return result as dict."""
     if function_name not in FUNCTION_REGISTRY:
         return {"error": f"Unknown function: {function_name}"}
     
     try:
-        # Add working directory to all function calls
-        enhanced_args = {**args, "working_directory": WORKING_DIR}
+        # Read-only tools are answered from the cache while their target is unchanged
+        cache_key = None
+        if function_name in READ_ONLY_FUNCTIONS:
+            cache_key = workspace.tool_cache.key(function_name, args, workspace.root)
+            cached = workspace.tool_cache.get(cache_key) if cache_key is not None else None
+            current_span().set(cache_hit=cached is not None)
+            if cached is not None:
+                return cached
+        
+        # Add working directory to all function calls, and limits to those running code
+        enhanced_args = {**args, "working_directory": workspace.root}
+        if function_name in LIMITED_FUNCTIONS:
+            enhanced_args["limits"] = workspace.limits
         result = FUNCTION_REGISTRY[function_name](**enhanced_args)
         
         # Ensure result is always a dict
-        return result if isinstance(result, dict) else {"result": str(result)}
+        result = result if isinstance(result, dict) else {"result": str(result)}
+        
+        if cache_key is not None:
+            workspace.tool_cache.put(cache_key, result)
+        elif function_name not in READ_ONLY_FUNCTIONS:
+            workspace.invalidate_after(function_name, args)
+        return result
         
     except Exception as e:
         return {"error": f"Function execution error: {type(e).__name__}: {e}"}
 
-def call_function(function_call_part, verbose: bool = False) -> types.Content:
+def canonical_args(function_name: str, args: dict) -> str:
+    """Arguments with defaults filled in and paths normalized, as a stable JSON string."""
+    function = FUNCTION_REGISTRY.get(function_name)
+    if function is not None:
+        try:
+            bound = inspect.signature(function).bind_partial(**args)
+            bound.apply_defaults()
+            args = {key: value for key, value in bound.arguments.items()
+                    if key not in ("working_directory", "limits")}
+        except TypeError:
+            # Bad arguments; the call reports them when it runs
+            pass
+    args = {key: os.path.normpath(str(value)) if key in PATH_ARGUMENTS and value else value
+            for key, value in args.items()}
+    return json.dumps(args, sort_keys=True, default=str)
+
+def call_function(function_call_part, verbose: bool = False, memo: CallMemo | None = None,
+                  workspace: Workspace | None = None, output=None) -> types.Content:
     """
     Execute a function call and return the result in the proper format for Gemini.
     
     Args:
         function_call_part: The function call part from Gemini
         verbose: Whether to print debug information
+        memo: Calls of the conversation so far; repeated read-only calls are answered from it
+        workspace: Working directory, caches and limits to run in (default: ./calculator)
+        output: Stream for the debug information (default: stdout)
         
     Returns:
         types.Content: Formatted response for Gemini
     """
+    workspace = workspace or default_workspace()
     function_name = function_call_part.name
     args = dict(function_call_part.args)
-    
-    if verbose:
-        print(f"Calling function: {function_name}")
-        print(f"Arguments: {args}")
+    # Fields select what is sent back, not what the tool does
+    fields = args.pop("fields", None)
     
     # Execute function and get result
-    result = _execute_function(function_name, args)
+    with span(function_name, "tool") as tool_span:
+        result = None
+        if memo is not None:
+            call_key = (function_name, canonical_args(function_name, args), json.dumps(fields))
+            version = workspace.tool_cache.version
+            result = memo.lookup(call_key, version)
+            tool_span.set(repeated=result is not None)
+        repeated = result is not None
+        if not repeated:
+            result = _execute_function(function_name, args, workspace)
+            if memo is not None:
+                memo.record(call_key, version, result, function_name in READ_ONLY_FUNCTIONS)
+        result, raw_tokens, result_tokens = workspace.result_shaper.shape(function_name, result, fields)
+        if repeated:
+            # Under its own key, so a note of the tool's own (e.g. how to read further) is kept
+            result = {**result, "repeat_note": REPEATED_CALL_NOTE}
+        tool_span.set(raw_tokens=raw_tokens, result_tokens=result_tokens)
+        if tracing_enabled():
+            tool_span.set(args_bytes=len(json.dumps(args, default=str)),
+                          result_bytes=len(json.dumps(result, default=str)))
     
     if verbose:
-        print(f"Function result: {result}")
+        # One line per call, so calls running in parallel do not interleave; the caller logs the
+        # result itself and cache stats are shown once per run
+        print(f"Called {function_name}({args}): ~{result_tokens} tokens (~{raw_tokens} before shaping)"
+              f"{', repeated' if repeated else ''}", file=output)
     
     # Return formatted response
-    return _create_function_response(function_name, result)
\ No newline at end of file
+    return _create_function_response(function_name, result)
+
+def _call_path(function_call_part) -> str:
+    """Return the normalized working-directory-relative path a call operates on."""
+    args = function_call_part.args or {}
+    for key in PATH_ARGUMENTS:
+        if args.get(key):
+            return os.path.normpath(str(args[key]))
+    return "."
+
+def _paths_conflict(first: str, second: str) -> bool:
+    """Check whether two relative paths are equal or one contains the other."""
+    if first == second or first == "." or second == ".":
+        return True
+    return first.startswith(second + os.sep) or second.startswith(first + os.sep)
+
+def _dependencies(function_call_parts) -> list[list[int]]:
+    """
+    Work out which earlier calls each call has to wait for.
+
+    Read-only calls never wait for each other. A mutating call waits for every
+    earlier call on a conflicting path, and a read waits for earlier mutating
+    calls on a conflicting path, so per-path order matches the model's order.
+    """
+    paths = [_call_path(part) for part in function_call_parts]
+    read_only = [part.name in READ_ONLY_FUNCTIONS for part in function_call_parts]
+    return [_earlier_conflicts(paths, read_only, i) for i in range(len(function_call_parts))]
+
+def _earlier_conflicts(paths: list[str], read_only: list[bool], index: int) -> list[int]:
+    """Indices of the calls before `index` that the call at `index` has to wait for."""
+    return [
+        j for j in range(index)
+        if not (read_only[index] and read_only[j]) and _paths_conflict(paths[index], paths[j])
+    ]
+
+class CallDispatcher:
+    """
+    Starts function calls one at a time as they arrive, e.g. from a streamed
+    model turn, with the same ordering rules as call_functions.
+    """
+
+    def __init__(self, verbose: bool = False, max_workers: int = 1, memo: CallMemo | None = None,
+                 workspace: Workspace | None = None, output=None):
+        self.verbose = verbose
+        self.output = output
+        self.memo = memo
+        self.workspace = workspace
+        self._parts = []
+        self._paths = []
+        self._read_only = []
+        self._futures = []
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+
+    def _run(self, index, dependencies):
+        # Dependencies were submitted earlier, so waiting here cannot deadlock
+        for dependency in dependencies:
+            self._futures[dependency].result()
+        return call_function(self._parts[index], self.verbose, self.memo, self.workspace, self.output)
+
+    def submit(self, function_call_part) -> None:
+        """Start a call once every earlier call it conflicts with has been started."""
+        self._parts.append(function_call_part)
+        self._paths.append(_call_path(function_call_part))
+        self._read_only.append(function_call_part.name in READ_ONLY_FUNCTIONS)
+        index = len(self._parts) - 1
+        dependencies = _earlier_conflicts(self._paths, self._read_only, index)
+        # Each task runs in a copy of the caller's context so its trace spans nest under the turn
+        self._futures.append(self._executor.submit(contextvars.copy_context().run, self._run, index, dependencies))
+
+    def results(self) -> list[types.Content]:
+        """Wait for every submitted call and return the responses in call order."""
+        try:
+            return [future.result() for future in self._futures]
+        finally:
+            self._executor.shutdown()
+
+    def close(self) -> None:
+        """Let submitted calls finish without collecting their results."""
+        self._executor.shutdown(wait=True)
+
+def call_functions(function_call_parts, verbose: bool = False, max_workers: int = 1,
+                   memo: CallMemo | None = None, workspace: Workspace | None = None,
+                   output=None) -> list[types.Content]:
+    """
+    Execute several function calls from one model turn, concurrently where safe.
+    
+    Args:
+        function_call_parts: The function call parts from Gemini, in call order
+        verbose: Whether to print debug information
+        max_workers: Size of the thread pool; 1 runs the calls sequentially
+        memo: Calls of the conversation so far, see call_function
+        workspace: Working directory, caches and limits to run in, see call_function
+        output: Stream for the debug information, see call_function
+        
+    Returns:
+        list[types.Content]: Formatted responses, in the original call order
+    """
+    function_call_parts = list(function_call_parts)
+    if max_workers <= 1 or len(function_call_parts) <= 1:
+        return [call_function(part, verbose, memo, workspace, output) for part in function_call_parts]
+
+    dispatcher = CallDispatcher(verbose, max_workers, memo, workspace, output)
+    for part in function_call_parts:
+        dispatcher.submit(part)
+    return dispatcher.results()
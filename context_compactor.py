@@ -0,0 +1,185 @@
+import json
+import os
+
+# Rough size of a token, used to estimate savings from the characters removed
+CHARS_PER_TOKEN = 4
+DEFAULT_CONTEXT_BUDGET = 30000
+DEFAULT_KEEP_RECENT_TURNS = 3
+SUMMARY_PREVIEW_CHARS = 200
+
+# Tools whose output describes a path that a later write makes stale
+READ_FUNCTIONS = {"get_file_content", "get_files_info"}
+WRITE_FUNCTIONS = {"write_file", "edit_file"}
+
+
+def _size(value) -> int:
+    """Approximate serialized size of a function response or argument value."""
+    if isinstance(value, str):
+        return len(value)
+    return len(json.dumps(value, default=str))
+
+def _estimate_tokens(chars: int) -> int:
+    return chars // CHARS_PER_TOKEN
+
+def _call_path(args: dict) -> str | None:
+    path = args.get("file_path") or args.get("directory")
+    return os.path.normpath(str(path)) if path else None
+
+def _is_within(path: str, directory: str) -> bool:
+    return directory == "." or path == directory or path.startswith(directory + os.sep)
+
+
+class ContextCompactor:
+    """
+    Keep the resent message history under a prompt token budget.
+
+    The budget is checked against the prompt_token_count the API reports. Once
+    it is exceeded, tool outputs that later calls made stale (reads of a file
+    that was rewritten or read again, listings of a directory written to, old
+    write_file contents) are replaced with a one-line note. If that is not
+    enough, older tool outputs are cut down to a short preview. The most
+    recent turns are always kept verbatim.
+    """
+
+    def __init__(self, token_budget: int | None = DEFAULT_CONTEXT_BUDGET,
+                 keep_recent_turns: int = DEFAULT_KEEP_RECENT_TURNS):
+        self.token_budget = token_budget
+        self.keep_recent_turns = keep_recent_turns
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget all per-run state."""
+        self.last_prompt_tokens = 0
+        self.messages_at_last_call = 0
+        self.elided_tokens = 0
+        self.tokens_saved = 0
+
+    def observe(self, response, message_count: int) -> None:
+        """Record the prompt size reported for the request that produced a response."""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None and usage.prompt_token_count:
+            self.last_prompt_tokens = usage.prompt_token_count
+        self.messages_at_last_call = message_count
+        # Everything elided so far was left out of the request just made
+        self.tokens_saved += self.elided_tokens
+
+    def compact(self, messages: list) -> int:
+        """Elide stale tool output in place if over budget; return the estimated tokens removed."""
+        if not self.token_budget:
+            return 0
+
+        new_chars = sum(self._message_chars(message) for message in messages[self.messages_at_last_call:])
+        projected = self.last_prompt_tokens + _estimate_tokens(new_chars)
+        if projected <= self.token_budget:
+            return 0
+
+        calls = self._collect_calls(messages)
+        protected_from = self._recent_turns_start(messages)
+
+        removed = self._elide_stale(calls, protected_from)
+        if projected - removed > self.token_budget:
+            old_calls = [call for call in calls if call["index"] < protected_from]
+            removed += self._elide_old(old_calls, projected - removed - self.token_budget)
+
+        self.elided_tokens += removed
+        return removed
+
+    def _message_chars(self, message) -> int:
+        chars = 0
+        for part in message.parts or []:
+            if part.text:
+                chars += len(part.text)
+            elif part.function_call:
+                chars += _size(part.function_call.args or {})
+            elif part.function_response:
+                chars += _size(part.function_response.response or {})
+        return chars
+
+    def _collect_calls(self, messages: list) -> list[dict]:
+        """Pair each function response with the call (and arguments) that produced it."""
+        calls = []
+        pending = []
+        for index, message in enumerate(messages):
+            for part in message.parts or []:
+                if part.function_call:
+                    pending.append({"call": part.function_call, "call_index": index})
+                elif part.function_response and pending:
+                    call = pending.pop(0)
+                    args = call["call"].args or {}
+                    calls.append({
+                        "name": part.function_response.name,
+                        "args": args,
+                        "path": _call_path(args),
+                        "call": call["call"],
+                        "response": part.function_response,
+                        "index": index,
+                    })
+        return calls
+
+    def _recent_turns_start(self, messages: list) -> int:
+        """Index of the first message belonging to the protected recent turns."""
+        if self.keep_recent_turns <= 0:
+            return len(messages)
+        model_turns = [i for i, message in enumerate(messages) if message.role == "model"]
+        if len(model_turns) < self.keep_recent_turns:
+            return 0
+        return model_turns[-self.keep_recent_turns]
+
+    def _elide_response(self, call: dict, reason: str) -> int:
+        response = call["response"]
+        if "elided" in (response.response or {}):
+            return 0
+        before = _size(response.response or {})
+        target = f"{call['name']}({call['path'] or ''})"
+        response.response = {"elided": f"Output of {target} ({before} chars) omitted: {reason}"}
+        return _estimate_tokens(before - _size(response.response))
+
+    def _elide_stale(self, calls: list[dict], protected_from: int) -> int:
+        """Elide outputs superseded by a later call; only calls before protected_from are touched."""
+        removed = 0
+        for position, call in enumerate(calls):
+            if call["path"] is None or call["index"] >= protected_from:
+                continue
+            later = calls[position + 1:]
+            if call["name"] == "get_file_content":
+                if any(c["path"] == call["path"] and c["name"] in WRITE_FUNCTIONS for c in later):
+                    removed += self._elide_response(call, "the file was rewritten afterwards")
+                elif any(c["path"] == call["path"] and c["name"] == "get_file_content" and c["args"] == call["args"]
+                         for c in later):
+                    removed += self._elide_response(call, "the file was read again afterwards")
+            elif call["name"] == "get_files_info":
+                if any(c["path"] and c["name"] in WRITE_FUNCTIONS and _is_within(c["path"], call["path"])
+                       for c in later):
+                    removed += self._elide_response(call, "the directory changed afterwards")
+                elif any(c["path"] == call["path"] and c["name"] == "get_files_info" for c in later):
+                    removed += self._elide_response(call, "the directory was listed again afterwards")
+            elif call["name"] == "run_python_file":
+                if any(c["path"] == call["path"] and c["name"] == "run_python_file" and c["args"] == call["args"]
+                       for c in later):
+                    removed += self._elide_response(call, "the same run was repeated afterwards")
+            elif call["name"] in WRITE_FUNCTIONS:
+                content = call["args"].get("content")
+                if isinstance(content, str) and len(content) > SUMMARY_PREVIEW_CHARS and any(
+                        c["path"] == call["path"] and c["name"] in WRITE_FUNCTIONS | READ_FUNCTIONS for c in later):
+                    call["call"].args = {**call["args"], "content": f"[{len(content)} chars omitted: superseded]"}
+                    removed += _estimate_tokens(len(content))
+        return removed
+
+    def _elide_old(self, calls: list[dict], tokens_needed: int) -> int:
+        """Cut the oldest remaining tool outputs to a preview until enough tokens are freed."""
+        removed = 0
+        for call in calls:
+            if removed >= tokens_needed:
+                break
+            response = call["response"]
+            if "elided" in (response.response or {}):
+                continue
+            text = json.dumps(response.response, default=str)
+            if len(text) <= SUMMARY_PREVIEW_CHARS:
+                continue
+            response.response = {
+                "elided": f"Output truncated to save context ({len(text)} chars); call the tool again if needed",
+                "preview": text[:SUMMARY_PREVIEW_CHARS],
+            }
+            removed += _estimate_tokens(len(text) - _size(response.response))
+        return removed
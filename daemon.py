@@ -0,0 +1,218 @@
+import json
+import os
+import shutil
+import socket
+import socketserver
+import sys
+import tempfile
+
+SOCKET_FLAG = "--socket"
+DEFAULT_SOCKET_PATH = os.path.join(tempfile.gettempdir(), f"ai-agent-{os.getuid()}.sock")
+
+USAGE_MESSAGE = f"""AI Code Assistant - daemon
+
+Usage: python daemon.py [--socket=PATH] [--workers=N] [--context-budget=N] [--max-iterations=N]
+                        [--record=FILE | --replay=FILE [--replay-latency=S]] [--base-url=URL]
+
+Keeps one model client, the tool schema, the tool caches and the Python
+worker pool warm, and answers prompts sent over a Unix socket
+(default {DEFAULT_SOCKET_PATH}). Send prompts with:
+
+  python main.py "your prompt here" --daemon[=PATH] [--verbose] [--workers=N] [--context-budget=N]
+                                                   [--max-iterations=N] [--working-dir=PATH]
+
+Several clients are served concurrently, each in its own conversation and
+working directory (default ./calculator relative to the daemon).
+"""
+
+
+class _EventStream:
+    """File-like AIAssistant output that forwards each printed line to the client as an event."""
+
+    def __init__(self, wfile):
+        self._wfile = wfile
+        self._buffer = ""
+
+    def write(self, text: str) -> int:
+        self._buffer += text
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            self.send({"type": "output", "text": line})
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+    def send(self, event: dict) -> None:
+        self._wfile.write((json.dumps(event) + "\n").encode())
+        self._wfile.flush()
+
+
+class _PromptHandler(socketserver.StreamRequestHandler):
+    """Runs one prompt per connection; the request is a single JSON line."""
+
+    def handle(self):
+        from main import AIAssistant
+
+        events = _EventStream(self.wfile)
+        server = self.server
+        try:
+            request = json.loads(self.rfile.readline())
+            verbose = bool(request.get("verbose", False))
+            assistant = AIAssistant(
+                None, verbose, int(request.get("max_workers", server.max_workers)),
+                client=server.client, output=events,
+                context_budget=int(request.get("context_budget", server.context_budget)),
+                max_iterations=int(request.get("max_iterations", server.max_iterations)),
+                working_dir=request.get("working_dir"),
+            )
+            response = assistant.generate_response(request["prompt"])
+            if verbose:
+                assistant.report_run()
+            events.send({"type": "response", "text": response})
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away; nothing is left to report to
+            pass
+        except Exception as e:
+            try:
+                events.send({"type": "error", "message": f"Unexpected error: {e}"})
+            except OSError:
+                pass
+
+
+class AgentDaemon(socketserver.ThreadingUnixStreamServer):
+    """Unix socket server sharing one warm model client between concurrent conversations."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, client, max_workers: int, context_budget: int, max_iterations: int):
+        self.client = client
+        self.max_workers = max_workers
+        self.context_budget = context_budget
+        self.max_iterations = max_iterations
+        _remove_stale_socket(socket_path)
+        super().__init__(socket_path, _PromptHandler)
+
+    def server_bind(self):
+        """Bind in a private directory and move the socket into place once it is owner-only."""
+        staging = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(self.server_address)))
+        try:
+            staged_path = os.path.join(staging, "socket")
+            self.socket.bind(staged_path)
+            os.chmod(staged_path, 0o600)
+            os.rename(staged_path, self.server_address)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+
+
+def _remove_stale_socket(socket_path: str) -> None:
+    """Unlink a socket file left behind by a daemon that is no longer running."""
+    if not os.path.exists(socket_path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except OSError:
+        os.unlink(socket_path)
+    else:
+        raise OSError(f"A daemon is already listening on {socket_path}")
+    finally:
+        probe.close()
+
+
+def warm_up() -> None:
+    """Import the SDK and tool schema and start the Python worker pool ahead of the first prompt."""
+    import call_function
+    from functions.config import PYTHON_BACKEND
+    from functions.python_pool import get_pool
+
+    call_function.available_functions
+    if PYTHON_BACKEND == "pool" and hasattr(os, "fork"):
+        get_pool()
+
+
+def ask(prompt: str, socket_path: str = DEFAULT_SOCKET_PATH, verbose: bool = False,
+        max_workers: int | None = None, context_budget: int | None = None, output=None,
+        max_iterations: int | None = None, working_dir: str | None = None) -> int:
+    """
+    Send a prompt to a running daemon and print its output as the CLI would.
+
+    Returns the exit code; raises ConnectionError if no daemon is listening.
+    """
+    output = output if output is not None else sys.stdout
+    request = {"prompt": prompt, "verbose": verbose}
+    if max_workers is not None:
+        request["max_workers"] = max_workers
+    if context_budget is not None:
+        request["context_budget"] = context_budget
+    if max_iterations is not None:
+        request["max_iterations"] = max_iterations
+    if working_dir is not None:
+        request["working_dir"] = working_dir
+
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            connection.connect(socket_path)
+        except OSError as e:
+            raise ConnectionError(f"No daemon listening on {socket_path}: {e}") from e
+        connection.sendall((json.dumps(request) + "\n").encode())
+        with connection.makefile('r') as events:
+            for line in events:
+                event = json.loads(line)
+                if event["type"] == "output":
+                    print(event["text"], file=output, flush=True)
+                elif event["type"] == "response":
+                    print("Final response:", file=output)
+                    print(event["text"], file=output)
+                    return 0
+                else:
+                    print(event["message"], file=output)
+                    return 1
+        print("Unexpected error: daemon closed the connection without a response", file=output)
+        return 1
+    finally:
+        connection.close()
+
+
+def main():
+    """Run the daemon in the foreground until interrupted."""
+    from dotenv import load_dotenv
+    from main import (create_client_from_arguments, get_flag_value, parse_context_budget, parse_max_iterations,
+                      parse_max_workers)
+
+    if "--help" in sys.argv:
+        print(USAGE_MESSAGE)
+        return
+
+    load_dotenv()
+    try:
+        client = create_client_from_arguments()
+        max_workers = parse_max_workers()
+        context_budget = parse_context_budget()
+        max_iterations = parse_max_iterations()
+        socket_path = get_flag_value(SOCKET_FLAG, DEFAULT_SOCKET_PATH)
+        warm_up()
+        server = AgentDaemon(socket_path, client, max_workers, context_budget, max_iterations)
+    except (ValueError, OSError) as e:
+        print(f"Configuration error: {e}")
+        sys.exit(1)
+
+    print(f"Listening on {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import os
+import re
+import threading
+from array import array
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+from .tracing import current_span
+from .tree_index import get_tree_index
+
+# Larger files are searched by scanning, never indexed
+MAX_INDEXED_FILE_SIZE = 1024 * 1024
+
+# A NUL byte in this many leading bytes marks a file as binary
+BINARY_SNIFF_BYTES = 8192
+
+# Postings are only intersected while the candidate set is larger than this, and
+# only with postings at most this many times its size
+MIN_CANDIDATES_TO_NARROW = 64
+NARROWING_RATIO = 16
+
+WORD_PATTERN = re.compile(r"\w{3,}")
+
+
+def _word_trigrams(text: str) -> set[str]:
+    """Case-folded trigrams of the identifier-like words (3+ word characters) in text."""
+    trigrams = set()
+    for word in set(WORD_PATTERN.findall(text.lower())):
+        for i in range(len(word) - 2):
+            trigrams.add(word[i:i + 3])
+    return trigrams
+
+
+def _literal_runs(parsed) -> list[str]:
+    """Literal strings every match of a parsed regex must contain."""
+    runs, current = [], []
+
+    def flush():
+        if current:
+            runs.append("".join(current))
+            current.clear()
+
+    for op, value in parsed:
+        if op is sre_constants.LITERAL:
+            current.append(chr(value))
+        elif op is sre_constants.SUBPATTERN and value[-1] is not None:
+            # A plain group: its own required literals still have to appear
+            flush()
+            runs.extend(_literal_runs(value[-1]))
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and value[0] >= 1:
+            flush()
+            runs.extend(_literal_runs(value[2]))
+        elif op is sre_constants.AT:
+            continue
+        else:
+            flush()
+    flush()
+    return runs
+
+
+def required_trigrams(query: str, regex: bool) -> set[str]:
+    """Trigrams any file matching the query must contain; empty if nothing can be required."""
+    if not regex:
+        return _word_trigrams(query)
+    try:
+        parsed = sre_parse.parse(query)
+    except re.error:
+        return set()
+    trigrams = set()
+    for run in _literal_runs(parsed):
+        trigrams |= _word_trigrams(run)
+    return trigrams
+
+
+def read_text(path: str) -> str | None:
+    """Read a file as text, or return None if it is binary or unreadable."""
+    try:
+        with open(path, 'rb') as file:
+            data = file.read()
+    except OSError:
+        return None
+    if b"\0" in data[:BINARY_SNIFF_BYTES]:
+        return None
+    return data.decode('utf-8', errors='replace')
+
+
+class CodeIndex:
+    """
+    Trigram index of the text files under a working directory.
+
+    Only trigrams inside words are indexed, which keeps the index small and
+    is enough to narrow any query with a 3+ character word in it down to a
+    few candidate files; candidates are then searched for real. Files are
+    discovered through the tree index, and only files whose size or mtime
+    changed there are re-read when it moves to a new version. Postings are
+    compact arrays of file ids; a changed file gets a new id and its old id
+    is dropped lazily.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.realpath(root)
+        self._tree = get_tree_index(self.root)
+        self._postings = {}
+        self._files = {}        # relpath -> (file id, mtime, size)
+        self._paths = []        # file id -> relpath, or None once the id is retired
+        self._unindexed = {}    # relpath -> (mtime, size) of files too large to index
+        self._live = 0
+        self._version = None
+        self._lock = threading.RLock()
+
+    def _add(self, relpath: str, mtime: float, size: int) -> None:
+        text = read_text(os.path.join(self.root, relpath))
+        if text is None:
+            return
+        file_id = len(self._paths)
+        self._paths.append(relpath)
+        self._files[relpath] = (file_id, mtime, size)
+        self._live += 1
+        for trigram in _word_trigrams(text):
+            posting = self._postings.get(trigram)
+            if posting is None:
+                posting = self._postings[trigram] = array('I')
+            posting.append(file_id)
+
+    def _retire(self, relpath: str) -> None:
+        file_id = self._files.pop(relpath)[0]
+        self._paths[file_id] = None
+        self._live -= 1
+
+    def _compact(self) -> None:
+        """Drop retired ids from every posting once they outnumber the live files."""
+        retired = len(self._paths) - self._live
+        if retired <= max(self._live, 1024):
+            return
+        live = self._paths
+        for trigram, posting in list(self._postings.items()):
+            kept = array('I', (file_id for file_id in posting if live[file_id] is not None))
+            if kept:
+                self._postings[trigram] = kept
+            else:
+                del self._postings[trigram]
+
+    def refresh(self) -> None:
+        """Bring the index in line with the tree index, re-reading changed files only."""
+        with self._lock:
+            listing = self._tree.listing(".", None, True, ())
+            if listing.version == self._version:
+                return
+            added = 0
+            seen = set()
+            for relpath, entry in listing.items:
+                if not entry[2]:
+                    continue
+                seen.add(relpath)
+                mtime, size = entry[6], entry[4]
+                known = self._files.get(relpath)
+                if known is not None and known[1:] == (mtime, size):
+                    continue
+                if known is not None:
+                    self._retire(relpath)
+                if size > MAX_INDEXED_FILE_SIZE:
+                    self._unindexed[relpath] = (mtime, size)
+                    continue
+                self._unindexed.pop(relpath, None)
+                self._add(relpath, mtime, size)
+                added += 1
+            for relpath in [path for path in self._files if path not in seen]:
+                self._retire(relpath)
+            for relpath in [path for path in self._unindexed if path not in seen]:
+                del self._unindexed[relpath]
+            self._compact()
+            self._version = listing.version
+            current_span().set(index_files_read=added)
+
+    def candidates(self, trigrams: set[str]):
+        """
+        Lazily yield the paths of the files that may contain every trigram, in
+        index order (path order, with files changed since the first build
+        last), followed by the files too large to index.
+        """
+        with self._lock:
+            if trigrams:
+                postings = sorted((self._postings.get(trigram, ()) for trigram in trigrams), key=len)
+                ids = postings[0]
+                for posting in postings[1:]:
+                    # Stop once the rest would cost more to intersect than to search
+                    if (len(ids) <= MIN_CANDIDATES_TO_NARROW or len(posting) > NARROWING_RATIO * len(ids)
+                            or 2 * len(posting) > self._live):
+                        break
+                    ids = set(ids) if isinstance(ids, array) else ids
+                    ids.intersection_update(posting)
+                ids = sorted(ids) if isinstance(ids, set) else array('I', ids)
+            else:
+                ids = range(len(self._paths))
+            unindexed = sorted(self._unindexed)
+        # Ids are never reused, so the path table can be read without the lock
+        paths = self._paths
+        for file_id in ids:
+            path = paths[file_id]
+            if path is not None:
+                yield path
+        yield from unindexed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"files": self._live, "trigrams": len(self._postings), "unindexed": len(self._unindexed)}
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_code_index(working_directory: str) -> CodeIndex:
+    """Return the session-wide code index for a working directory, building it lazily."""
+    root = os.path.realpath(working_directory)
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = CodeIndex(root)
+        return index
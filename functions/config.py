@@ -1 +1,21 @@
 FILE_CONTENT_LENGTH_LIMIT = 10000
+
+# run_python_file execution
+PYTHON_EXECUTABLE = "python3"
+PYTHON_TIMEOUT_SECONDS = 30
+# Limits on each run, enforced on the child as rlimits; CPU time beyond the limit kills it
+PYTHON_CPU_LIMIT_SECONDS = 30
+PYTHON_MEMORY_LIMIT_MB = 1024
+# A run is stopped once it has printed this much in total
+PYTHON_OUTPUT_LIMIT_BYTES = 16 * 1024 * 1024
+# Output kept of each stream: its first and last bytes, with anything between dropped
+PYTHON_OUTPUT_HEAD_BYTES = 4096
+PYTHON_OUTPUT_TAIL_BYTES = 4096
+# "pool" runs scripts in forked children of warm worker interpreters, "subprocess" starts a fresh one per call
+PYTHON_BACKEND = "pool"
+PYTHON_POOL_SIZE = 2
+PYTHON_WORKER_MAX_USES = 100
+PYTHON_WORKER_PRELOAD = (
+    "argparse", "collections", "json", "pathlib", "re", "shutil",
+    "subprocess", "traceback", "typing", "unittest",
+)
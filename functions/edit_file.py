@@ -0,0 +1,252 @@
+# functions/edit_file.py
+
+import difflib
+import os
+import re
+
+from .write_file_content import atomic_write
+
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+# How much of the file around a failed match is quoted back to the model
+CONTEXT_PREVIEW_LINES = 3
+
+
+class EditConflict(Exception):
+    """An edit does not match the current file; the message says where and why."""
+
+
+def _strip_eol(line: str) -> str:
+    return line.rstrip("\r\n")
+
+
+def _line_number(text: str, position: int) -> int:
+    return text.count("\n", 0, position) + 1
+
+
+def _closest_match(lines: list[str], block: list[str]) -> str:
+    """Describe where the file comes closest to a block that was not found."""
+    wanted = [_strip_eol(line) for line in block]
+    if not any(line.strip() for line in wanted):
+        return ""
+    stripped = [_strip_eol(line).strip() for line in lines]
+
+    # The most common mismatch: right lines, different indentation or trailing spaces
+    wanted_stripped = [line.strip() for line in wanted]
+    for start in range(len(lines) - len(wanted) + 1):
+        if stripped[start:start + len(wanted)] == wanted_stripped:
+            return (f" The text matches lines {start + 1}-{start + len(wanted)} except for whitespace; "
+                    "copy the indentation exactly as it appears in the file.")
+
+    anchor = next(line for line in wanted_stripped if line)
+    candidates = difflib.get_close_matches(anchor, stripped, n=1, cutoff=0.6)
+    if not candidates:
+        return " No similar text was found in the file."
+    start = max(stripped.index(candidates[0]) - wanted_stripped.index(anchor), 0)
+    found = [_strip_eol(line) for line in lines[start:start + len(wanted)]]
+    diff = "\n".join(difflib.unified_diff(wanted, found, "expected", f"file lines {start + 1}-{start + len(found)}",
+                                          lineterm="", n=CONTEXT_PREVIEW_LINES))
+    return f" Closest text starts at line {start + 1}:\n{diff}"
+
+
+def apply_search_replace(text: str, edits: list[dict]) -> tuple[str, list[str]]:
+    """Apply search/replace blocks in order; return the new text and a note per block."""
+    crlf = "\r\n" in text
+    notes = []
+    for number, edit in enumerate(edits, 1):
+        search = edit.get("search")
+        replace = edit.get("replace", "")
+        if not search or not isinstance(search, str):
+            raise EditConflict(f"Edit {number}: 'search' must be a non-empty string")
+        if not isinstance(replace, str):
+            raise EditConflict(f"Edit {number}: 'replace' must be a string")
+        if crlf:
+            # Blocks are written with \n; match and keep the file's CRLF line endings
+            search = search.replace("\r\n", "\n").replace("\n", "\r\n")
+            replace = replace.replace("\r\n", "\n").replace("\n", "\r\n")
+
+        count = text.count(search)
+        if count == 0:
+            lines = text.splitlines(keepends=True)
+            raise EditConflict(f"Edit {number}: search text not found."
+                               f"{_closest_match(lines, search.splitlines(keepends=True))}")
+        if count > 1 and not edit.get("replace_all"):
+            positions, start = [], text.find(search)
+            while start != -1:
+                positions.append(str(_line_number(text, start)))
+                start = text.find(search, start + 1)
+            raise EditConflict(f"Edit {number}: search text occurs {count} times (lines {', '.join(positions)}); "
+                               "add surrounding lines to make it unique or set replace_all")
+
+        line = _line_number(text, text.find(search))
+        text = text.replace(search, replace) if edit.get("replace_all") else text.replace(search, replace, 1)
+        notes.append(f"edit {number} at line {line}" + (f" ({count} occurrences)" if count > 1 else ""))
+    return text, notes
+
+
+def parse_unified_diff(diff: str) -> list[dict]:
+    """Parse the hunks of a single-file unified diff."""
+    hunks = []
+    headers = 0
+    hunk = None
+    for raw in diff.splitlines():
+        if raw.startswith("--- ") and (hunk is None or hunk["remaining_old"] <= 0 and hunk["remaining_new"] <= 0):
+            headers += 1
+            if headers > 1:
+                raise EditConflict("The diff changes more than one file; send one diff per file")
+            hunk = None
+            continue
+        if raw.startswith("+++ ") and hunk is None:
+            continue
+        match = HUNK_HEADER.match(raw)
+        if match:
+            old_start, old_count, new_start, new_count = match.groups()
+            hunk = {
+                "old_start": int(old_start),
+                "old": [],
+                "new": [],
+                "remaining_old": int(old_count) if old_count is not None else 1,
+                "remaining_new": int(new_count) if new_count is not None else 1,
+                "old_no_newline": False,
+                "new_no_newline": False,
+                "last_tag": None,
+            }
+            hunks.append(hunk)
+            continue
+        if hunk is None:
+            # Text before the first header, e.g. "diff --git" or "index" lines
+            continue
+        if raw.startswith("\\"):
+            # "\ No newline at end of file" applies to the side(s) of the line before it
+            if hunk["last_tag"] in (" ", "-"):
+                hunk["old_no_newline"] = True
+            if hunk["last_tag"] in (" ", "+"):
+                hunk["new_no_newline"] = True
+            continue
+        tag, line = (raw[0], raw[1:]) if raw else (" ", "")
+        hunk["last_tag"] = tag
+        if tag == " ":
+            hunk["old"].append(line)
+            hunk["new"].append(line)
+            hunk["remaining_old"] -= 1
+            hunk["remaining_new"] -= 1
+        elif tag == "-":
+            hunk["old"].append(line)
+            hunk["remaining_old"] -= 1
+        elif tag == "+":
+            hunk["new"].append(line)
+            hunk["remaining_new"] -= 1
+        else:
+            raise EditConflict(f"Hunk {len(hunks)}: unexpected line in diff: {raw[:80]!r}")
+
+    if not hunks:
+        raise EditConflict("The diff contains no hunks (expected lines starting with @@)")
+    return hunks
+
+
+def apply_unified_diff(text: str, diff: str) -> tuple[str, list[str]]:
+    """
+    Apply a unified diff to text. Each hunk must match exactly, but may have
+    moved from the line its header gives; the nearest match after the
+    previous hunk is used.
+    """
+    lines = text.splitlines(keepends=True)
+    stripped = [_strip_eol(line) for line in lines]
+    newline = "\r\n" if lines and lines[0].endswith("\r\n") else "\n"
+    result = []
+    cursor = 0
+    # How far the previous hunk was found from where its header put it; headers
+    # number lines of the original file, which is what `lines` indexes
+    drift = 0
+    notes = []
+
+    for number, hunk in enumerate(parse_unified_diff(diff), 1):
+        old, new = hunk["old"], hunk["new"]
+        # A header's start line is 1-based, or the line after which to insert when the old side is empty
+        header_position = hunk["old_start"] - (1 if old else 0)
+        expected = min(max(header_position + drift, cursor), len(lines))
+
+        if stripped[expected:expected + len(old)] == old:
+            position = expected
+        else:
+            matches = [start for start in range(cursor, len(lines) - len(old) + 1)
+                       if stripped[start:start + len(old)] == old]
+            if not matches:
+                raise EditConflict(f"Hunk {number} (@@ -{hunk['old_start']}) does not apply: "
+                                   f"{_describe_mismatch(stripped, old, expected)}")
+            position = min(matches, key=lambda start: abs(start - expected))
+
+        result.extend(lines[cursor:position])
+        replaced = lines[position:position + len(old)]
+        new_lines = [line + newline for line in new]
+        if new_lines and position + len(old) == len(lines):
+            # Diffs written by hand often omit the "No newline" marker, so a missing
+            # final newline is kept when the hunk ends on an unchanged line
+            file_lacks_newline = bool(replaced) and not replaced[-1].endswith("\n")
+            if hunk["new_no_newline"] or (file_lacks_newline and not hunk["old_no_newline"]
+                                          and hunk["last_tag"] == " "):
+                new_lines[-1] = _strip_eol(new_lines[-1])
+        if new_lines and result and not result[-1].endswith("\n"):
+            # Lines inserted after a last line without a newline would be joined onto it
+            result[-1] += newline
+        result.extend(new_lines)
+        cursor = position + len(old)
+        drift = position - header_position
+        notes.append(f"hunk {number} at line {position + 1}"
+                     + (f" (offset {drift:+d} lines)" if drift and old else "")
+                     + f": -{len(old)} +{len(new)}")
+
+    result.extend(lines[cursor:])
+    return "".join(result), notes
+
+
+def _describe_mismatch(stripped: list[str], old: list[str], expected: int) -> str:
+    """Explain why a hunk's old lines do not match the file at the expected line."""
+    for index, line in enumerate(old):
+        position = expected + index
+        if position >= len(stripped):
+            return f"the file ends at line {len(stripped)}, but the hunk expects {line!r} at line {position + 1}"
+        if stripped[position] != line:
+            return (f"line {position + 1} is {stripped[position]!r} but the hunk expects {line!r}, "
+                    "and the hunk's lines were not found anywhere else in the file")
+    return "its lines were not found in the file"
+
+
+def edit_file(working_directory, file_path, edits=None, diff=None):
+    abs_working_dir = os.path.abspath(working_directory)
+    abs_file_path = os.path.abspath(os.path.join(abs_working_dir, file_path))
+
+    # Check if the file path is outside of the working directory
+    if not abs_file_path.startswith(abs_working_dir + os.sep):
+        return f'Error: Cannot edit "{file_path}" as it is outside the permitted working directory'
+    if (edits is None) == (diff is None):
+        return 'Error: Provide either edits (search/replace blocks) or diff (a unified diff), not both'
+    if not os.path.isfile(abs_file_path):
+        return f'Error: File not found: "{file_path}". Use write_file to create new files'
+
+    try:
+        with open(abs_file_path, 'rb') as file:
+            data = file.read()
+        try:
+            # Decoded without newline translation, so CRLF files keep their line endings
+            text = data.decode('utf-8')
+        except UnicodeDecodeError:
+            return f'Error: "{file_path}" is not a UTF-8 text file'
+
+        if diff is not None:
+            new_text, notes = apply_unified_diff(text, diff)
+        else:
+            new_text, notes = apply_search_replace(text, list(edits))
+
+        if new_text == text:
+            return f'No changes: the edits leave "{file_path}" unchanged'
+
+        # Nothing is written unless every block applied
+        atomic_write(abs_file_path, new_text.encode('utf-8'))
+        old_lines, new_lines = len(text.splitlines()), len(new_text.splitlines())
+        return (f'Successfully edited "{file_path}": {"; ".join(notes)}. '
+                f'The file now has {new_lines} lines ({new_lines - old_lines:+d}).')
+    except EditConflict as e:
+        return f'Error: {e}\nNo changes were written to "{file_path}"'
+    except Exception as e:
+        return f'Error: {str(e)}'
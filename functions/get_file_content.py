@@ -1,14 +1,110 @@
+import codecs
 import os
+from functools import lru_cache
+
 from .config import FILE_CONTENT_LENGTH_LIMIT
 
-def get_file_content(working_directory, file_path):
+# Files are scanned in chunks of this size so memory never grows with file size
+READ_CHUNK_SIZE = 1 << 20
+
+@lru_cache(maxsize=128)
+def _count_lines(path, mtime_ns, size):
+    # mtime_ns and size are part of the cache key so a modified file is recounted
+    lines = 0
+    last = b""
+    with open(path, 'rb') as file:
+        while chunk := file.read(READ_CHUNK_SIZE):
+            lines += chunk.count(b"\n")
+            last = chunk[-1:]
+    if last and last != b"\n":
+        lines += 1
+    return lines
+
+def _line_start(file, size, line_number):
+    # Byte offset where the 1-based line starts, or None if the file has fewer lines
+    if line_number <= 1:
+        return 0
+    newlines_needed = line_number - 1
+    position = 0
+    file.seek(0)
+    while chunk := file.read(READ_CHUNK_SIZE):
+        count = chunk.count(b"\n")
+        if count >= newlines_needed:
+            index = -1
+            for _ in range(newlines_needed):
+                index = chunk.index(b"\n", index + 1)
+            start = position + index + 1
+            return start if start < size else None
+        newlines_needed -= count
+        position += len(chunk)
+    return None
+
+def _decode(data, final):
+    # Decode UTF-8, holding back a character split at the end of the slice
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    text = decoder.decode(data, final=final)
+    pending = len(decoder.getstate()[0])
+    return text, len(data) - pending
+
+def _read_bytes(file, size, offset, length):
+    requested_end = size if length is None else min(offset + length, size)
+    file.seek(offset)
+    data = file.read(min(requested_end - offset, FILE_CONTENT_LENGTH_LIMIT))
+    content, consumed = _decode(data, final=offset + len(data) >= size)
+    end = offset + consumed
+    return {
+        "content": content,
+        "range": {"offset": offset, "length": consumed},
+        "truncated": end < requested_end,
+        "next_offset": end if end < size else None,
+    }
+
+def _read_lines(file, size, start_line, end_line):
+    start = _line_start(file, size, start_line)
+    if start is None:
+        return None
+
+    file.seek(start)
+    budget = FILE_CONTENT_LENGTH_LIMIT
+    chunks = []
+    line_number = start_line - 1
+    cut_offset = None
+    while end_line is None or line_number < end_line:
+        line = file.readline(budget + 1)
+        if not line:
+            break
+        if len(line) > budget:
+            # The next line does not fit; return what fits if nothing has been read yet
+            if not chunks:
+                chunks.append(line[:budget])
+                cut_offset = start + budget
+            break
+        chunks.append(line)
+        budget -= len(line)
+        line_number += 1
+
+    data = b"".join(chunks)
+    content, consumed = _decode(data, final=start + len(data) >= size)
+    if cut_offset is not None:
+        cut_offset = start + consumed
+    last_line = start_line if cut_offset is not None else line_number
+    more = start + consumed < size
+    return {
+        "content": content,
+        "range": {"start_line": start_line, "end_line": last_line},
+        "truncated": cut_offset is not None or (more and (end_line is None or line_number < end_line)),
+        "next_line": (line_number + 1) if more and cut_offset is None else None,
+        "next_offset": cut_offset,
+    }
+
+def get_file_content(working_directory, file_path, offset=None, length=None, start_line=None, end_line=None):
     try:
         # Ensure the file path is within the working directory
         absolute_working_dir = os.path.abspath(working_directory)
         absolute_file_path = os.path.abspath(os.path.join(absolute_working_dir, file_path))
 
         # Fix the path check to allow files directly in the working directory
-        if not (absolute_file_path.startswith(absolute_working_dir + os.sep) or 
+        if not (absolute_file_path.startswith(absolute_working_dir + os.sep) or
                 absolute_file_path == absolute_working_dir or
                 os.path.dirname(absolute_file_path) == absolute_working_dir):
             return f'Error: Cannot read "{file_path}" as it is outside the permitted working directory'
@@ -17,16 +113,40 @@ def get_file_content(working_directory, file_path):
         if not os.path.isfile(absolute_file_path):
             return f'Error: File not found or is not a regular file: "{file_path}"'
 
-        # Read the file content
-        with open(absolute_file_path, 'r') as file:
-            content = file.read()
+        line_mode = start_line is not None or end_line is not None
+        if line_mode and (offset is not None or length is not None):
+            return 'Error: Use either offset/length or start_line/end_line, not both'
+
+        for name, value in (("offset", offset), ("length", length), ("start_line", start_line), ("end_line", end_line)):
+            if value is not None and (int(value) != value or value < 0):
+                return f'Error: {name} must be a non-negative integer, got {value!r}'
+
+        st = os.stat(absolute_file_path)
+        size = st.st_size
+        total_lines = _count_lines(absolute_file_path, st.st_mtime_ns, size)
+
+        # Only the requested slice (at most FILE_CONTENT_LENGTH_LIMIT bytes) is read into memory
+        with open(absolute_file_path, 'rb') as file:
+            if line_mode:
+                start_line = max(int(start_line or 1), 1)
+                end_line = int(end_line) if end_line is not None else None
+                if end_line is not None and end_line < start_line:
+                    return f'Error: end_line ({end_line}) is before start_line ({start_line})'
+                result = _read_lines(file, size, start_line, end_line)
+                if result is None:
+                    return f'Error: start_line {start_line} is past the end of "{file_path}" ({total_lines} lines)'
+            else:
+                offset = int(offset or 0)
+                if offset > size:
+                    return f'Error: offset {offset} is past the end of "{file_path}" ({size} bytes)'
+                length = int(length) if length is not None else None
+                result = _read_bytes(file, size, offset, length)
 
-        # Truncate the content if it exceeds the limit
-        if len(content) > FILE_CONTENT_LENGTH_LIMIT:
-            truncated_content = content[:FILE_CONTENT_LENGTH_LIMIT] + f'[...File "{file_path}" truncated at {FILE_CONTENT_LENGTH_LIMIT} characters]'
-            return truncated_content
+        if result["truncated"]:
+            result["note"] = (f'Output limited to {FILE_CONTENT_LENGTH_LIMIT} bytes; '
+                              'use offset/length or start_line/end_line to read further')
 
-        return content
+        return {"file_path": file_path, "total_bytes": size, "total_lines": total_lines, **result}
 
     except Exception as e:
-        return f'Error: {e}'
\ No newline at end of file
+        return f'Error: {e}'
@@ -1,12 +1,30 @@
 # functions/get_files_info.py
 
 import os
-import stat
-import time
 from pathlib import Path
 from typing import Dict, Any, List
 
-def get_files_info(working_directory: str, directory: str = ".") -> Dict[str, Any]:
+from .tree_index import Listing, compile_glob, format_entry, get_tree_index
+
+# Page size for recursive listings when no limit is given
+DEFAULT_RECURSIVE_LIMIT = 200
+
+def _parse_count(name: str, value, minimum: int) -> int | None:
+    """Parse an optional whole-number argument, rejecting anything below `minimum`."""
+    if value is None:
+        return None
+    try:
+        number = int(str(value).strip())
+    except ValueError:
+        raise ValueError(f"{name} must be a whole number, got {value!r}") from None
+    if number < minimum:
+        raise ValueError(f"{name} must be at least {minimum}, got {value!r}")
+    return number
+
+def get_files_info(working_directory: str, directory: str = ".", recursive: bool = False,
+                   max_depth: int | None = None, pattern: str | None = None,
+                   ignore: List[str] | None = None, respect_gitignore: bool = True,
+                   cursor: str | None = None, limit: int | None = None) -> Dict[str, Any]:
     try:
         wd = Path(working_directory).resolve()
         target = (wd / directory).resolve()
@@ -35,40 +53,48 @@ def get_files_info(working_directory: str, directory: str = ".") -> Dict[str, An
                 "directory": str(Path(directory)),
             }
 
-        entries: List[Dict[str, Any]] = []
+        try:
+            depth = _parse_count("max_depth", max_depth, 1) if recursive else 1
+            offset = _parse_count("cursor", cursor or 0, 0)
+            # An empty page would hand back the same cursor forever
+            limit = _parse_count("limit", DEFAULT_RECURSIVE_LIMIT if limit is None and recursive else limit, 1)
+        except ValueError as e:
+            return {
+                "ok": False,
+                "error": str(e),
+                "cwd": str(wd),
+                "directory": str(Path(directory)),
+            }
+
+        # The index is built once per session and only rescans directories whose mtime changed
+        index = get_tree_index(str(wd))
+        relpath = target.relative_to(wd).as_posix()
+        listing = index.listing(relpath, depth, respect_gitignore, tuple(ignore or ()))
+        walked = listing.items
 
-        with os.scandir(target) as it:
-            for entry in it:
-                try:
-                    st = entry.stat(follow_symlinks=False)
-                    relpath = str(Path(entry.path).resolve().relative_to(wd))
-                    entries.append({
-                        "name": entry.name,
-                        "relpath": relpath,
-                        "is_dir": stat.S_ISDIR(st.st_mode),
-                        "is_file": stat.S_ISREG(st.st_mode),
-                        "is_symlink": entry.is_symlink(),
-                        "size": st.st_size,
-                        "mode": oct(st.st_mode),
-                        "modified_ts": round(st.st_mtime, 2),
-                        "modified_iso": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(st.st_mtime)),
-                    })
-                except Exception as e:
-                    entries.append({
-                        "name": entry.name,
-                        "relpath": str(Path(entry.path)),
-                        "error": f"{type(e).__name__}: {e}",
-                    })
+        if pattern:
+            matcher = compile_glob(pattern)
+            prefix = "" if relpath == "." else relpath + "/"
+            walked = [item for item in walked if matcher.match(item[0][len(prefix):])]
 
-        entries.sort(key=lambda x: (not x.get("is_dir", False), x.get("name", "").lower()))
+        page = walked[offset:offset + limit] if limit is not None else walked[offset:]
+        next_offset = offset + len(page)
 
-        return {
+        entries: List[Dict[str, Any]] = [format_entry(path, entry) for path, entry in page]
+
+        result = {
             "ok": True,
             "error": None,
             "cwd": str(wd),
             "directory": str(Path(directory)),
             "entries": entries,
         }
+        if recursive or cursor or limit is not None:
+            result["total_entries"] = len(walked)
+            result["next_cursor"] = str(next_offset) if next_offset < len(walked) else None
+        if recursive:
+            result["summary"] = listing.summary() if not pattern else Listing(walked, listing.version).summary()
+        return result
 
     except Exception as e:
         return {
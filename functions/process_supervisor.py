@@ -0,0 +1,186 @@
+"""
+Supervision of a script's child process for run_python_file.
+
+The child's stdout and stderr are read from pipes as they are written and
+kept as a bounded head and tail, so the memory used is the same whether the
+script prints a line or gigabytes. The child runs under CPU and memory
+rlimits, is killed once its output passes the output limit or the timeout
+expires, and is reaped with wait4 to report its CPU time and max RSS.
+
+Used by both backends: imported by run_python, and by the pool's worker,
+which is run by path, so only the standard library is used.
+"""
+import os
+import resource
+import select
+import signal
+import sys
+import time
+
+READ_CHUNK_BYTES = 64 * 1024
+# How often child exit is checked when pidfds are not available
+POLL_INTERVAL = 0.01
+
+
+class BoundedCapture:
+    """The first head_bytes and last tail_bytes of a stream, with a count of what was dropped between."""
+
+    def __init__(self, head_bytes: int, tail_bytes: int):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def write(self, data: bytes) -> None:
+        self.total += len(data)
+        room = self.head_bytes - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self.tail += data[-self.tail_bytes:] if self.tail_bytes else b""
+            if len(self.tail) > self.tail_bytes:
+                del self.tail[:len(self.tail) - self.tail_bytes]
+
+    @property
+    def dropped(self) -> int:
+        return self.total - len(self.head) - len(self.tail)
+
+    def text(self) -> str:
+        head = self.head.decode("utf-8", errors="replace")
+        tail = self.tail.decode("utf-8", errors="replace")
+        if self.dropped:
+            return f"{head}\n... [{self.dropped} bytes of output dropped] ...\n{tail}"
+        return head + tail
+
+
+def apply_limits(limits: dict, pid: int = 0) -> None:
+    """Set the CPU-time and address-space rlimits of a process (0: the calling one)."""
+    if pid and not hasattr(resource, "prlimit"):
+        # Only Linux can limit another process; elsewhere the run goes without
+        return
+    cpu_seconds = limits.get("cpu_seconds")
+    memory_bytes = limits.get("memory_bytes")
+    for kind, soft, hard in ((resource.RLIMIT_CPU, cpu_seconds, cpu_seconds and cpu_seconds + 1),
+                             (resource.RLIMIT_AS, memory_bytes, memory_bytes)):
+        if not soft:
+            continue
+        try:
+            # A limit already lower than ours stays in place
+            current_soft, current_hard = resource.getrlimit(kind)
+            if current_hard != resource.RLIM_INFINITY:
+                hard = min(hard, current_hard)
+                soft = min(soft, hard)
+            if pid:
+                resource.prlimit(pid, kind, (soft, hard))
+            else:
+                resource.setrlimit(kind, (soft, hard))
+        except (ValueError, OSError):
+            pass
+
+
+def _kill(pid: int) -> None:
+    """Kill the child together with anything it started."""
+    for kill in (lambda: os.killpg(pid, signal.SIGKILL), lambda: os.kill(pid, signal.SIGKILL)):
+        try:
+            kill()
+            break
+        except OSError:
+            continue
+
+
+def _read_available(fds: dict, budget: int) -> None:
+    """Read what is already in the pipes, without waiting, up to budget bytes."""
+    for fd, capture in list(fds.items()):
+        while budget > 0 and select.select([fd], [], [], 0)[0]:
+            data = os.read(fd, READ_CHUNK_BYTES)
+            if not data:
+                break
+            capture.write(data)
+            budget -= len(data)
+
+
+def supervise(pid: int, stdout_fd: int, stderr_fd: int, limits: dict, timeout: float) -> dict:
+    """
+    Collect a child's output until it exits, then reap it.
+
+    Returns stdout, stderr, returncode, timed_out, limit (None, "output",
+    "cpu" or "memory": the limit the run was stopped by) and metrics.
+    """
+    started = time.perf_counter()
+    deadline = time.monotonic() + timeout
+    stdout = BoundedCapture(limits["head_bytes"], limits["tail_bytes"])
+    stderr = BoundedCapture(limits["head_bytes"], limits["tail_bytes"])
+    fds = {stdout_fd: stdout, stderr_fd: stderr}
+    output_limit = limits.get("output_bytes")
+    pidfd = None
+    if hasattr(os, "pidfd_open"):
+        try:
+            pidfd = os.pidfd_open(pid)
+        except OSError:
+            pidfd = None
+
+    status = usage = None
+    timed_out = False
+    limit = None
+    try:
+        while True:
+            waited, wait_status, wait_usage = os.wait4(pid, os.WNOHANG)
+            if waited:
+                status, usage = wait_status, wait_usage
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                timed_out = True
+                break
+            watch = list(fds) + ([pidfd] if pidfd is not None else [])
+            wait = remaining if pidfd is not None else min(POLL_INTERVAL, remaining)
+            for fd in select.select(watch, [], [], wait)[0]:
+                if fd == pidfd:
+                    continue
+                data = os.read(fd, READ_CHUNK_BYTES)
+                if data:
+                    fds[fd].write(data)
+                else:
+                    del fds[fd]
+            if output_limit and stdout.total + stderr.total > output_limit:
+                limit = "output"
+                break
+
+        if status is None:
+            _kill(pid)
+            _, status, usage = os.wait4(pid, 0)
+        else:
+            # Whatever the child wrote just before exiting; a grandchild holding the pipe is not waited for
+            _read_available(fds, output_limit or READ_CHUNK_BYTES * 16)
+    finally:
+        if pidfd is not None:
+            os.close(pidfd)
+
+    returncode = None if timed_out else os.waitstatus_to_exitcode(status)
+    cpu_s = usage.ru_utime + usage.ru_stime
+    if limit is None and not timed_out and returncode:
+        # The soft limit sends SIGXCPU, the hard one a second later SIGKILL
+        if returncode == -signal.SIGXCPU or (returncode == -signal.SIGKILL and limits.get("cpu_seconds")
+                                             and cpu_s >= limits["cpu_seconds"]):
+            limit = "cpu"
+        elif b"MemoryError" in stderr.tail or b"MemoryError" in stderr.head:
+            limit = "memory"
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    max_rss_kb = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+    return {
+        "stdout": stdout.text(),
+        "stderr": stderr.text(),
+        "returncode": returncode,
+        "timed_out": timed_out,
+        "limit": limit,
+        "metrics": {
+            "wall_s": round(time.perf_counter() - started, 6),
+            "cpu_s": round(cpu_s, 6),
+            "max_rss_kb": max_rss_kb,
+            "output_bytes": stdout.total + stderr.total,
+            "dropped_bytes": stdout.dropped + stderr.dropped,
+        },
+    }
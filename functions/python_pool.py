@@ -0,0 +1,172 @@
+import atexit
+import json
+import os
+import select
+import subprocess
+import threading
+
+from .config import (
+    PYTHON_EXECUTABLE,
+    PYTHON_POOL_SIZE,
+    PYTHON_WORKER_MAX_USES,
+    PYTHON_WORKER_PRELOAD,
+)
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "python_worker.py")
+# Extra time a worker gets beyond the script timeout before it is presumed hung
+WORKER_GRACE_SECONDS = 5
+
+
+class WorkerError(Exception):
+    """A worker died or stopped responding; the caller should fall back to a cold run."""
+
+
+class _Worker:
+    """Handle on one warm worker interpreter."""
+
+    def __init__(self, preload):
+        self.process = subprocess.Popen(
+            [PYTHON_EXECUTABLE, WORKER_SCRIPT, json.dumps(list(preload))],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            env=os.environ.copy(),
+        )
+        self.uses = 0
+        self.ready = False
+
+    def _read_line(self, timeout: float) -> dict:
+        readable, _, _ = select.select([self.process.stdout], [], [], timeout)
+        line = self.process.stdout.readline() if readable else ""
+        if not line:
+            raise WorkerError("worker did not respond")
+        return json.loads(line)
+
+    def request(self, payload: dict, timeout: float) -> dict:
+        if not self.ready:
+            # Startup (the preload imports) overlaps with whatever happened since spawning
+            self._read_line(timeout)
+            self.ready = True
+        try:
+            self.process.stdin.write(json.dumps(payload) + "\n")
+            self.process.stdin.flush()
+        except OSError as e:
+            raise WorkerError(f"worker pipe closed: {e}")
+        self.uses += 1
+        return self._read_line(timeout)
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def stop(self) -> None:
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+class PythonWorkerPool:
+    """
+    Pool of pre-started worker interpreters for run_python_file.
+
+    Workers import PYTHON_WORKER_PRELOAD once and fork a fresh child for every
+    run, so a run costs a fork instead of interpreter startup and imports.
+    A worker is replaced after max_uses runs, when it reports that its own
+    global state drifted, or when it fails; replacements are started eagerly
+    so they are warm by the time they are needed.
+    """
+
+    def __init__(self, size: int = PYTHON_POOL_SIZE, max_uses: int = PYTHON_WORKER_MAX_USES,
+                 preload=PYTHON_WORKER_PRELOAD):
+        self.size = size
+        self.max_uses = max_uses
+        self.preload = preload
+        self._idle = []
+        self._started = 0
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def _acquire(self) -> _Worker:
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise WorkerError("pool is shut down")
+                while self._idle:
+                    worker = self._idle.pop()
+                    if worker.alive():
+                        return worker
+                    self._started -= 1
+                if self._started < self.size:
+                    self._started += 1
+                    break
+                self._condition.wait()
+        try:
+            return _Worker(self.preload)
+        except OSError as e:
+            with self._condition:
+                self._started -= 1
+                self._condition.notify()
+            raise WorkerError(f"could not start worker: {e}")
+
+    def _release(self, worker: _Worker, reusable: bool) -> None:
+        replacement = None
+        if not reusable or worker.uses >= self.max_uses or not worker.alive():
+            worker.stop()
+            try:
+                replacement = _Worker(self.preload)
+            except OSError:
+                replacement = None
+        else:
+            replacement = worker
+        with self._condition:
+            if replacement is None:
+                self._started -= 1
+            elif self._closed:
+                replacement.stop()
+            else:
+                self._idle.append(replacement)
+            self._condition.notify()
+
+    def run(self, file_path: str, args: list, cwd: str, pythonpath: str, timeout: float, limits: dict) -> dict:
+        """Run a script in a warm worker under the given limits; returns what process_supervisor.supervise does."""
+        worker = self._acquire()
+        reusable = False
+        try:
+            payload = {"file": file_path, "args": list(args), "cwd": cwd,
+                       "pythonpath": pythonpath, "timeout": timeout, "limits": limits}
+            result = worker.request(payload, timeout + WORKER_GRACE_SECONDS)
+            if "error" in result:
+                raise WorkerError(result["error"])
+            reusable = not result.get("dirty", False)
+            return result
+        finally:
+            self._release(worker, reusable)
+
+    def shutdown(self) -> None:
+        """Stop all idle workers; busy ones are stopped when released."""
+        with self._condition:
+            self._closed = True
+            workers, self._idle = self._idle, []
+            self._condition.notify_all()
+        for worker in workers:
+            worker.stop()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> PythonWorkerPool:
+    """Return the process-wide worker pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PythonWorkerPool()
+            atexit.register(_pool.shutdown)
+        return _pool
@@ -0,0 +1,143 @@
+"""
+Warm worker for run_python_file.
+
+Started once by PythonWorkerPool, it imports commonly used modules and then
+serves run requests read as JSON lines from stdin. Each run is executed in a
+forked child with its own cwd, argv, sys.path, environment, rlimits and
+stdout/stderr pipes, so scripts start from the warm state but cannot change
+it; process_supervisor collects their output. Only the standard library is
+used; this file is run by path, not imported.
+"""
+import importlib
+import json
+import os
+import signal
+import sys
+import traceback
+
+from process_supervisor import apply_limits, supervise
+
+
+def _exit_code(exc: SystemExit) -> int:
+    """Translate SystemExit the way the interpreter does on exit."""
+    code = exc.code
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def _print_script_traceback(exc: BaseException, file_path: str) -> None:
+    """Print a traceback starting at the script's own frame, like a cold interpreter."""
+    tb = exc.__traceback__
+    while tb is not None and tb.tb_frame.f_code.co_filename != file_path:
+        tb = tb.tb_next
+    traceback.print_exception(type(exc), exc, tb or exc.__traceback__)
+
+
+def _run_child(request: dict, base_path: list, stdout_fd: int, stderr_fd: int) -> None:
+    """Body of the forked child: set up an isolated run of the script and exit."""
+    os.setpgid(0, 0)
+    apply_limits(request["limits"])
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.dup2(stdout_fd, 1)
+    os.dup2(stderr_fd, 2)
+    os.close(stdout_fd)
+    os.close(stderr_fd)
+
+    file_path = request["file"]
+    os.chdir(request["cwd"])
+    os.environ["PYTHONPATH"] = request["pythonpath"]
+    sys.argv = [file_path] + list(request["args"])
+    sys.path[:] = [os.path.dirname(file_path), request["pythonpath"]] + base_path
+    sys.stdout = open(1, "w", closefd=False)
+    sys.stderr = open(2, "w", closefd=False)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+
+    import runpy
+    code = 0
+    try:
+        runpy.run_path(file_path, run_name="__main__")
+    except SystemExit as exc:
+        code = _exit_code(exc)
+    except BaseException as exc:
+        _print_script_traceback(exc, file_path)
+        code = 1
+
+    try:
+        import atexit
+        import threading
+        # As the interpreter would at exit, wait for the script's non-daemon threads
+        while True:
+            pending = [thread for thread in threading.enumerate()
+                       if thread is not threading.current_thread() and not thread.daemon and thread.is_alive()]
+            if not pending:
+                break
+            for thread in pending:
+                thread.join()
+        atexit._run_exitfuncs()
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        os._exit(code)
+
+
+def run(request: dict, base_path: list) -> dict:
+    """Run one script in a forked child and collect its output."""
+    stdout_read, stdout_write = os.pipe()
+    stderr_read, stderr_write = os.pipe()
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            os.close(stdout_read)
+            os.close(stderr_read)
+            _run_child(request, base_path, stdout_write, stderr_write)
+        os.close(stdout_write)
+        os.close(stderr_write)
+        stdout_write = stderr_write = None
+        return supervise(pid, stdout_read, stderr_read, request["limits"], request["timeout"])
+    finally:
+        for fd in (stdout_read, stderr_read, stdout_write, stderr_write):
+            if fd is not None:
+                os.close(fd)
+
+
+def _state_signature() -> tuple:
+    """Snapshot of the worker's global state; a change means it must be recycled."""
+    return (os.getcwd(), len(sys.modules), tuple(sorted(os.environ.items())))
+
+
+def main() -> None:
+    preload = json.loads(sys.argv[1]) if len(sys.argv) > 1 else []
+    for module_name in preload:
+        try:
+            importlib.import_module(module_name)
+        except ImportError:
+            pass
+
+    # Drop this file's directory so scripts cannot shadow-import worker internals
+    base_path = sys.path[1:]
+    protocol = sys.stdout
+    signature = _state_signature()
+    protocol.write(json.dumps({"ready": True}) + "\n")
+    protocol.flush()
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            response = run(json.loads(line), base_path)
+        except Exception as exc:
+            response = {"error": f"{type(exc).__name__}: {exc}"}
+        response["dirty"] = _state_signature() != signature
+        protocol.write(json.dumps(response) + "\n")
+        protocol.flush()
+
+
+if __name__ == "__main__":
+    main()
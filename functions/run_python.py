@@ -1,7 +1,95 @@
 import os
+import signal
 import subprocess
 
-def run_python_file(working_directory, file_path, args=[]):
+from .config import (
+    PYTHON_BACKEND,
+    PYTHON_CPU_LIMIT_SECONDS,
+    PYTHON_EXECUTABLE,
+    PYTHON_MEMORY_LIMIT_MB,
+    PYTHON_OUTPUT_HEAD_BYTES,
+    PYTHON_OUTPUT_LIMIT_BYTES,
+    PYTHON_OUTPUT_TAIL_BYTES,
+    PYTHON_TIMEOUT_SECONDS,
+)
+from .process_supervisor import apply_limits, supervise
+from .python_pool import WorkerError, get_pool
+from .tracing import current_span, span
+
+def run_limits() -> dict:
+    """The configured limits for one run, in the form the pool worker and process_supervisor take them."""
+    return {
+        "timeout_seconds": PYTHON_TIMEOUT_SECONDS,
+        "cpu_seconds": PYTHON_CPU_LIMIT_SECONDS,
+        "memory_bytes": PYTHON_MEMORY_LIMIT_MB * 1024 * 1024,
+        "output_bytes": PYTHON_OUTPUT_LIMIT_BYTES,
+        "head_bytes": PYTHON_OUTPUT_HEAD_BYTES,
+        "tail_bytes": PYTHON_OUTPUT_TAIL_BYTES,
+    }
+
+def _limit_message(limit, limits):
+    if limit == "output":
+        return f"output exceeded {limits['output_bytes'] // (1024 * 1024)} MB"
+    if limit == "cpu":
+        return f"CPU time exceeded {limits['cpu_seconds']} seconds"
+    return f"memory use reached the {limits['memory_bytes'] // (1024 * 1024)} MB limit"
+
+def _run_subprocess(abs_full_file_path, args, project_root, limits):
+    # Set up environment with PYTHONPATH pointing to project root
+    env = os.environ.copy()
+    env['PYTHONPATH'] = project_root
+
+    process = subprocess.Popen(
+        [PYTHON_EXECUTABLE, abs_full_file_path] + args,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=project_root,  # Run from project root, not calculator directory
+        env=env,
+        # Its own process group, so a timeout kills whatever it started too
+        start_new_session=True,
+    )
+    # Set from here rather than in preexec_fn, which is unsafe with the agent's threads;
+    # only interpreter startup runs before they apply
+    apply_limits(limits, process.pid)
+    try:
+        completed_process = supervise(process.pid, process.stdout.fileno(), process.stderr.fileno(),
+                                      limits, limits["timeout_seconds"])
+    finally:
+        process.stdout.close()
+        process.stderr.close()
+    # Already reaped by supervise; keep Popen from waiting for it again
+    process.returncode = completed_process["returncode"] if completed_process["returncode"] is not None \
+        else -signal.SIGKILL
+    return completed_process
+
+def _run_in_pool(abs_full_file_path, args, project_root, limits):
+    # Warm workers fork per run; fall back to a cold interpreter if the pool is unusable
+    try:
+        return get_pool().run(abs_full_file_path, args, project_root, project_root, limits["timeout_seconds"],
+                              limits)
+    except WorkerError:
+        current_span().set(fallback=True)
+        return _run_subprocess(abs_full_file_path, args, project_root, limits)
+
+def run_script(abs_full_file_path, args, project_root, label=None, limits=None):
+    """
+    Run a script with the configured backend; returns stdout, stderr (each
+    cut to its head and tail), returncode, timed_out, limit and metrics.
+    Limits default to the configured ones (see run_limits).
+    """
+    limits = limits or run_limits()
+    backend = "pool" if PYTHON_BACKEND == "pool" and hasattr(os, "fork") else "subprocess"
+    with span("run_python", "subprocess", file_path=label or abs_full_file_path, backend=backend) as run_span:
+        if backend == "pool":
+            completed_process = _run_in_pool(abs_full_file_path, args, project_root, limits)
+        else:
+            completed_process = _run_subprocess(abs_full_file_path, args, project_root, limits)
+        run_span.set(returncode=completed_process["returncode"], timed_out=completed_process["timed_out"],
+                     limit=completed_process["limit"], **completed_process["metrics"])
+    return completed_process
+
+def run_python_file(working_directory, file_path, args=[], limits=None):
     # Get the absolute path of the working directory
     abs_working_dir = os.path.abspath(working_directory)
 
@@ -24,23 +112,14 @@ def run_python_file(working_directory, file_path, args=[]):
         return f'Error: "{file_path}" is not a Python file.'
 
     try:
-        # Set up environment with PYTHONPATH pointing to project root
-        env = os.environ.copy()
         project_root = os.path.dirname(abs_working_dir)  # Parent of calculator directory
-        env['PYTHONPATH'] = project_root
-        
-        # Execute the Python file using subprocess.run
-        completed_process = subprocess.run(
-            ['python3', abs_full_file_path] + args,
-            timeout=30,
-            capture_output=True,
-            text=True,
-            cwd=project_root,  # Run from project root, not calculator directory
-            env=env
-        )
-
-        stdout = completed_process.stdout.strip()
-        stderr = completed_process.stderr.strip()
+        args = [str(arg) for arg in args]
+        limits = limits or run_limits()
+
+        completed_process = run_script(abs_full_file_path, args, project_root, file_path, limits)
+
+        stdout = completed_process["stdout"].strip()
+        stderr = completed_process["stderr"].strip()
 
         output_str = ""
         if stdout:
@@ -48,15 +127,22 @@ def run_python_file(working_directory, file_path, args=[]):
         if stderr:
             output_str += f"STDERR: {stderr}\n"
 
-        if completed_process.returncode != 0:
-            output_str += f"Process exited with code {completed_process.returncode}"
+        if completed_process["timed_out"]:
+            # What the script printed before it was stopped still helps to see where it hung
+            output_str = f"Error: Process execution timed out after {limits['timeout_seconds']} seconds\n" + output_str
+        elif completed_process["returncode"] != 0:
+            output_str += f"Process exited with code {completed_process['returncode']}"
+
+        if completed_process["limit"]:
+            output_str += f"\nProcess stopped: {_limit_message(completed_process['limit'], limits)}"
 
         if not output_str.strip():
-            return "No output produced."
+            output_str = "No output produced."
 
-        return output_str
+        metrics = completed_process["metrics"]
+        return (f"{output_str.rstrip()}\n"
+                f"[{metrics['wall_s']:.3f}s wall, {metrics['cpu_s']:.3f}s CPU, "
+                f"{metrics['max_rss_kb'] / 1024:.1f} MB max RSS, {metrics['dropped_bytes']} bytes of output dropped]")
 
-    except subprocess.TimeoutExpired:
-        return "Error: Process execution timed out after 30 seconds"
     except Exception as e:
         return f"Error: executing Python file: {e}"
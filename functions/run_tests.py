@@ -0,0 +1,242 @@
+# functions/run_tests.py
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
+
+from .config import PYTHON_POOL_SIZE
+from .run_python import run_limits, run_script
+from .tracing import current_span
+
+RUNNER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_runner.py")
+
+# How much of a crashed runner's stderr is reported back
+STDERR_TAIL_CHARS = 2000
+
+STATUSES = ("passed", "failed", "error", "skipped", "expected_failure", "unexpected_success")
+
+
+class TestResultCache:
+    """
+    Results of test modules, reused while the files they import are unchanged.
+
+    An entry holds the per-test results of one test module together with a
+    content hash of every project file the module imported when it ran, so
+    any edit to the tests or the code under test, through the agent's tools
+    or not, makes the entry stale. Hashes are memoized on (mtime, size) to
+    avoid rereading unchanged files. Files a test reads as data, rather than
+    imports, are not tracked.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+    def file_hash(self, path: str) -> str | None:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        signature = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            known = self._hashes.get(path)
+            if known is not None and known[0] == signature:
+                return known[1]
+        try:
+            with open(path, 'rb') as file:
+                digest = hashlib.sha256(file.read()).hexdigest()
+        except OSError:
+            return None
+        with self._lock:
+            self._hashes[path] = (signature, digest)
+        return digest
+
+    def _fresh(self, working_directory: str, hashes: dict) -> bool:
+        return all(self.file_hash(os.path.join(working_directory, relpath)) == digest
+                   for relpath, digest in hashes.items())
+
+    def get(self, working_directory: str, module: str, names: list[str]) -> list | None:
+        """Cached results for the selected tests of a module, or None unless all are cached and fresh."""
+        with self._lock:
+            entry = self._entries.get((working_directory, module))
+        if entry is None or not self._fresh(working_directory, entry["hashes"]):
+            self.misses += 1
+            return None
+        if names:
+            selected = []
+            for name in names:
+                matching = [record for record in entry["results"].values()
+                            if record["id"] == name or record["id"].startswith(name + ".")]
+                ran = entry["complete"] or name in entry["names"] or any(
+                    prefix in entry["names"] for prefix in _prefixes(name))
+                # An ID without results may not exist; run it so unittest reports why
+                if not ran or not matching:
+                    self.misses += 1
+                    return None
+                selected.extend(record for record in matching if record not in selected)
+        elif entry["complete"]:
+            selected = list(entry["results"].values())
+        else:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return selected
+
+    def put(self, working_directory: str, module: str, names: list[str], report: dict) -> None:
+        hashes = {relpath: self.file_hash(os.path.join(working_directory, relpath))
+                  for relpath in report["imported"]}
+        key = (working_directory, module)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry["hashes"] != hashes:
+                entry = {"hashes": hashes, "results": {}, "names": set(), "complete": False}
+                self._entries[key] = entry
+            # Errors for IDs that do not exist are reported under unittest's own names; never keep those
+            entry["results"].update((record["id"], record) for record in report["results"]
+                                    if record["id"].startswith(module + "."))
+            if names:
+                entry["names"].update(names)
+            else:
+                entry["complete"] = True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> str:
+        return f"Test cache: {self.hits} hits, {self.misses} misses, {len(self._entries)} modules"
+
+
+def _prefixes(name: str) -> list[str]:
+    """Enclosing test IDs of a test ID, e.g. the class and module of a test method."""
+    parts = name.split(".")
+    return [".".join(parts[:i]) for i in range(1, len(parts))]
+
+
+TEST_CACHE = TestResultCache()
+
+
+def _module_of(working_directory: str, test_id: str) -> str | None:
+    """The longest dotted prefix of a test ID that names a module file or package."""
+    parts = test_id.split(".")
+    for i in range(len(parts), 0, -1):
+        base = os.path.join(working_directory, *parts[:i])
+        if os.path.isfile(base + ".py") or os.path.isfile(os.path.join(base, "__init__.py")):
+            return ".".join(parts[:i])
+    return None
+
+
+def _discover(working_directory: str) -> List[str]:
+    """Test modules at the top of the working directory (test*.py), as unittest discovery finds them."""
+    return sorted(name[:-3] for name in os.listdir(working_directory)
+                  if name.startswith("test") and name.endswith(".py"))
+
+
+def _run_module(working_directory: str, project_root: str, module: str, names: list[str], limits: dict) -> dict:
+    fd, output_path = tempfile.mkstemp(prefix="run_tests_", suffix=".json")
+    os.close(fd)
+    try:
+        completed = run_script(RUNNER_SCRIPT, [working_directory, output_path, module] + names,
+                               project_root, f"run_tests:{module}", limits)
+        if completed["timed_out"]:
+            return {"module": module, "error": f"Timed out after {limits['timeout_seconds']} seconds"}
+        try:
+            with open(output_path, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            stderr = completed["stderr"].strip()
+            return {"module": module,
+                    "error": f"Test process exited with code {completed['returncode']} without a report"
+                             + (f":\n{stderr[-STDERR_TAIL_CHARS:]}" if stderr else "")}
+    finally:
+        try:
+            os.unlink(output_path)
+        except OSError:
+            pass
+
+
+def run_tests(working_directory: str, test_ids: List[str] | None = None, use_cache: bool = True,
+              max_workers: int = PYTHON_POOL_SIZE, limits: dict | None = None) -> Dict[str, Any]:
+    try:
+        limits = limits or run_limits()
+        wd = os.path.realpath(working_directory)
+        project_root = os.path.dirname(wd)
+
+        # Group the selected IDs by module, so each module runs once; an empty list means all its tests
+        selection = {}
+        for test_id in test_ids or []:
+            test_id = str(test_id).strip()
+            module = _module_of(wd, test_id)
+            if module is None:
+                return {"ok": False, "error": f'No test module found for "{test_id}"', "cwd": wd}
+            if test_id == module:
+                selection[module] = []
+            elif selection.get(module, True):
+                selection.setdefault(module, []).append(test_id)
+        if not test_ids:
+            selection = {module: [] for module in _discover(wd)}
+        if not selection:
+            return {"ok": False, "error": "No test modules (test*.py) found", "cwd": wd}
+
+        reports = {}
+        to_run = []
+        for module, names in selection.items():
+            cached = TEST_CACHE.get(wd, module, names) if use_cache else None
+            if cached is not None:
+                reports[module] = {"module": module, "results": cached, "cached": True}
+            else:
+                to_run.append((module, names))
+
+        # Modules are independent processes, so they run side by side
+        workers = max(1, min(int(max_workers), len(to_run)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for (module, names), report in zip(to_run, executor.map(
+                    lambda item: _run_module(wd, project_root, *item, limits), to_run)):
+                if "error" not in report and "load_error" not in report:
+                    TEST_CACHE.put(wd, module, names, report)
+                report["cached"] = False
+                reports[module] = report
+        current_span().set(modules_cached=len(selection) - len(to_run), modules_run=len(to_run))
+
+        counts = dict.fromkeys(STATUSES, 0)
+        results = []
+        modules = []
+        for module in selection:
+            report = reports[module]
+            summary = {"module": module, "cached": report["cached"]}
+            if "duration_s" in report:
+                summary["duration_s"] = report["duration_s"]
+            error = report.get("error") or report.get("load_error")
+            if error:
+                summary["error"] = error
+                counts["error"] += 1
+            modules.append(summary)
+            for record in report.get("results", []):
+                counts[record["status"]] += 1
+                # Passing tests are listed by ID only, to keep the reply small
+                results.append(record if record["status"] != "passed" else
+                               {"id": record["id"], "status": "passed"})
+
+        return {
+            "ok": True,
+            "error": None,
+            "cwd": wd,
+            "success": counts["failed"] == counts["error"] == counts["unexpected_success"] == 0,
+            "counts": counts,
+            "modules": modules,
+            "results": results,
+        }
+
+    except Exception as e:
+        return {
+            "ok": False,
+            "error": f"Unhandled error: {type(e).__name__}: {e}",
+            "cwd": str(working_directory),
+        }
@@ -0,0 +1,108 @@
+# functions/search_code.py
+
+import os
+import re
+from pathlib import Path
+from typing import Dict, Any, List
+
+from .code_index import get_code_index, read_text, required_trigrams
+from .tree_index import compile_glob
+
+DEFAULT_MAX_RESULTS = 50
+MAX_CONTEXT_LINES = 10
+
+# Matched lines longer than this are cut, so one minified file cannot flood the reply
+MAX_LINE_LENGTH = 300
+
+
+def _clip(line: str) -> str:
+    line = line.rstrip("\r")
+    return line if len(line) <= MAX_LINE_LENGTH else line[:MAX_LINE_LENGTH] + "..."
+
+
+def search_code(working_directory: str, query: str, regex: bool = False, ignore_case: bool = False,
+                include: str | None = None, max_results: int = DEFAULT_MAX_RESULTS,
+                context_lines: int = 0) -> Dict[str, Any]:
+    try:
+        wd = Path(working_directory).resolve()
+        if not query:
+            raise ValueError("query must be a non-empty string")
+        max_results = int(max_results)
+        if max_results < 1:
+            raise ValueError(f"max_results must be at least 1, got {max_results}")
+        context_lines = min(max(int(context_lines), 0), MAX_CONTEXT_LINES)
+        try:
+            # Regular expressions are line-oriented: ^ and $ match at every line boundary
+            flags = (re.MULTILINE if regex else 0) | (re.IGNORECASE if ignore_case else 0)
+            pattern = re.compile(query if regex else re.escape(query), flags)
+        except re.error as e:
+            return {"ok": False, "error": f"Invalid regular expression: {e}", "cwd": str(wd), "query": query}
+
+        # The index only rereads files whose size or mtime changed since the last query
+        index = get_code_index(str(wd))
+        index.refresh()
+        candidates = index.candidates(required_trigrams(query, regex))
+        if include:
+            matcher = compile_glob(include)
+            # The part of the glob before any wildcard rules most paths out without the regex
+            prefix = re.split(r"[*?\[]", include.lstrip("/"), maxsplit=1)[0] if "/" in include else ""
+            prefix = prefix[:prefix.rfind("/") + 1]
+            candidates = (path for path in candidates if path.startswith(prefix) and matcher.match(path))
+
+        matches: List[Dict[str, Any]] = []
+        files_searched = 0
+        truncated = False
+        for relpath in candidates:
+            text = read_text(os.path.join(str(wd), relpath))
+            if text is None:
+                continue
+            files_searched += 1
+            found = pattern.search(text)
+            if found is None:
+                continue
+            lines = text.split("\n")
+            line_number = 0
+            position = 0
+            last_line = -1
+            while found is not None:
+                # Count newlines incrementally; each matching line is reported once. A match
+                # that begins with line breaks (e.g. from \s*) belongs to the line after them
+                matched = found.group()
+                start = found.start()
+                if matched.strip():
+                    start += len(matched) - len(matched.lstrip("\r\n"))
+                line_number += text.count("\n", position, start)
+                position = start
+                if line_number != last_line:
+                    if len(matches) == max_results:
+                        truncated = True
+                        break
+                    match = {"path": relpath, "line": line_number + 1, "text": _clip(lines[line_number])}
+                    if context_lines:
+                        match["before"] = [_clip(line) for line in
+                                           lines[max(line_number - context_lines, 0):line_number]]
+                        match["after"] = [_clip(line) for line in
+                                          lines[line_number + 1:line_number + 1 + context_lines]]
+                    matches.append(match)
+                    last_line = line_number
+                found = pattern.search(text, found.end() if found.end() > found.start() else found.end() + 1)
+            if truncated:
+                break
+
+        return {
+            "ok": True,
+            "error": None,
+            "cwd": str(wd),
+            "query": query,
+            "matches": matches,
+            "files_searched": files_searched,
+            "truncated": truncated,
+        }
+
+    except Exception as e:
+        return {
+            "ok": False,
+            "error": f"Unhandled error: {type(e).__name__}: {e}",
+            "cwd": str(Path(working_directory)),
+            "query": query,
+        }
@@ -0,0 +1,130 @@
+"""
+Test runner for run_tests.
+
+Run by path (through the worker pool or a fresh interpreter) with the
+working directory, the path to write results to, a test module and
+optionally test IDs within it. Results are written as JSON: one record per
+test, plus the project files the module imported, which run_tests hashes
+to decide when cached results are stale. Only the standard library is used.
+"""
+import io
+import json
+import os
+import sys
+import time
+import traceback
+import unittest
+
+
+class _RecordingResult(unittest.TestResult):
+    """Collects one record per test, with output captured while it runs."""
+
+    def __init__(self):
+        super().__init__()
+        self.buffer = True
+        self.records = {}
+        self._started = {}
+
+    def _record(self, test, status, detail=None):
+        record = {"id": test.id(), "status": status}
+        started = self._started.pop(test.id(), None)
+        if started is not None:
+            record["duration_s"] = round(time.perf_counter() - started, 6)
+        if detail:
+            record["detail"] = detail
+        previous = self.records.get(test.id())
+        if previous is not None and previous["status"] in ("failed", "error"):
+            # A failing subtest already decided the outcome; keep its details too
+            if status in ("failed", "error"):
+                previous["detail"] = previous.get("detail", "") + "\n" + (detail or "")
+            return
+        self.records[test.id()] = record
+
+    def startTest(self, test):
+        self._started[test.id()] = time.perf_counter()
+        super().startTest(test)
+
+    def addSuccess(self, test):
+        super().addSuccess(test)
+        self._record(test, "passed")
+
+    def addFailure(self, test, err):
+        super().addFailure(test, err)
+        self._record(test, "failed", self.failures[-1][1])
+
+    def addError(self, test, err):
+        super().addError(test, err)
+        self._record(test, "error", self.errors[-1][1])
+
+    def addSkip(self, test, reason):
+        super().addSkip(test, reason)
+        self._record(test, "skipped", reason)
+
+    def addExpectedFailure(self, test, err):
+        super().addExpectedFailure(test, err)
+        self._record(test, "expected_failure")
+
+    def addUnexpectedSuccess(self, test):
+        super().addUnexpectedSuccess(test)
+        self._record(test, "unexpected_success")
+
+    def addSubTest(self, test, subtest, err):
+        super().addSubTest(test, subtest, err)
+        if err is not None:
+            failed = issubclass(err[0], test.failureException)
+            detail = (self.failures if failed else self.errors)[-1][1]
+            self._record(test, "failed" if failed else "error", f"{subtest.id()}\n{detail}")
+
+
+def _imported_files(working_directory: str) -> list[str]:
+    """Files under the working directory that are loaded as modules, relative to it."""
+    files = set()
+    prefix = working_directory + os.sep
+    for module in list(sys.modules.values()):
+        path = getattr(module, "__file__", None)
+        if path:
+            path = os.path.realpath(path)
+            if path.startswith(prefix) and path.endswith(".py"):
+                files.add(os.path.relpath(path, working_directory))
+    return sorted(files)
+
+
+def main() -> None:
+    working_directory, output_path, module_name = sys.argv[1:4]
+    names = sys.argv[4:]
+    working_directory = os.path.realpath(working_directory)
+
+    # Tests run from their own directory, as `python -m unittest` would run them there
+    os.chdir(working_directory)
+    sys.path[0] = working_directory
+
+    started = time.perf_counter()
+    result = _RecordingResult()
+    report = {"module": module_name}
+    try:
+        loader = unittest.TestLoader()
+        suite = loader.loadTestsFromNames(names) if names else loader.loadTestsFromName(module_name)
+    except BaseException as exc:
+        # Only the project's own frames help; the loader and import machinery are noise
+        frames = [frame for frame in traceback.extract_tb(exc.__traceback__)
+                  if frame.filename.startswith(working_directory + os.sep)]
+        report["load_error"] = ("Traceback (most recent call last):\n" if frames else "") + "".join(
+            traceback.format_list(frames) + traceback.format_exception_only(type(exc), exc))
+    else:
+        # Output from class and module fixtures, outside any one test, is dropped
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = io.StringIO(), io.StringIO()
+        try:
+            suite.run(result)
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+
+    report["results"] = list(result.records.values())
+    report["imported"] = _imported_files(working_directory)
+    report["duration_s"] = round(time.perf_counter() - started, 6)
+    with open(output_path, "w") as file:
+        json.dump(report, file)
+
+
+if __name__ == "__main__":
+    main()
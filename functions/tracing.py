@@ -0,0 +1,197 @@
+# functions/tracing.py
+
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# Span that is open in the current thread or task; worker threads inherit it
+# when the caller submits work through contextvars.copy_context().run
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+_tracer = None
+
+
+class Span:
+    """One timed operation, with free-form attributes such as bytes or tokens."""
+
+    __slots__ = ("id", "parent", "name", "category", "start", "duration", "thread", "attrs")
+
+    def __init__(self, span_id, parent, name, category, start, attrs):
+        self.id = span_id
+        self.parent = parent
+        self.name = name
+        self.category = category
+        self.start = start
+        self.duration = None
+        self.thread = threading.get_ident()
+        self.attrs = attrs
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "parent": self.parent,
+            "name": self.name,
+            "category": self.category,
+            "start_s": round(self.start, 6),
+            "duration_s": round(self.duration or 0.0, 6),
+            "thread": self.thread,
+            **self.attrs,
+        }
+
+
+class _NullSpan:
+    """Stands in for a span while tracing is off, so callers never need to check."""
+
+    def set(self, **attrs) -> None:
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """Collects finished spans from every thread of the process."""
+
+    def __init__(self):
+        self.spans = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    @contextmanager
+    def span(self, name: str, category: str, **attrs):
+        parent = _current_span.get()
+        current = Span(next(self._ids), parent.id if parent else None, name, category,
+                       time.perf_counter() - self._origin, attrs)
+        token = _current_span.set(current)
+        try:
+            yield current
+        except BaseException as e:
+            current.attrs["error"] = type(e).__name__
+            raise
+        finally:
+            current.duration = time.perf_counter() - self._origin - current.start
+            _current_span.reset(token)
+            with self._lock:
+                self.spans.append(current)
+
+    def write_jsonl(self, path: str) -> None:
+        """Write one JSON object per span, in start order."""
+        with open(path, 'w') as file:
+            for current in sorted(self.spans, key=lambda s: s.start):
+                file.write(json.dumps(current.to_dict(), default=str) + "\n")
+
+    def write_chrome(self, path: str) -> None:
+        """Write the spans in Chrome trace event format (chrome://tracing, Perfetto)."""
+        pid = os.getpid()
+        events = [{
+            "name": current.name,
+            "cat": current.category,
+            "ph": "X",
+            "ts": round(current.start * 1e6, 3),
+            "dur": round((current.duration or 0.0) * 1e6, 3),
+            "pid": pid,
+            "tid": current.thread,
+            "args": current.attrs,
+        } for current in sorted(self.spans, key=lambda s: s.start)]
+        with open(path, 'w') as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file, default=str)
+
+    def summary(self) -> str:
+        """Per-prompt breakdown of wall time, tokens and cache hits."""
+        children = {}
+        for current in self.spans:
+            children.setdefault(current.parent, []).append(current)
+
+        def descendants(root):
+            stack = list(children.get(root.id, ()))
+            while stack:
+                current = stack.pop()
+                yield current
+                stack.extend(children.get(current.id, ()))
+
+        prompts = sorted((s for s in self.spans if s.category == "agent" and s.name == "prompt"),
+                         key=lambda s: s.start)
+        lines = []
+        for number, prompt in enumerate(prompts, 1):
+            spans = list(descendants(prompt))
+            model = [s for s in spans if s.category == "model"]
+            dispatch = [s for s in spans if s.category == "agent" and s.name == "dispatch"]
+            tools = [s for s in spans if s.category == "tool"]
+            subprocesses = [s for s in spans if s.category == "subprocess"]
+            total = prompt.duration or 0.0
+            model_time = sum(s.duration for s in model)
+            tool_time = sum(s.duration for s in dispatch)
+
+            def share(seconds):
+                return f"{seconds:8.3f}s {seconds / total:6.1%}" if total else f"{seconds:8.3f}s"
+
+            text = prompt.attrs.get("prompt", "")
+            lines.append(f"Prompt {number}: {text[:60]!r} {total:.3f}s, "
+                         f"{prompt.attrs.get('iterations', len(model))} iterations")
+            first_output = [s.attrs["first_output_s"] for s in [prompt] + spans if "first_output_s" in s.attrs]
+            if first_output:
+                lines.append(f"  first output {min(first_output):8.3f}s")
+            if prompt.attrs.get("repeated_calls"):
+                lines.append(f"  wasted     {prompt.attrs.get('wasted_turns', 0)} turns, "
+                             f"{prompt.attrs['repeated_calls']} repeated calls answered from memory")
+            tokens = {key: sum(s.attrs.get(key) or 0 for s in model)
+                      for key in ("prompt_tokens", "response_tokens", "cached_tokens")}
+            lines.append(f"  model      {share(model_time)}  {len(model)} calls, "
+                         f"{tokens['prompt_tokens']} prompt / {tokens['response_tokens']} response / "
+                         f"{tokens['cached_tokens']} cached tokens")
+            hits = sum(1 for s in tools if s.attrs.get("cache_hit"))
+            lines.append(f"  tools      {share(tool_time)}  {len(tools)} calls, {hits} cache hits")
+            by_tool = {}
+            for s in tools:
+                count, seconds, size, tokens, raw = by_tool.get(s.name, (0, 0.0, 0, 0, 0))
+                by_tool[s.name] = (count + 1, seconds + s.duration, size + (s.attrs.get("result_bytes") or 0),
+                                   tokens + (s.attrs.get("result_tokens") or 0), raw + (s.attrs.get("raw_tokens") or 0))
+            for name, (count, seconds, size, tokens, raw) in sorted(by_tool.items(), key=lambda item: -item[1][1]):
+                lines.append(f"    {name:<20} {count:3d} calls {seconds:8.3f}s {size:10d} bytes "
+                             f"~{tokens} tokens (~{raw} unshaped)")
+            if subprocesses:
+                lines.append(f"  subprocess {sum(s.duration for s in subprocesses):8.3f}s  "
+                             f"{len(subprocesses)} runs")
+            lines.append(f"  other      {share(max(total - model_time - tool_time, 0.0))}")
+        return "\n".join(lines)
+
+
+def enable_tracing() -> Tracer:
+    """Start collecting spans for the rest of the process and return the tracer."""
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def disable_tracing() -> None:
+    global _tracer
+    _tracer = None
+
+
+def get_tracer() -> Tracer | None:
+    return _tracer
+
+
+def tracing_enabled() -> bool:
+    """Whether spans are being recorded; gate costly attributes such as payload sizes on this."""
+    return _tracer is not None
+
+
+def span(name: str, category: str, **attrs):
+    """Context manager timing a block as a span; a no-op while tracing is off."""
+    if _tracer is None:
+        return nullcontext(NULL_SPAN)
+    return _tracer.span(name, category, **attrs)
+
+
+def current_span():
+    """The innermost open span, for attaching attributes from deeper in the call stack."""
+    return (_current_span.get() if _tracer is not None else None) or NULL_SPAN
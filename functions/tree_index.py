@@ -0,0 +1,395 @@
+import os
+import re
+import stat
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from .tracing import current_span
+
+# Directories never worth listing, whatever .gitignore says
+ALWAYS_IGNORED = {".git"}
+
+# Listings memoized per index; the least recently used is dropped beyond this
+MAX_CACHED_LISTINGS = 64
+
+
+def _translate_glob(pattern: str) -> str:
+    """Translate a gitignore-style glob into a regular expression fragment."""
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+            continue
+        if char == "*":
+            regex += "[^/]*"
+        elif char == "?":
+            regex += "[^/]"
+        elif char == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                regex += re.escape(char)
+            else:
+                body = pattern[i + 1:end].replace("\\", "\\\\")
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                regex += f"[{body}]"
+                i = end
+        else:
+            regex += re.escape(char)
+        i += 1
+    return regex
+
+
+def compile_glob(pattern: str) -> re.Pattern:
+    """Compile a glob; patterns without a slash match the basename at any depth."""
+    pattern = pattern.rstrip("/")
+    if "/" in pattern:
+        return re.compile(_translate_glob(pattern.lstrip("/")) + r"\Z")
+    return re.compile(r"(?:.*/)?" + _translate_glob(pattern) + r"\Z")
+
+
+class GitignoreRules:
+    """Rules from one .gitignore file, matched against paths relative to its directory."""
+
+    def __init__(self, base: str, lines: list[str]):
+        self.base = base
+        self.rules = []
+        for line in lines:
+            line = line.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            if line.startswith("\\"):
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            anchored = "/" in line
+            body = _translate_glob(line.lstrip("/"))
+            regex = re.compile((body if anchored else r"(?:.*/)?" + body) + r"\Z")
+            self.rules.append((regex, negate, dir_only))
+
+    @classmethod
+    def load(cls, directory: str, base: str):
+        try:
+            with open(os.path.join(directory, ".gitignore"), 'r', errors="replace") as file:
+                return cls(base, file.readlines())
+        except OSError:
+            return None
+
+    def match(self, relpath: str, is_dir: bool) -> bool | None:
+        """Return True (ignored), False (re-included) or None (no rule applies)."""
+        if self.base != ".":
+            if not relpath.startswith(self.base + "/"):
+                return None
+            relpath = relpath[len(self.base) + 1:]
+        result = None
+        for regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(relpath):
+                result = not negate
+        return result
+
+
+class _DirNode:
+    __slots__ = ("mtime_ns", "entries", "gitignore", "dirty")
+
+    def __init__(self, mtime_ns, entries, gitignore):
+        self.mtime_ns = mtime_ns
+        self.entries = entries
+        self.gitignore = gitignore
+        self.dirty = False
+
+
+class TreeIndex:
+    """
+    In-process index of a directory tree.
+
+    Each directory is scanned once and stored with its mtime. A refresh
+    stats the directories a listing shows and their files, and rescans the
+    directories whose mtime changed (entries added, removed or renamed),
+    that hold a file whose size or mtime changed (a file written in place
+    does not touch its directory), or that were invalidated explicitly after
+    a write. Repeated listings of a large tree cost one stat per shown entry
+    and no directory reads; pruned directories are never visited.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.realpath(root)
+        self._dirs = {}
+        self._listings = OrderedDict()
+        self.version = 0
+        self.scans = 0
+        self._lock = threading.RLock()
+        self._outer_gitignores = self._load_outer_gitignores()
+
+    def _load_outer_gitignores(self) -> list:
+        """Load .gitignore files above the root, up to the enclosing git checkout, outermost first."""
+        rules = []
+        directory = self.root
+        prefix = ""  # the root's path relative to `directory`
+        while True:
+            if directory != self.root:
+                loaded = GitignoreRules.load(directory, ".")
+                if loaded is not None:
+                    rules.append((prefix, loaded))
+            if os.path.isdir(os.path.join(directory, ".git")):
+                return list(reversed(rules))
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                # Not inside a checkout, so unrelated parent directories are not consulted
+                return []
+            prefix = os.path.basename(directory) + ("/" + prefix if prefix else "")
+            directory = parent
+
+    def _scan(self, relpath: str, mtime_ns: int) -> _DirNode:
+        path = self.root if relpath == "." else os.path.join(self.root, relpath)
+        self.scans += 1
+        entries = []
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                    entries.append((
+                        entry.name,
+                        stat.S_ISDIR(st.st_mode),
+                        stat.S_ISREG(st.st_mode),
+                        stat.S_ISLNK(st.st_mode),
+                        st.st_size,
+                        st.st_mode,
+                        st.st_mtime,
+                    ))
+                except OSError:
+                    continue
+        entries.sort(key=lambda e: (not e[1], e[0].lower()))
+        gitignore = GitignoreRules.load(path, relpath) if any(e[0] == ".gitignore" for e in entries) else None
+        return _DirNode(mtime_ns, entries, gitignore)
+
+    def _files_changed(self, path: str, node: _DirNode) -> bool:
+        """Whether a file of a scanned directory changed size or mtime since the scan."""
+        # Names are resolved relative to the open directory where possible, which saves a path lookup per file
+        try:
+            dir_fd = os.open(path, os.O_RDONLY) if os.stat in os.supports_dir_fd else None
+        except OSError:
+            return True
+        try:
+            for entry in node.entries:
+                if not entry[2]:
+                    continue
+                try:
+                    if dir_fd is not None:
+                        st = os.stat(entry[0], dir_fd=dir_fd, follow_symlinks=False)
+                    else:
+                        st = os.stat(os.path.join(path, entry[0]), follow_symlinks=False)
+                except OSError:
+                    return True
+                if st.st_size != entry[4] or st.st_mtime != entry[6]:
+                    return True
+            return False
+        finally:
+            if dir_fd is not None:
+                os.close(dir_fd)
+
+    def _node(self, relpath: str, check_files: bool = False) -> _DirNode | None:
+        """Return an up-to-date node for a directory, rescanning it if it changed."""
+        path = self.root if relpath == "." else os.path.join(self.root, relpath)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            if self._dirs.pop(relpath, None) is not None:
+                self.version += 1
+            return None
+        node = self._dirs.get(relpath)
+        if (node is None or node.dirty or node.mtime_ns != mtime_ns
+                or (check_files and self._files_changed(path, node))):
+            node = self._scan(relpath, mtime_ns)
+            self._dirs[relpath] = node
+            self.version += 1
+        return node
+
+    def invalidate(self, relpath: str | None = None) -> None:
+        """Mark the directory containing relpath for rescanning, or every directory if None."""
+        with self._lock:
+            if relpath is None:
+                for node in self._dirs.values():
+                    node.dirty = True
+                return
+            relpath = os.path.normpath(relpath).replace(os.sep, "/")
+            parent = os.path.dirname(relpath) or "."
+            for key in (relpath, parent):
+                if key in self._dirs:
+                    self._dirs[key].dirty = True
+
+    def _ignored(self, relpath: str, is_dir: bool, rule_chain: list) -> bool:
+        ignored = False
+        for prefix, rules in self._outer_gitignores:
+            result = rules.match(f"{prefix}/{relpath}" if prefix else relpath, is_dir)
+            if result is not None:
+                ignored = result
+        for rules in rule_chain:
+            result = rules.match(relpath, is_dir)
+            if result is not None:
+                ignored = result
+        return ignored
+
+    def _refresh(self, relpath, depth, max_depth, respect_gitignore, ignore, rule_chain) -> None:
+        """Stat the directories and files a listing below relpath shows, rescanning those that changed."""
+        node = self._node(relpath, check_files=True)
+        if node is None or (max_depth is not None and depth >= max_depth):
+            return
+        # Pruned trees (.venv, node_modules, ...) are never stat'd, as the listing never shows them
+        rule_chain, kept = self._kept_entries(relpath, node, respect_gitignore, ignore, rule_chain, dirs_only=True)
+        for child, entry in kept:
+            self._refresh(child, depth + 1, max_depth, respect_gitignore, ignore, rule_chain)
+
+    def listing(self, relpath: str = ".", max_depth: int | None = 1, respect_gitignore: bool = True,
+                ignore: tuple[str, ...] = ()) -> "Listing":
+        """
+        Return the (relpath, entry tuple) pairs below relpath, depth-first in
+        listing order. Directories excluded by .gitignore or `ignore` globs are
+        pruned. Listings are memoized, up to MAX_CACHED_LISTINGS of them, until
+        any directory in the index changes.
+        """
+        with self._lock:
+            scans = self.scans
+            rule_chain = []
+            if respect_gitignore and relpath != ".":
+                # Collect .gitignore rules from directories above the listed one
+                parts = relpath.split("/")
+                for i in range(len(parts)):
+                    ancestor = "/".join(parts[:i]) or "."
+                    node = self._node(ancestor)
+                    if node is not None and node.gitignore is not None:
+                        rule_chain.append(node.gitignore)
+            ignore_patterns = [compile_glob(pattern) for pattern in ignore]
+
+            self._refresh(relpath, 0, max_depth, respect_gitignore, ignore_patterns, rule_chain)
+            key = (relpath, max_depth, respect_gitignore, tuple(ignore))
+            cached = self._listings.get(key)
+            if cached is not None and cached.version == self.version:
+                self._listings.move_to_end(key)
+                current_span().set(index_rescans=self.scans - scans, listing_cached=True)
+                return cached
+
+            items = []
+            self._walk(items, relpath, 1, max_depth, respect_gitignore, ignore_patterns, rule_chain)
+            listing = Listing(items, self.version)
+            self._listings[key] = listing
+            self._listings.move_to_end(key)
+            while len(self._listings) > MAX_CACHED_LISTINGS:
+                self._listings.popitem(last=False)
+            current_span().set(index_rescans=self.scans - scans, listing_cached=False)
+            return listing
+
+    def _kept_entries(self, relpath, node, respect_gitignore, ignore, rule_chain, dirs_only=False):
+        """Return the rule chain below a directory and the (relpath, entry) pairs of it a listing keeps."""
+        if respect_gitignore and node.gitignore is not None:
+            rule_chain = rule_chain + [node.gitignore]
+        check_gitignore = respect_gitignore and (rule_chain or self._outer_gitignores)
+        kept = []
+        for entry in node.entries:
+            name, is_dir = entry[0], entry[1]
+            if dirs_only and not is_dir:
+                continue
+            child = name if relpath == "." else f"{relpath}/{name}"
+            if name in ALWAYS_IGNORED and is_dir:
+                continue
+            if check_gitignore and self._ignored(child, is_dir, rule_chain):
+                continue
+            if ignore and any(pattern.match(child) for pattern in ignore):
+                continue
+            kept.append((child, entry))
+        return rule_chain, kept
+
+    def _walk(self, items, relpath, depth, max_depth, respect_gitignore, ignore, rule_chain):
+        node = self._node(relpath)
+        if node is None:
+            return
+        rule_chain, kept = self._kept_entries(relpath, node, respect_gitignore, ignore, rule_chain)
+        for child, entry in kept:
+            items.append((child, entry))
+            if entry[1] and (max_depth is None or depth < max_depth):
+                self._walk(items, child, depth + 1, max_depth, respect_gitignore, ignore, rule_chain)
+
+
+class Listing:
+    """Result of TreeIndex.listing, with a lazily computed summary."""
+
+    def __init__(self, items: list, version: int):
+        self.items = items
+        self.version = version
+        self._summary = None
+
+    def summary(self, top_n: int = 10) -> dict:
+        """File and directory counts, sizes and the most common extensions."""
+        if self._summary is None:
+            files = dirs = total_size = 0
+            extensions = Counter()
+            top_level = {}
+            for relpath, entry in self.items:
+                name, is_dir, is_file, size = entry[0], entry[1], entry[2], entry[4]
+                if is_dir:
+                    dirs += 1
+                    continue
+                files += 1
+                size = size if is_file else 0
+                total_size += size
+                dot = name.rfind(".")
+                extensions[name[dot:] if dot > 0 else "(none)"] += 1
+                slash = relpath.find("/")
+                bucket = top_level.get(relpath[:slash] if slash != -1 else ".")
+                if bucket is None:
+                    bucket = top_level[relpath[:slash] if slash != -1 else "."] = [0, 0]
+                bucket[0] += 1
+                bucket[1] += size
+            largest = sorted(top_level.items(), key=lambda item: -item[1][0])[:top_n]
+            self._summary = {
+                "files": files,
+                "dirs": dirs,
+                "total_size": total_size,
+                "extensions": dict(extensions.most_common(top_n)),
+                "top_level": {name: {"files": count, "size": size} for name, (count, size) in largest},
+            }
+        return self._summary
+
+
+def format_entry(relpath: str, entry: tuple) -> dict:
+    """Expand an index entry into the dict returned by get_files_info."""
+    name, is_dir, is_file, is_symlink, size, mode, mtime = entry
+    return {
+        "name": name,
+        "relpath": relpath,
+        "is_dir": is_dir,
+        "is_file": is_file,
+        "is_symlink": is_symlink,
+        "size": size,
+        "mode": oct(mode),
+        "modified_ts": round(mtime, 2),
+        "modified_iso": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(mtime)),
+    }
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_tree_index(working_directory: str) -> TreeIndex:
+    """Return the session-wide index for a working directory, building it lazily."""
+    root = os.path.realpath(working_directory)
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = TreeIndex(root)
+        return index
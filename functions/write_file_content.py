@@ -1,4 +1,45 @@
 import os
+import tempfile
+
+def _read_umask():
+    # os.umask can only be read by setting it, which would briefly change it
+    # for every thread; /proc shows it without that, where available
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError):
+        pass
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+# Read once at import, before any tool threads start
+_UMASK = _read_umask()
+
+def atomic_write(path, data):
+    # Write to a temporary file in the same directory and rename it over the
+    # target, so readers and crashes only ever see the old or the new content
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        try:
+            # Keep the permissions of the file being replaced
+            os.chmod(temp_path, os.stat(path).st_mode & 0o7777)
+        except FileNotFoundError:
+            os.chmod(temp_path, 0o666 & ~_UMASK)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
 
 def write_file(working_directory, file_path, content):
     # Combine the working directory with the file path using os.path.join
@@ -16,11 +57,9 @@ def write_file(working_directory, file_path, content):
         # Ensure the directory exists
         os.makedirs(os.path.dirname(full_file_path), exist_ok=True)
         
-        # Write content to the file, overwriting if it already exists
-        with open(full_file_path, 'w') as file:
-            file.write(content)
+        # Write content to the file atomically, overwriting if it already exists
+        atomic_write(abs_file_path, content.encode('utf-8'))
         
         return f'Successfully wrote to "{file_path}" ({len(content)} characters written)'
     except Exception as e:
         return f'Error: {str(e)}'
-
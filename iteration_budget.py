@@ -0,0 +1,47 @@
+# A turn that made progress keeps at least this many more turns available
+PROGRESS_GRACE_TURNS = 5
+# Progress can stretch the budget to at most this multiple of the configured one
+HARD_CAP_FACTOR = 2
+# Turns in a row of nothing but repeated calls after which the model is taken to be stuck
+MAX_WASTED_STREAK = 3
+
+
+class IterationBudget:
+    """
+    How many model turns one prompt may take.
+
+    The budget starts at the configured number of turns. A turn whose tool
+    calls made progress (see tool_cache.CallMemo) keeps at least
+    PROGRESS_GRACE_TURNS more turns available, up to HARD_CAP_FACTOR times
+    the configured number, so a long but productive task is not cut off. A
+    turn whose calls were all repeats is wasted; after MAX_WASTED_STREAK of
+    those in a row the budget ends, since every further turn would resend
+    the whole history for nothing.
+    """
+
+    def __init__(self, max_iterations: int):
+        self.max_iterations = max_iterations
+        self.limit = max_iterations
+        self.turns = 0
+        self.wasted_turns = 0
+        self.stalled = False
+        self._wasted_streak = 0
+
+    def exhausted(self) -> bool:
+        return self.turns >= self.limit
+
+    def end_turn(self, calls: int, repeats: int, progressed: bool) -> None:
+        """Account for a finished turn with `calls` tool calls, `repeats` of them repeats."""
+        self.turns += 1
+        if calls and repeats == calls:
+            self.wasted_turns += 1
+            self._wasted_streak += 1
+        else:
+            self._wasted_streak = 0
+
+        if progressed:
+            self.limit = max(self.limit, min(self.turns + PROGRESS_GRACE_TURNS,
+                                             self.max_iterations * HARD_CAP_FACTOR))
+        if self._wasted_streak >= MAX_WASTED_STREAK:
+            self.stalled = True
+            self.limit = self.turns
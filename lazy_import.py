@@ -0,0 +1,31 @@
+import importlib
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is only imported on first attribute access.
+
+    Importing the Gemini SDK takes most of a second, so entry points bind it
+    through this proxy and paths that never talk to the model (usage text,
+    configuration errors) exit without paying for it.
+    """
+
+    def __init__(self, name: str):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def __getattr__(self, attribute: str):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = importlib.import_module(self.__dict__["_name"])
+            self.__dict__["_module"] = module
+        return getattr(module, attribute)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module {self.__dict__['_name']!r} ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    """Return a proxy that imports `name` the first time one of its attributes is used."""
+    return LazyModule(name)
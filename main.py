@@ -1,22 +1,79 @@
 import sys
 import shutil
 import os
-from google import genai
-from google.genai import types
-from dotenv import load_dotenv
+import time
 
-from prompts import system_prompt
-from call_function import call_function, available_functions
+from prompts import build_system_prompt
+from context_compactor import ContextCompactor, DEFAULT_CONTEXT_BUDGET
+from iteration_budget import IterationBudget
+from tool_cache import CallMemo
+from functions.tracing import current_span, enable_tracing, get_tracer, span, tracing_enabled
+from lazy_import import lazy_import
+
+# The SDK, the tool schema and the transports are only imported once a prompt is run
+genai = lazy_import("google.genai")
+types = lazy_import("google.genai.types")
+call_function = lazy_import("call_function")
+transport = lazy_import("transport")
+prompt_cache = lazy_import("prompt_cache")
+workspace = lazy_import("workspace")
 
 # Constants
 MODEL_NAME = "gemini-2.0-flash-001"
 ENV_API_KEY = "GEMINI_API_KEY"
 VERBOSE_FLAG = "--verbose"
+WORKERS_FLAG = "--workers"
+CONTEXT_BUDGET_FLAG = "--context-budget"
+RECORD_FLAG = "--record"
+REPLAY_FLAG = "--replay"
+REPLAY_LATENCY_FLAG = "--replay-latency"
+BASE_URL_FLAG = "--base-url"
+CLEAN_PYCACHE_FLAG = "--clean-pycache"
+DAEMON_FLAG = "--daemon"
+STREAM_FLAG = "--stream"
+TRACE_FLAG = "--trace"
+TRACE_FORMAT_FLAG = "--trace-format"
+PROFILE_FLAG = "--profile"
+MAX_ITERATIONS_FLAG = "--max-iterations"
+SESSION_FLAG = "--session"
+PREFIX_CACHE_FLAG = "--prefix-cache"
+WORKING_DIR_FLAG = "--working-dir"
+TRACE_FORMATS = ("jsonl", "chrome")
+DEFAULT_MAX_WORKERS = 4
+MAX_ITERATIONS = 20
+
+# Directories, relative to this file, whose __pycache__ --clean-pycache removes
+PYCACHE_PACKAGES = (".", "functions", "calculator", os.path.join("calculator", "pkg"))
 
 # Messages
 USAGE_MESSAGE = """AI Code Assistant
 
-Usage: python main.py "your prompt here" [--verbose]
+Usage: python main.py "your prompt here" [--verbose] [--workers=N] [--context-budget=N] [--max-iterations=N]
+                      [--record=FILE | --replay=FILE [--replay-latency=S]] [--base-url=URL]
+                      [--trace=FILE [--trace-format=jsonl|chrome]] [--profile] [--clean-pycache]
+                      [--daemon[=SOCKET]] [--stream] [--session=ID [--prefix-cache=MODE]] [--working-dir=PATH]
+
+Options:
+  --verbose            Print prompts, tool calls and token usage
+  --workers=N          Run independent tool calls from one turn on N threads (default: 4, 1 = sequential)
+  --context-budget=N   Elide stale tool output once prompts exceed N tokens (default: 30000, 0 = off)
+  --max-iterations=N   Model turns per prompt (default: 20); turns that make progress extend it up to 2N,
+                       and it ends early once the model only repeats earlier tool calls
+  --record=FILE        Save every model request/response to a cassette file
+  --replay=FILE        Serve model responses from a cassette instead of the API (no API key needed)
+  --replay-latency=S   Seconds of simulated latency added to each replayed response
+  --base-url=URL       Send API requests to another endpoint, e.g. python transport.py serve
+  --trace=FILE         Write timing spans for model calls, tool calls and subprocesses to FILE
+  --trace-format=F     jsonl (default, one span per line) or chrome (chrome://tracing / Perfetto)
+  --profile            Print where each prompt's time and tokens went
+  --clean-pycache      Remove this project's __pycache__ directories after the run
+  --daemon[=SOCKET]    Send the prompt to a running python daemon.py instead of starting a cold client
+  --stream             Start tool calls as soon as each is received, printing the narration before them
+  --session=ID         Resume the saved conversation ID (or start it) and save it after the response
+  --prefix-cache=MODE  How a resumed session's history is cached so only new messages are sent:
+                       provider (context caching API), local (in-process stand-in) or off
+                       (default: provider, or local with --replay and --base-url)
+  --working-dir=PATH   Directory the tools read, write and run files in (default: ./calculator)
 Example: python main.py "How do I fix the calculator?"
 """
 
@@ -32,32 +89,80 @@ ERROR_MESSAGES = {
 class AIAssistant:
     """Main AI Assistant class handling Gemini API interactions."""
     
-    def __init__(self, api_key: str, verbose: bool = False):
-        self.client = genai.Client(api_key=api_key)
+    def __init__(self, api_key: str, verbose: bool = False, max_workers: int = DEFAULT_MAX_WORKERS,
+                 client=None, output=None, context_budget: int | None = DEFAULT_CONTEXT_BUDGET,
+                 stream: bool = False, session=None, prefix_cache: bool = True,
+                 max_iterations: int = MAX_ITERATIONS, working_dir: str | None = None):
+        self.client = client if client is not None else genai.Client(api_key=api_key)
         self.verbose = verbose
+        self.max_workers = max_workers
+        self.output = output
+        self.stream = stream
+        self.context = ContextCompactor(context_budget)
+        self.max_iterations = max_iterations
+        # The directory this assistant's tools run in, with its caches and limits
+        self.workspace = workspace.Workspace(working_dir) if working_dir else workspace.default_workspace()
+        self.system_prompt = build_system_prompt(self.workspace.working_directory)
+        # Tool calls and turn budget of the current prompt; repeated calls are answered from the memo
+        self.memo = CallMemo()
+        self.budget = IterationBudget(max_iterations)
         self.messages = []
+        # A resumed session's history is sent once as a cached prefix; later requests only send the rest
+        self.session = session
+        self.prefix_cache = prefix_cache
+        self._cache_name = None
+        self._prefix_messages = 0
+        # Token usage summed over the model calls of the current prompt
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        # Seconds from the start of generate_response to the first line shown to the user
+        self.first_output_s = None
+        self._started = None
+        # Streamed text of the current turn, held back until the turn is known to call tools
+        self._pending_text = []
+    
+    def _emit(self, message: str) -> None:
+        """Print a line of user-facing output to the configured stream."""
+        print(message, file=self.output if self.output is not None else sys.stdout)
+    
+    def _mark_first_output(self) -> None:
+        """Record the time to first output the first time anything is shown."""
+        if self.first_output_s is None and self._started is not None:
+            self.first_output_s = time.perf_counter() - self._started
+            current_span().set(first_output_s=round(self.first_output_s, 6))
     
     def _log(self, message: str) -> None:
         """Log message if verbose mode is enabled."""
         if self.verbose:
-            print(message)
+            self._emit(message)
     
-    def _create_config(self) -> types.GenerateContentConfig:
+    def _create_config(self) -> "types.GenerateContentConfig":
         """Create generation configuration."""
+        if self._cache_name is not None:
+            # The system prompt and tools are part of the cached content
+            return types.GenerateContentConfig(cached_content=self._cache_name)
         return types.GenerateContentConfig(
-            tools=[available_functions], 
-            system_instruction=system_prompt
+            tools=[call_function.available_functions], 
+            system_instruction=self.system_prompt
         )
     
     def _handle_function_calls(self, response) -> None:
         """Process function calls and add responses to message history."""
-        for function_call_part in response.function_calls:
+        function_call_parts = response.function_calls
+        self._mark_first_output()
+        for function_call_part in function_call_parts:
             # CHANGE 1: Add dash prefix to match required output format
-            print(f"- Calling function: {function_call_part.name}")
-            
-            # Execute the function call
-            function_result = call_function(function_call_part, self.verbose)
-            
+            self._emit(f"- Calling function: {function_call_part.name}")
+        
+        # Execute the function calls; results come back in call order
+        with span("dispatch", "agent", calls=len(function_call_parts)):
+            function_results = call_function.call_functions(function_call_parts, self.verbose, self.max_workers,
+                                                            self.memo, self.workspace, self.output)
+        self._append_function_results(function_results)
+    
+    def _append_function_results(self, function_results) -> None:
+        """Validate function results and add them to the message history in call order."""
+        for function_result in function_results:
             if not function_result.parts or not function_result.parts[0].function_response:
                 raise Exception(ERROR_MESSAGES["empty_function_result"])
             
@@ -69,74 +174,191 @@ class AIAssistant:
             # This was the bug - I was appending function_result directly instead of wrapping it properly
             self.messages.append(types.Content(role="user", parts=[function_result.parts[0]]))
     
+    def report_run(self) -> None:
+        """Print what the last prompt saved and cost, shown after it in verbose mode."""
+        if self.context.tokens_saved:
+            self._emit(f"Context compaction saved ~{self.context.tokens_saved} prompt tokens")
+        if self.memo.repeats:
+            self._emit(f"Wasted turns: {self.budget.wasted_turns} of {self.budget.turns}, "
+                       f"{self.memo.repeats} repeated calls answered from memory")
+        if self.first_output_s is not None:
+            self._emit(f"Time to first output: {self.first_output_s:.3f}s")
+        self._emit(self.workspace.tool_cache.stats())
+        self._emit(self.workspace.result_shaper.stats())
+        self._emit(self.memo.stats())
+    
     def _log_usage(self, response) -> None:
         """Log token usage information."""
-        if self.verbose and hasattr(response, 'usage_metadata'):
+        if self.verbose and getattr(response, 'usage_metadata', None) is not None:
             self._log(f"Prompt tokens: {response.usage_metadata.prompt_token_count}")
             self._log(f"Response tokens: {response.usage_metadata.candidates_token_count}")
+            if response.usage_metadata.cached_content_token_count:
+                self._log(f"Cached tokens: {response.usage_metadata.cached_content_token_count}")
     
-    def generate_response(self, user_prompt: str) -> str:
-        """Generate response for user prompt, handling function calls if needed."""
+    def _request_contents(self) -> list:
+        """The messages sent with the next request; a cached prefix is left out."""
+        return self.messages[self._prefix_messages:]
+    
+    def _model_span(self):
+        """Open a trace span around one generate_content call."""
+        contents = self._request_contents()
+        attrs = {"model": MODEL_NAME, "messages": len(contents)}
+        if tracing_enabled():
+            attrs["request_bytes"] = sum(len(message.model_dump_json(exclude_none=True))
+                                         for message in contents)
+        return span("generate_content", "model", **attrs)
+    
+    def _trace_response(self, model_span, response) -> None:
+        """Attach token counts and the response size to a model span."""
+        if not tracing_enabled():
+            return
+        usage = getattr(response, 'usage_metadata', None)
+        model_span.set(
+            prompt_tokens=usage.prompt_token_count if usage else None,
+            response_tokens=usage.candidates_token_count if usage else None,
+            cached_tokens=usage.cached_content_token_count if usage else None,
+            function_calls=len(response.function_calls or ()),
+            response_bytes=len(response.model_dump_json(exclude_none=True)),
+        )
+    
+    def _flush_narration(self) -> None:
+        """
+        Print the streamed text held back so far as narration of a tool-calling turn.
+
+        Text is only known not to be the final response once its turn makes a
+        function call; the final response is printed after the loop, under its
+        header, like it is without streaming.
+        """
+        text = "".join(self._pending_text).strip()
+        self._pending_text.clear()
+        if text:
+            self._mark_first_output()
+            self._emit(text)
+    
+    def _generate_streamed(self):
+        """
+        Stream one model turn, printing text as it arrives and starting each
+        function call as soon as it is received. Returns the merged response
+        and the dispatcher running its calls (None if there were none).
+        """
+        chunks = []
+        dispatcher = None
+        try:
+            for chunk in self.client.models.generate_content_stream(
+                model=MODEL_NAME,
+                contents=self._request_contents(),
+                config=self._create_config()
+            ):
+                chunks.append(chunk)
+                candidate = chunk.candidates[0] if chunk.candidates else None
+                for part in (candidate.content.parts or ()) if candidate and candidate.content else ():
+                    if part.function_call:
+                        self._flush_narration()
+                        self._mark_first_output()
+                        self._emit(f"- Calling function: {part.function_call.name}")
+                        if dispatcher is None:
+                            dispatcher = call_function.CallDispatcher(self.verbose, self.max_workers, self.memo,
+                                                                      self.workspace, self.output)
+                        dispatcher.submit(part.function_call)
+                    elif part.text and not part.thought:
+                        self._pending_text.append(part.text)
+        except BaseException:
+            if dispatcher is not None:
+                dispatcher.close()
+            raise
+        finally:
+            if dispatcher is not None:
+                # Text after the last call of a tool-calling turn is narration too
+                self._flush_narration()
+            self._pending_text.clear()
+        return transport.merge_chunks(chunks), dispatcher
+    
+    def _start_conversation(self, user_prompt: str) -> None:
+        """Reset the message history to the session's history, if any, followed by the user prompt."""
         self._log(f"User prompt: {user_prompt}\n")
+        self.context.reset()
+        self._started = time.perf_counter()
+        self.first_output_s = None
+        self._pending_text.clear()
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self._cache_name = None
+        self._prefix_messages = 0
+        self.memo = CallMemo()
+        self.budget = IterationBudget(self.max_iterations)
         
         # Initialize conversation with user prompt
-        self.messages = [
-            types.Content(role="user", parts=[types.Part(text=user_prompt)])
-        ]
+        self.messages = list(self.session.messages) if self.session is not None else []
+        self.messages.append(types.Content(role="user", parts=[types.Part(text=user_prompt)]))
+        
+        if self.session is not None and self.session.resumed and self.prefix_cache:
+            with span("prefix_cache", "agent", messages=len(self.session.messages)) as cache_span:
+                self._cache_name = prompt_cache.attach_prefix_cache(
+                    self.client, MODEL_NAME, self.session, self._create_config(), self._log)
+                cache_span.set(cached=self._cache_name is not None)
+            if self._cache_name is not None:
+                self._prefix_messages = len(self.session.messages)
+    
+    def update_session(self) -> None:
+        """Store the conversation and this prompt's token usage in the session."""
+        self.session.messages = list(self.messages)
+        self.session.stats["prompts"] += 1
+        self.session.stats["prompt_tokens"] += self.prompt_tokens
+        self.session.stats["cached_tokens"] += self.cached_tokens
+    
+    def _end_turn(self, prompt_span, response, memo_before: tuple[int, int]) -> None:
+        """Update the iteration budget with what the turn's tool calls achieved."""
+        repeats, progress = self.memo.repeats - memo_before[0], self.memo.progress - memo_before[1]
+        self.budget.end_turn(len(response.function_calls or ()) if response else 0, repeats, progress > 0)
+        prompt_span.set(wasted_turns=self.budget.wasted_turns, repeated_calls=self.memo.repeats)
+        if repeats:
+            self._log(f"{repeats} repeated calls answered from memory")
+        if self.budget.stalled:
+            self._log("Stopping: the last turns only repeated earlier calls")
+    
+    def _compact_context(self) -> None:
+        """Elide stale tool output from the history before it is resent."""
+        # A cached prefix is sent as it was cached, so only the rest can be compacted
+        removed = self.context.compact(self._request_contents())
+        if removed:
+            self._log(f"Context over budget, elided ~{removed} tokens of stale tool output")
+    
+    def _record_response(self, response) -> None:
+        """Validate a model response and add its candidates to the message history."""
+        self._log_usage(response)
+        usage = getattr(response, 'usage_metadata', None)
+        if usage is not None:
+            self.prompt_tokens += usage.prompt_token_count or 0
+            self.cached_tokens += usage.cached_content_token_count or 0
+        self.context.observe(response, len(self._request_contents()))
         
-        max_iterations = 20
-        iteration_count = 0
+        # Check if we have a valid response
+        if not response.candidates or len(response.candidates) == 0:
+            raise Exception("No candidates returned from API")
         
-        while iteration_count < max_iterations:
-            self._log(f"Iteration {iteration_count + 1}")
+        # CRITICAL: Add ALL candidates to messages list after EVERY generate_content call
+        for candidate in response.candidates:
+            self.messages.append(candidate.content)
+    
+    def _extract_final_text(self, response) -> str | None:
+        """Return the stripped text of a response without function calls, if any."""
+        # No function calls - check if this might be a final response
+        candidate = response.candidates[0]
+        if candidate.content and candidate.content.parts:
+            final_text = ""
+            for part in candidate.content.parts:
+                if hasattr(part, 'text') and part.text:
+                    final_text += part.text
             
-            try:
-                response = self.client.models.generate_content(
-                    model=MODEL_NAME,
-                    contents=self.messages,
-                    config=self._create_config()
-                )
-                
-                self._log_usage(response)
-                
-                # Check if we have a valid response
-                if not response.candidates or len(response.candidates) == 0:
-                    raise Exception("No candidates returned from API")
-                
-                # CRITICAL: Add ALL candidates to messages list after EVERY generate_content call
-                for candidate in response.candidates:
-                    self.messages.append(candidate.content)
-                
-                # Check if there are function calls to handle
-                if response.function_calls:
-                    self._log("Function calls detected, processing...")
-                    self._handle_function_calls(response)
-                else:
-                    # No function calls - check if this might be a final response
-                    candidate = response.candidates[0]
-                    if candidate.content and candidate.content.parts:
-                        final_text = ""
-                        for part in candidate.content.parts:
-                            if hasattr(part, 'text') and part.text:
-                                final_text += part.text
-                        
-                        self._log(f"LLM response (no function calls): {final_text[:100]}...")
-                        
-                        # CHANGE 3: Return immediately when we have any text response
-                        if final_text.strip():
-                            return final_text.strip()
-                
-            except Exception as e:
-                self._log(f"Error in iteration {iteration_count + 1}: {e}")
-                if iteration_count == 0:
-                    # If first iteration fails, re-raise the error
-                    raise
-                else:
-                    # For later iterations, try to continue or break
-                    break
+            self._log(f"LLM response (no function calls): {final_text[:100]}...")
             
-            iteration_count += 1
-        
+            # CHANGE 3: Return immediately when we have any text response
+            if final_text.strip():
+                return final_text.strip()
+        return None
+    
+    def _fallback_response(self) -> str:
+        """Return the last text in the history once the loop ends without an answer."""
         # If we hit max iterations, return the last response we got
         if self.messages and len(self.messages) > 1:
             last_message = self.messages[-1]
@@ -151,6 +373,66 @@ class AIAssistant:
         
         # Fallback
         raise Exception(ERROR_MESSAGES["max_iterations"])
+    
+    def generate_response(self, user_prompt: str) -> str:
+        """Generate response for user prompt, handling function calls if needed."""
+        with span("prompt", "agent", prompt=user_prompt) as prompt_span:
+            self._start_conversation(user_prompt)
+            
+            while not self.budget.exhausted():
+                iteration = self.budget.turns + 1
+                self._log(f"Iteration {iteration}")
+                prompt_span.set(iterations=iteration)
+                memo_before = (self.memo.repeats, self.memo.progress)
+                response = None
+                
+                try:
+                    self._compact_context()
+                    dispatcher = None
+                    with self._model_span() as model_span:
+                        if self.stream:
+                            response, dispatcher = self._generate_streamed()
+                        else:
+                            response = self.client.models.generate_content(
+                                model=MODEL_NAME,
+                                contents=self._request_contents(),
+                                config=self._create_config()
+                            )
+                        self._trace_response(model_span, response)
+                    
+                    try:
+                        self._record_response(response)
+                    except Exception:
+                        if dispatcher is not None:
+                            dispatcher.close()
+                        raise
+                    
+                    # Check if there are function calls to handle
+                    if dispatcher is not None:
+                        # Streamed calls are already running; collect them in call order
+                        with span("dispatch", "agent", calls=len(response.function_calls or ())):
+                            self._append_function_results(dispatcher.results())
+                    elif response.function_calls:
+                        self._log("Function calls detected, processing...")
+                        self._handle_function_calls(response)
+                    else:
+                        final_text = self._extract_final_text(response)
+                        if final_text:
+                            self._mark_first_output()
+                            return final_text
+                    
+                except Exception as e:
+                    self._log(f"Error in iteration {iteration}: {e}")
+                    if iteration == 1:
+                        # If first iteration fails, re-raise the error
+                        raise
+                    else:
+                        # For later iterations, try to continue or break
+                        break
+                
+                self._end_turn(prompt_span, response, memo_before)
+            
+            return self._fallback_response()
 
 def parse_arguments() -> tuple[list[str], bool]:
     """Parse command line arguments and return prompt args and verbose flag."""
@@ -158,6 +440,47 @@ def parse_arguments() -> tuple[list[str], bool]:
     args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
     return args, verbose
 
+def get_flag_value(flag: str, default: str | None = None) -> str | None:
+    """Return the value of a --flag=value command line option, or the default."""
+    prefix = f"{flag}="
+    for arg in sys.argv[1:]:
+        if arg.startswith(prefix):
+            return arg[len(prefix):]
+    return default
+
+def parse_max_workers() -> int:
+    """Parse the --workers option into a positive worker count."""
+    value = get_flag_value(WORKERS_FLAG, str(DEFAULT_MAX_WORKERS))
+    try:
+        max_workers = int(value)
+    except ValueError:
+        raise ValueError(f"{WORKERS_FLAG} expects an integer, got {value!r}")
+    if max_workers < 1:
+        raise ValueError(f"{WORKERS_FLAG} must be at least 1, got {max_workers}")
+    return max_workers
+
+def parse_context_budget() -> int:
+    """Parse the --context-budget option into a token count (0 disables compaction)."""
+    value = get_flag_value(CONTEXT_BUDGET_FLAG, str(DEFAULT_CONTEXT_BUDGET))
+    try:
+        context_budget = int(value)
+    except ValueError:
+        raise ValueError(f"{CONTEXT_BUDGET_FLAG} expects an integer, got {value!r}")
+    if context_budget < 0:
+        raise ValueError(f"{CONTEXT_BUDGET_FLAG} cannot be negative, got {context_budget}")
+    return context_budget
+
+def parse_max_iterations() -> int:
+    """Parse the --max-iterations option into a positive turn count."""
+    value = get_flag_value(MAX_ITERATIONS_FLAG, str(MAX_ITERATIONS))
+    try:
+        max_iterations = int(value)
+    except ValueError:
+        raise ValueError(f"{MAX_ITERATIONS_FLAG} expects an integer, got {value!r}")
+    if max_iterations < 1:
+        raise ValueError(f"{MAX_ITERATIONS_FLAG} must be at least 1, got {max_iterations}")
+    return max_iterations
+
 def validate_environment() -> str:
     """Validate environment and return API key."""
     api_key = os.environ.get(ENV_API_KEY)
@@ -165,17 +488,105 @@ def validate_environment() -> str:
         raise ValueError(ERROR_MESSAGES["no_api_key"])
     return api_key
 
+def create_client_from_arguments():
+    """Create the model client for the transport selected on the command line."""
+    record_path = get_flag_value(RECORD_FLAG)
+    replay_path = get_flag_value(REPLAY_FLAG)
+    if record_path and replay_path:
+        raise ValueError(f"{RECORD_FLAG} and {REPLAY_FLAG} cannot be combined")
+    
+    if replay_path:
+        latency = float(get_flag_value(REPLAY_LATENCY_FLAG, "0"))
+        return transport.create_client(None, transport.REPLAY, replay_path, latency)
+    
+    base_url = get_flag_value(BASE_URL_FLAG)
+    # A local stand-in server does not check the key
+    api_key = (os.environ.get(ENV_API_KEY) or "stand-in") if base_url else validate_environment()
+    mode = transport.RECORD if record_path else transport.LIVE
+    return transport.create_client(api_key, mode, record_path, base_url=base_url)
+
+def parse_prefix_cache_mode() -> str:
+    """Parse --prefix-cache; replays and stand-in servers have no caching API, so they default to local."""
+    simulated = get_flag_value(REPLAY_FLAG) or get_flag_value(BASE_URL_FLAG)
+    mode = get_flag_value(PREFIX_CACHE_FLAG, prompt_cache.LOCAL if simulated else prompt_cache.PROVIDER)
+    if mode not in prompt_cache.PREFIX_CACHE_MODES:
+        raise ValueError(f"{PREFIX_CACHE_FLAG} must be one of {', '.join(prompt_cache.PREFIX_CACHE_MODES)}, "
+                         f"got {mode!r}")
+    return mode
+
+def load_session_from_arguments():
+    """Load the session named by --session, or return (None, None) without one."""
+    session_id = get_flag_value(SESSION_FLAG)
+    if session_id is None:
+        return None, None
+    from session_store import SessionStore
+    store = SessionStore()
+    return store, store.load(session_id)
+
+def report_session(session, assistant, resumed_messages: int, saved_bytes: int, prefix_cache_mode: str) -> None:
+    """Print how much of this prompt was served from the session's cached prefix."""
+    if not resumed_messages:
+        print(f"Session {session.id}: started, saved {len(session.messages)} messages ({saved_bytes} bytes)")
+        return
+    where = "local stand-in" if prefix_cache_mode == prompt_cache.LOCAL else "provider cache"
+    print(f"Session {session.id}: resumed with {resumed_messages} earlier messages; "
+          f"{assistant.cached_tokens} of {assistant.prompt_tokens} prompt tokens served from the cached prefix "
+          f"({where}), {session.stats['cached_tokens']} saved over {session.stats['prompts']} prompts")
+
+def start_tracing_from_arguments():
+    """Enable tracing if --trace or --profile was given, validating the trace format."""
+    trace_format = get_flag_value(TRACE_FORMAT_FLAG, TRACE_FORMATS[0])
+    if trace_format not in TRACE_FORMATS:
+        raise ValueError(f"{TRACE_FORMAT_FLAG} must be one of {', '.join(TRACE_FORMATS)}, got {trace_format!r}")
+    if get_flag_value(TRACE_FLAG) or PROFILE_FLAG in sys.argv:
+        enable_tracing()
+
+def finish_tracing() -> None:
+    """Write the trace file and print the profile requested on the command line."""
+    tracer = get_tracer()
+    if tracer is None:
+        return
+    trace_path = get_flag_value(TRACE_FLAG)
+    if trace_path:
+        if get_flag_value(TRACE_FORMAT_FLAG, TRACE_FORMATS[0]) == "chrome":
+            tracer.write_chrome(trace_path)
+        else:
+            tracer.write_jsonl(trace_path)
+    if PROFILE_FLAG in sys.argv:
+        print("Profile:")
+        print(tracer.summary())
+
+def run_in_daemon(user_prompt: str, verbose: bool) -> int:
+    """Forward the prompt to a running daemon; the daemon's own flags apply unless given here."""
+    from daemon import DEFAULT_SOCKET_PATH, ask
+    
+    try:
+        max_workers = parse_max_workers() if get_flag_value(WORKERS_FLAG) else None
+        context_budget = parse_context_budget() if get_flag_value(CONTEXT_BUDGET_FLAG) else None
+        max_iterations = parse_max_iterations() if get_flag_value(MAX_ITERATIONS_FLAG) else None
+        # The daemon may run elsewhere, so the directory is sent as an absolute path
+        working_dir = get_flag_value(WORKING_DIR_FLAG)
+        working_dir = os.path.abspath(working_dir) if working_dir else None
+        socket_path = get_flag_value(DAEMON_FLAG) or DEFAULT_SOCKET_PATH
+        return ask(user_prompt, socket_path, verbose, max_workers, context_budget, max_iterations=max_iterations,
+                   working_dir=working_dir)
+    except ValueError as e:
+        print(f"Configuration error: {e}")
+        return 1
+    except ConnectionError as e:
+        print(f"Daemon error: {e}. Start one with: python daemon.py")
+        return 1
+
 def clean_pycache():
-    """Clean up Python cache directories."""
-    for root, dirs, files in os.walk("."):
-        for d in dirs:
-            if d == "__pycache__":
-                shutil.rmtree(os.path.join(root, d), ignore_errors=True)
+    """Clean up the cache directories of this project's own packages."""
+    # Only the known package directories are visited; walking the whole tree
+    # could take longer than the prompt itself on a large checkout
+    project_root = os.path.dirname(os.path.abspath(__file__))
+    for package in PYCACHE_PACKAGES:
+        shutil.rmtree(os.path.join(project_root, package, "__pycache__"), ignore_errors=True)
 
 def main():
     """Main entry point."""
-    load_dotenv()
-    
     # Parse arguments
     args, verbose = parse_arguments()
     
@@ -183,18 +594,47 @@ def main():
         print(USAGE_MESSAGE)
         sys.exit(1)
     
+    if DAEMON_FLAG in sys.argv or get_flag_value(DAEMON_FLAG):
+        if get_flag_value(SESSION_FLAG):
+            print(f"Configuration error: {SESSION_FLAG} cannot be combined with {DAEMON_FLAG}")
+            sys.exit(1)
+        sys.exit(run_in_daemon(" ".join(args), verbose))
+    
+    from dotenv import load_dotenv
+    load_dotenv()
+    
     try:
-        # Validate environment
-        api_key = validate_environment()
+        # Validate environment and build the client for the selected transport
+        client = create_client_from_arguments()
+        max_workers = parse_max_workers()
+        context_budget = parse_context_budget()
+        max_iterations = parse_max_iterations()
+        prefix_cache_mode = parse_prefix_cache_mode()
+        store, session = load_session_from_arguments()
+        if session is not None and prefix_cache_mode == prompt_cache.LOCAL:
+            client = transport.LocalCacheClient(client)
+        start_tracing_from_arguments()
         
         # Create assistant and generate response
-        assistant = AIAssistant(api_key, verbose)
+        assistant = AIAssistant(None, verbose, max_workers, client=client, context_budget=context_budget,
+                                stream=STREAM_FLAG in sys.argv, session=session,
+                                prefix_cache=prefix_cache_mode != prompt_cache.OFF, max_iterations=max_iterations,
+                                working_dir=get_flag_value(WORKING_DIR_FLAG))
+        resumed_messages = len(session.messages) if session is not None else 0
         user_prompt = " ".join(args)
         response = assistant.generate_response(user_prompt)
+        if session is not None:
+            assistant.update_session()
+            saved_bytes = store.save(session)
+        
+        if verbose:
+            assistant.report_run()
         
         # CHANGE 2: Add "Final response:" header before printing the result
         print("Final response:")
         print(response)
+        if session is not None:
+            report_session(session, assistant, resumed_messages, saved_bytes, prefix_cache_mode)
         
     except ValueError as e:
         print(f"Configuration error: {e}")
@@ -202,8 +642,13 @@ def main():
     except Exception as e:
         print(f"Unexpected error: {e}")
         sys.exit(1)
+    finally:
+        finish_tracing()
 
 
 if __name__ == "__main__":
-    main()
-    clean_pycache()
\ No newline at end of file
+    try:
+        main()
+    finally:
+        if CLEAN_PYCACHE_FLAG in sys.argv:
+            clean_pycache()
\ No newline at end of file
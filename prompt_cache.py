@@ -0,0 +1,88 @@
+import hashlib
+import json
+import time
+
+from google.genai import types
+
+import transport
+
+# Where the cached prefix of a resumed session is kept
+PROVIDER = "provider"
+LOCAL = "local"
+OFF = "off"
+PREFIX_CACHE_MODES = (PROVIDER, LOCAL, OFF)
+
+# The provider rejects cached contents smaller than this
+PROVIDER_MIN_TOKENS = 4096
+CACHE_TTL_SECONDS = 3600
+# A cache this close to expiring is replaced rather than reused
+EXPIRY_MARGIN_SECONDS = 60
+
+
+def prefix_fingerprint(model: str, messages: list, config: types.GenerateContentConfig) -> str:
+    """Hash of everything a cached prefix holds; a different hash means the cache is stale."""
+    payload = json.dumps([model, transport._dump(messages), transport._dump(config.system_instruction),
+                          transport._dump(config.tools)], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def _estimate_tokens(messages: list) -> int:
+    return len(json.dumps(transport._dump(messages), default=str)) // transport.CHARS_PER_TOKEN
+
+
+def attach_prefix_cache(client, model: str, session, config: types.GenerateContentConfig, log=None) -> str | None:
+    """
+    Return the name of a cached content holding the system prompt, the tool
+    declarations and the session's earlier messages, so a resumed prompt
+    only sends what is new. The session's existing cache is reused while it
+    matches and has not expired; otherwise a new one is created and the old
+    one deleted. Returns None when nothing is worth caching or the client
+    cannot cache, in which case the full history is sent as before.
+    """
+    log = log or (lambda message: None)
+    messages = session.messages
+    if not messages:
+        return None
+    fingerprint = prefix_fingerprint(model, messages, config)
+    previous = session.prefix or {}
+
+    if previous.get("fingerprint") == fingerprint and previous.get("expire_time", 0) > time.time() + EXPIRY_MARGIN_SECONDS:
+        try:
+            client.caches.get(name=previous["name"])
+            return previous["name"]
+        except Exception:
+            pass
+
+    local = isinstance(client, transport.LocalCacheClient)
+    if not local and _estimate_tokens(messages) < PROVIDER_MIN_TOKENS:
+        log(f"Session history below {PROVIDER_MIN_TOKENS} tokens, sending it without a prefix cache")
+        return None
+    try:
+        cached = client.caches.create(model=model, config=types.CreateCachedContentConfig(
+            contents=messages,
+            system_instruction=config.system_instruction,
+            tools=config.tools,
+            ttl=f"{CACHE_TTL_SECONDS}s",
+            display_name=f"session-{session.id}",
+        ))
+    except Exception as e:
+        log(f"Could not create a prefix cache, sending the full history: {e}")
+        session.prefix = None
+        return None
+
+    if previous.get("name") and previous["name"] != cached.name:
+        try:
+            client.caches.delete(name=previous["name"])
+        except Exception:
+            pass
+    usage = cached.usage_metadata
+    session.prefix = {
+        "name": cached.name,
+        "fingerprint": fingerprint,
+        "messages": len(messages),
+        "tokens": usage.total_token_count if usage else None,
+        "expire_time": cached.expire_time.timestamp() if cached.expire_time else time.time() + CACHE_TTL_SECONDS,
+        "local": local,
+    }
+    log(f"Cached {len(messages)} earlier messages as {cached.name}")
+    return cached.name
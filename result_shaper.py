@@ -0,0 +1,157 @@
+import json
+import threading
+
+from context_compactor import CHARS_PER_TOKEN
+
+# Results larger than this are cut down to fit, with a note of what was left out
+DEFAULT_BYTE_BUDGET = 16000
+# Lists of at least this many records are sent as a table: column names once, then one row per record
+COLUMNAR_MIN_ROWS = 3
+# Fields sent per record unless the caller chooses, for tools whose records are mostly metadata
+DEFAULT_FIELDS = {
+    "get_files_info": ("relpath", "is_dir", "size"),
+}
+# A string cut to fit the budget keeps at least this many bytes
+MIN_STRING_BYTES = 200
+# Results with these keys were already cut to a page by the tool; cutting them again would make paging skip text
+PAGED_KEYS = ("next_offset", "next_line")
+# Key of the shaper's own note on what it left out, so the tool's fields are never overwritten
+NOTE_KEY = "shaping_note"
+
+
+def _size(value) -> int:
+    """UTF-8 bytes of the JSON sent to the model."""
+    return len(json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def _is_records(value) -> bool:
+    return isinstance(value, list) and bool(value) and all(isinstance(item, dict) for item in value)
+
+
+def _columns(records: list, fields) -> list:
+    """Keys present in the records, in first-seen order, narrowed to the chosen fields if any exist."""
+    columns = list(dict.fromkeys(key for record in records for key in record))
+    if fields:
+        chosen = [field for field in dict.fromkeys(fields) if field in columns]
+        if chosen:
+            return chosen
+    return columns
+
+
+def _cut_string(text: str, excess: int) -> str:
+    """Drop at least `excess` UTF-8 bytes from the middle, keeping both ends (errors are usually last)."""
+    data = text.encode("utf-8")
+    keep = max(MIN_STRING_BYTES, len(data) - excess - 40)
+    if keep >= len(data):
+        return text
+    head = keep // 2
+    # A character split by the cut is dropped whole
+    start = data[:head].decode("utf-8", errors="ignore")
+    end = data[len(data) - (keep - head):].decode("utf-8", errors="ignore")
+    cut = len(data) - len(start.encode("utf-8")) - len(end.encode("utf-8"))
+    return f"{start}\n... [{cut} bytes cut] ...\n{end}"
+
+
+class ResultShaper:
+    """
+    Turns tool results into what is sent to the model.
+
+    Lists of records (directory entries, search matches, test results) are
+    narrowed to the fields the caller asked for, or a per-tool default, and
+    long lists are sent as a table so each key appears once instead of once
+    per record. A result still over the byte budget has its largest list cut
+    to the records that fit, then its longest strings cut in the middle,
+    with a note saying what was left out. The size of every result before
+    and after shaping is counted, in estimated tokens, so the savings can be
+    measured.
+    """
+
+    def __init__(self, byte_budget: int = DEFAULT_BYTE_BUDGET, columnar: bool = True):
+        self.byte_budget = byte_budget
+        self.columnar = columnar
+        self.results = 0
+        self.raw_tokens = 0
+        self.shaped_tokens = 0
+        self.truncated = 0
+        self._lock = threading.Lock()
+
+    def shape(self, function_name: str, result: dict, fields: list | None = None) -> tuple[dict, int, int]:
+        """Return the shaped result with its estimated token cost before and after shaping."""
+        fields = fields or DEFAULT_FIELDS.get(function_name)
+        shaped = {}
+        tables = []
+        for key, value in result.items():
+            if _is_records(value):
+                columns = _columns(value, fields)
+                if self.columnar and len(value) >= COLUMNAR_MIN_ROWS:
+                    value = {"columns": columns, "rows": [[record.get(c) for c in columns] for record in value]}
+                else:
+                    value = [{c: record[c] for c in columns if c in record} for record in value]
+                tables.append(key)
+            shaped[key] = value
+
+        truncated = False
+        paged = any(result.get(key) is not None for key in PAGED_KEYS)
+        if self.byte_budget and not paged and _size(shaped) > self.byte_budget:
+            shaped = self._fit(shaped, tables)
+            truncated = True
+
+        raw_tokens = _size(result) // CHARS_PER_TOKEN
+        shaped_tokens = _size(shaped) // CHARS_PER_TOKEN
+        with self._lock:
+            self.results += 1
+            self.raw_tokens += raw_tokens
+            self.shaped_tokens += shaped_tokens
+            self.truncated += truncated
+        return shaped, raw_tokens, shaped_tokens
+
+    def _fit(self, shaped: dict, tables: list) -> dict:
+        """Cut a shaped result down to the byte budget."""
+        budget = self.byte_budget
+        original_size = _size(shaped)
+
+        # Keep as many records of the largest list as fit
+        if tables:
+            key = max(tables, key=lambda k: _size(shaped[k]))
+            value = shaped[key]
+            rows = value["rows"] if isinstance(value, dict) else value
+            total = len(rows)
+
+            def keep(count):
+                kept = {**value, "rows": rows[:count]} if isinstance(value, dict) else rows[:count]
+                return {**shaped, key: kept, NOTE_KEY: (
+                    f"Showing {count} of {total} {key}; narrow the request or choose fewer fields to see the rest")}
+
+            low, high = 0, total
+            while low < high:
+                middle = (low + high + 1) // 2
+                if _size(keep(middle)) <= budget:
+                    low = middle
+                else:
+                    high = middle - 1
+            shaped = keep(low)
+            if low > 0 or _size(shaped) <= budget:
+                return shaped
+
+        # Then cut the longest strings, largest first
+        shaped = {**shaped}
+        shaped.setdefault(NOTE_KEY, f"Result cut from {original_size} bytes to the {budget} byte limit")
+        strings = [k for k, v in shaped.items() if isinstance(v, str) and k != NOTE_KEY]
+        for key in sorted(strings, key=lambda k: -len(shaped[k])):
+            excess = _size(shaped) - budget
+            if excess <= 0:
+                break
+            shaped[key] = _cut_string(shaped[key], excess)
+        if _size(shaped) <= budget:
+            return shaped
+
+        # Nothing left to cut piecewise; keep only the small top-level fields
+        small = {k: v for k, v in shaped.items()
+                 if not isinstance(v, (dict, list, str)) or _size(v) <= MIN_STRING_BYTES}
+        small[NOTE_KEY] = f"Result of {original_size} bytes is over the {budget} byte limit and was left out"
+        return small
+
+    def stats(self) -> str:
+        saved = 1 - self.shaped_tokens / self.raw_tokens if self.raw_tokens else 0.0
+        return (f"Result shaping: {self.results} results, ~{self.raw_tokens} -> ~{self.shaped_tokens} tokens "
+                f"({saved:.0%} less), {self.truncated} truncated")
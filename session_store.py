@@ -0,0 +1,87 @@
+import gzip
+import json
+import os
+import re
+import time
+
+from google.genai import types
+
+from functions.write_file_content import atomic_write
+
+# Sessions are kept next to this file unless another directory is given
+DEFAULT_SESSIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".agent_sessions")
+SESSION_SUFFIX = ".json.gz"
+SESSION_FORMAT_VERSION = 1
+SESSION_ID_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]{0,63}\Z")
+
+
+class Session:
+    """
+    A conversation that outlives the process: its messages, the prefix cache
+    covering them and token counts summed over every prompt in it.
+    """
+
+    def __init__(self, session_id: str, messages: list | None = None, prefix: dict | None = None,
+                 stats: dict | None = None, created: float | None = None):
+        self.id = session_id
+        self.messages = messages or []
+        self.prefix = prefix
+        self.stats = stats or {"prompts": 0, "prompt_tokens": 0, "cached_tokens": 0}
+        self.created = created or time.time()
+
+    @property
+    def resumed(self) -> bool:
+        return bool(self.messages)
+
+
+class SessionStore:
+    """
+    Sessions saved as gzipped JSON, one file per session ID.
+
+    Messages are stored as the API's JSON without unset fields, which with
+    compression keeps a long tool-heavy session to a small fraction of its
+    in-memory size. Files are replaced atomically, so an interrupted run
+    leaves the previous state of the session intact.
+    """
+
+    def __init__(self, directory: str = DEFAULT_SESSIONS_DIR):
+        self.directory = directory
+
+    def path(self, session_id: str) -> str:
+        if not SESSION_ID_PATTERN.match(session_id):
+            raise ValueError(f"Session IDs are 1-64 letters, digits, '.', '_' or '-', got {session_id!r}")
+        return os.path.join(self.directory, session_id + SESSION_SUFFIX)
+
+    def load(self, session_id: str) -> Session:
+        """Return the saved session, or a new empty one if there is none."""
+        path = self.path(session_id)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return Session(session_id)
+        if data.get("version") != SESSION_FORMAT_VERSION:
+            raise ValueError(f"Session {session_id!r} was saved in an unsupported format")
+        return Session(
+            session_id,
+            messages=[types.Content.model_validate(message) for message in data["messages"]],
+            prefix=data.get("prefix"),
+            stats=data.get("stats"),
+            created=data.get("created"),
+        )
+
+    def save(self, session: Session) -> int:
+        """Write the session and return the size of the file in bytes."""
+        data = {
+            "version": SESSION_FORMAT_VERSION,
+            "id": session.id,
+            "created": session.created,
+            "updated": time.time(),
+            "prefix": session.prefix,
+            "stats": session.stats,
+            "messages": [message.model_dump(mode="json", exclude_none=True) for message in session.messages],
+        }
+        payload = gzip.compress(json.dumps(data, separators=(",", ":")).encode('utf-8'), compresslevel=6)
+        os.makedirs(self.directory, exist_ok=True)
+        atomic_write(self.path(session.id), payload)
+        return len(payload)
@@ -1,4 +1,24 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+from types import SimpleNamespace
+
+from google.genai import types
+
+from functions.edit_file import edit_file
+from functions.get_files_info import get_files_info
 from functions.run_python import run_python_file
+from functions.search_code import search_code
+from functions.tree_index import MAX_CACHED_LISTINGS, get_tree_index
+from call_function import call_function
+from daemon import AgentDaemon, ask
+from result_shaper import ResultShaper, _size
+from tool_cache import CallMemo
+from transport import RecordingClient, ReplayClient, ReplayExhausted
+from workspace import Workspace
 
 def run_tests():
     test_cases = [
@@ -19,5 +39,312 @@ def run_tests():
         result = run_python_file(working_directory, file_path, args)
         print(f"\nTest Case {i}:\n{result}")
 
+def test_result_shaper():
+    print("\nResult shaper:")
+    entries = [{"relpath": f"f{i}.py", "is_dir": False, "size": i, "mtime": 1.5} for i in range(1000)]
+    shaped, raw_tokens, tokens = ResultShaper().shape("get_files_info", {"ok": True, "entries": entries})
+    assert shaped["entries"]["columns"] == ["relpath", "is_dir", "size"], shaped["entries"]["columns"]
+    assert 0 < len(shaped["entries"]["rows"]) < 1000 and "shaping_note" in shaped
+    assert _size(shaped) <= 16000 and tokens < raw_tokens
+    print(f"1000 entries: ~{raw_tokens} -> ~{tokens} tokens, {shaped['shaping_note']}")
+
+    shaped, _, _ = ResultShaper().shape("search_code", {"matches": entries[:2]}, ["size"])
+    assert shaped["matches"] == [{"size": 0}, {"size": 1}], shaped["matches"]
+
+    # The budget is in UTF-8 bytes, and the tool's own fields are kept
+    text = "Привет мир " * 2000
+    shaped, _, _ = ResultShaper(byte_budget=2000).shape("run_python_file", {"output": text, "truncated": True})
+    assert _size(shaped) <= 2000 and shaped["truncated"] is True and "bytes cut" in shaped["output"]
+    print(f"{len(text.encode())} bytes of Cyrillic cut to {_size(shaped)}: {shaped['shaping_note']}")
+
+    # A page the tool already bounded is not cut again, so next_offset stays right
+    page = {"content": text, "range": {"offset": 0, "length": 10000}, "next_offset": 10000, "truncated": True}
+    shaped, _, _ = ResultShaper(byte_budget=2000).shape("get_file_content", page)
+    assert shaped == page
+    print("Paged result passed through unchanged")
+
+def test_index_sees_appends():
+    print("\nIndexes after a file is appended to:")
+    root = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(root, "notes.py"), 'w') as file:
+            file.write("hello\n")
+        assert get_files_info(root)["entries"][0]["size"] == 6
+        assert search_code(root, "appended_marker")["matches"] == []
+        # Appending changes neither the directory's mtime nor its entries
+        with open(os.path.join(root, "notes.py"), 'a') as file:
+            file.write("appended_marker = 1\n")
+        size = get_files_info(root)["entries"][0]["size"]
+        matches = search_code(root, "appended_marker")["matches"]
+        assert size == 26 and len(matches) == 1, (size, matches)
+        print(f"size {size}, found {matches[0]['text']!r}")
+    finally:
+        shutil.rmtree(root)
+
+def test_cassette_round_trip():
+    print("\nCassette record and replay:")
+
+    def reply(text):
+        return types.GenerateContentResponse(
+            candidates=[types.Candidate(content=types.Content(role="model", parts=[types.Part(text=text)]))])
+
+    def ask(prompt, *turns):
+        return [types.Content(role="user", parts=[types.Part(text=text)]) for text in (prompt,) + turns]
+
+    class Models:
+        def generate_content(self, *, model, contents, config=None):
+            return reply(f"{contents[0].parts[0].text} turn {len(contents)}")
+
+    root = tempfile.mkdtemp()
+    try:
+        path = os.path.join(root, "cassette.jsonl")
+        live = SimpleNamespace(models=Models(), caches=None, aio=SimpleNamespace(models=Models(), caches=None))
+        recorder = RecordingClient(live, path)
+        for contents in (ask("a"), ask("b"), ask("a", "more"), ask("b", "more")):
+            recorder.models.generate_content(model="m", contents=contents)
+
+        # Conversations replayed in another order still get their own responses
+        replay = ReplayClient(path)
+        texts = [replay.models.generate_content(model="m", contents=contents).text
+                 for contents in (ask("b"), ask("b", "more"), ask("a"), ask("a", "more"))]
+        assert texts == ["b turn 1", "b turn 2", "a turn 1", "a turn 2"], texts
+        try:
+            replay.models.generate_content(model="m", contents=ask("c"))
+            raise AssertionError("an unrecorded conversation was answered")
+        except ReplayExhausted as e:
+            print(f"{texts}; unrecorded conversation: {e}")
+    finally:
+        shutil.rmtree(root)
+
+def test_edit_file():
+    print("\nedit_file:")
+    root = tempfile.mkdtemp()
+
+    def write(name, data):
+        with open(os.path.join(root, name), 'wb') as file:
+            file.write(data)
+
+    def read(name):
+        with open(os.path.join(root, name), 'rb') as file:
+            return file.read()
+
+    try:
+        # Search/replace keeps CRLF line endings
+        write("crlf.py", b"a = 1\r\nb = 2\r\n")
+        result = edit_file(root, "crlf.py", edits=[{"search": "a = 1\nb = 2", "replace": "a = 10\nb = 20"}])
+        assert result.startswith("Successfully") and read("crlf.py") == b"a = 10\r\nb = 20\r\n", result
+        print(result)
+
+        # An ambiguous block is refused with the lines it occurs on, unless replace_all is set
+        write("twice.py", b"x = 0\ny = 1\nx = 0\n")
+        result = edit_file(root, "twice.py", edits=[{"search": "x = 0", "replace": "x = 5"}])
+        assert "occurs 2 times (lines 1, 3)" in result and read("twice.py") == b"x = 0\ny = 1\nx = 0\n", result
+        print(result)
+        result = edit_file(root, "twice.py", edits=[{"search": "x = 0", "replace": "x = 5", "replace_all": True}])
+        assert read("twice.py") == b"x = 5\ny = 1\nx = 5\n", result
+
+        # A block that only differs in indentation is pointed at; nothing is written when any block fails
+        write("indent.py", b"def f():\n    return 1\n")
+        result = edit_file(root, "indent.py", edits=[{"search": "def f():", "replace": "def g():"},
+                                                    {"search": "return 1\n  ", "replace": "return 2"}])
+        assert "Edit 2: search text not found" in result and read("indent.py") == b"def f():\n    return 1\n", result
+        result = edit_file(root, "indent.py", edits=[{"search": "def f():\n  return 1", "replace": "pass"}])
+        assert "except for whitespace" in result, result
+        print(result.splitlines()[0])
+
+        # A hunk whose header has drifted is applied where its lines are
+        write("drift.py", b"".join(b"line %d\n" % i for i in range(1, 11)))
+        diff = "--- a/drift.py\n+++ b/drift.py\n@@ -2,3 +2,3 @@\n line 6\n-line 7\n+line seven\n line 8\n"
+        result = edit_file(root, "drift.py", diff=diff)
+        assert "offset +4 lines" in result and b"line 6\nline seven\nline 8\n" in read("drift.py"), result
+        print(result)
+
+        # "\ No newline at end of file" is honoured on either side
+        write("eof.py", b"a\nb")
+        diff = "--- a/eof.py\n+++ b/eof.py\n@@ -1,2 +1,2 @@\n a\n-b\n\\ No newline at end of file\n+c\n"
+        result = edit_file(root, "eof.py", diff=diff)
+        assert read("eof.py") == b"a\nc\n", (result, read("eof.py"))
+        diff = "--- a/eof.py\n+++ b/eof.py\n@@ -1,2 +1,2 @@\n a\n-c\n+d\n\\ No newline at end of file\n"
+        result = edit_file(root, "eof.py", diff=diff)
+        assert read("eof.py") == b"a\nd", (result, read("eof.py"))
+
+        # Lines inserted after a last line without a newline start on a line of their own
+        write("append.py", b"a\r\nb")
+        result = edit_file(root, "append.py", diff="@@ -2,0 +3,2 @@\n+c\n+d\n")
+        assert read("append.py") == b"a\r\nb\r\nc\r\nd\r\n", (result, read("append.py"))
+
+        # A hunk that matches nowhere says which line differs
+        result = edit_file(root, "eof.py", diff="@@ -1,2 +1,2 @@\n a\n-z\n+y\n")
+        assert "line 2 is 'd' but the hunk expects 'z'" in result and read("eof.py") == b"a\nd", result
+        print(result.splitlines()[0])
+    finally:
+        shutil.rmtree(root)
+
+def test_files_info_pages():
+    print("\nget_files_info pages and .gitignore:")
+    root = tempfile.mkdtemp()
+    try:
+        for name in ("src/a.py", "src/b.py", "src/run.log", "src/keep.log", "build/out.bin", "README.md"):
+            os.makedirs(os.path.dirname(os.path.join(root, name)), exist_ok=True)
+            with open(os.path.join(root, name), 'w') as file:
+                file.write(name)
+        with open(os.path.join(root, ".gitignore"), 'w') as file:
+            file.write("build/\n*.log\n!keep.log\n")
+
+        # Following next_cursor visits every entry once, with ignored ones pruned
+        seen, cursor, pages = [], None, 0
+        while True:
+            result = get_files_info(root, recursive=True, limit=2, cursor=cursor)
+            seen += [entry["relpath"] for entry in result["entries"]]
+            pages += 1
+            cursor = result["next_cursor"]
+            if cursor is None:
+                break
+        expected = [".gitignore", "README.md", "src", "src/a.py", "src/b.py", "src/keep.log"]
+        assert sorted(seen) == expected and len(seen) == result["total_entries"] == 6, seen
+        print(f"{len(seen)} entries in {pages} pages: {seen}")
+
+        # An ignored tree is never scanned, so changes in it cost a listing nothing
+        index = get_tree_index(root)
+        assert "build" not in index._dirs, sorted(index._dirs)
+        with open(os.path.join(root, "build", "out.bin"), 'a') as file:
+            file.write("more")
+        scans = index.scans
+        get_files_info(root, recursive=True)
+        assert index.scans == scans and "build" not in index._dirs
+
+        everything = get_files_info(root, recursive=True, respect_gitignore=False)["entries"]
+        assert {"build", "build/out.bin", "src/run.log"} <= {entry["relpath"] for entry in everything}
+
+        # Memoized listings stay bounded however many distinct listings are asked for
+        for i in range(MAX_CACHED_LISTINGS + 10):
+            get_files_info(root, recursive=True, ignore=[f"*.tmp{i}"])
+        assert len(get_tree_index(root)._listings) == MAX_CACHED_LISTINGS
+
+        # Bad paging arguments are reported like any other bad argument
+        for bad, message in [({"limit": 0}, "limit must be at least 1, got 0"),
+                             ({"cursor": "-3"}, "cursor must be at least 0, got '-3'"),
+                             ({"cursor": "abc"}, "cursor must be a whole number, got 'abc'"),
+                             ({"max_depth": 0}, "max_depth must be at least 1, got 0")]:
+            result = get_files_info(root, recursive=True, **bad)
+            assert result == {"ok": False, "error": message, "cwd": os.path.realpath(root), "directory": "."}, result
+            print(result["error"])
+    finally:
+        shutil.rmtree(root)
+
+def _call(workspace, name, memo=None, **args):
+    content = call_function(types.FunctionCall(name=name, args=args), memo=memo, workspace=workspace)
+    return content.parts[0].function_response.response
+
+def test_tool_cache_invalidation():
+    print("\nTool cache after a write:")
+    root = tempfile.mkdtemp()
+    try:
+        path = os.path.join(root, "notes.txt")
+        with open(path, 'w') as file:
+            file.write("old text\n")
+        stamp = os.stat(path).st_mtime_ns
+        workspace = Workspace(root)
+        cache = workspace.tool_cache
+        _call(workspace, "get_file_content", file_path="notes.txt")
+        hits, version = cache.hits, cache.version
+        _call(workspace, "get_file_content", file_path="notes.txt")
+        assert cache.hits == hits + 1, cache.stats()
+
+        # Same size and, as on a coarse-clock filesystem, the same mtime: only the invalidation tells
+        _call(workspace, "write_file", file_path="notes.txt", content="new text\n")
+        os.utime(path, ns=(stamp, stamp))
+        assert cache.version == version + 1 and cache.invalidations >= 1, cache.stats()
+        fresh = _call(workspace, "get_file_content", file_path="notes.txt")
+        assert fresh["content"] == "new text\n", fresh
+        print(f"{cache.stats()}; version {cache.version}")
+    finally:
+        shutil.rmtree(root)
+
+def test_workspace_isolation():
+    print("\nWorkspaces:")
+    roots = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+    try:
+        first, second = Workspace(roots[0]), Workspace(roots[1])
+        _call(first, "write_file", file_path="shared.txt", content="from the first\n")
+        _call(second, "write_file", file_path="shared.txt", content="from the second\n")
+        assert _call(first, "get_file_content", file_path="shared.txt")["content"] == "from the first\n"
+        assert _call(second, "get_file_content", file_path="shared.txt")["content"] == "from the second\n"
+        assert sorted(os.listdir(roots[0])) == sorted(os.listdir(roots[1])) == ["shared.txt"]
+
+        # Caches of a directory's contents are shared per root, shaping stays per workspace
+        assert first.tool_cache is not second.tool_cache
+        again = Workspace(roots[0])
+        assert again.tool_cache is first.tool_cache and again.result_shaper is not first.result_shaper
+        _call(again, "write_file", file_path="shared.txt", content="rewritten\n")
+        assert _call(first, "get_file_content", file_path="shared.txt")["content"] == "rewritten\n"
+        assert _call(second, "get_file_content", file_path="shared.txt")["content"] == "from the second\n"
+        print(f"{first.tool_cache.stats()} / {second.tool_cache.stats()}")
+    finally:
+        for root in roots:
+            shutil.rmtree(root)
+
+def test_call_memo():
+    print("\nRepeated calls:")
+    root = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(root, "big.txt"), 'w') as file:
+            file.write("first\n" * 3000)
+        workspace, memo = Workspace(root), CallMemo()
+        first = _call(workspace, "get_file_content", memo, file_path="big.txt")
+        again = _call(workspace, "get_file_content", memo, file_path="big.txt")
+        # The repeat is flagged without hiding the tool's own note on how to read further
+        assert "repeat_note" not in first and "repeat_note" in again, again.keys()
+        assert again["note"] == first["note"] and memo.repeats == 1
+
+        # A write makes the same call new again, with the new content
+        _call(workspace, "write_file", memo, file_path="big.txt", content="second\n")
+        after = _call(workspace, "get_file_content", memo, file_path="big.txt")
+        assert "repeat_note" not in after and after["content"] == "second\n", after
+        print(f"{memo.stats()}; after the write: {after['content']!r}")
+    finally:
+        shutil.rmtree(root)
+
+def test_daemon_output():
+    print("\nDaemon output:")
+
+    class Models:
+        def generate_content(self, *, model, contents, config=None):
+            if len(contents) == 1:
+                call = types.FunctionCall(name="get_files_info", args={"directory": "."})
+                parts = [types.Part(function_call=call)]
+            else:
+                parts = [types.Part(text="done")]
+            return types.GenerateContentResponse(
+                candidates=[types.Candidate(content=types.Content(role="model", parts=parts))])
+
+    root = tempfile.mkdtemp()
+    client = SimpleNamespace(models=Models(), caches=None)
+    server = AgentDaemon(os.path.join(root, "agent.sock"), client, 1, 30000, 5)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        # A verbose run through the daemon shows the client what the CLI shows, and the daemon nothing
+        client_output, daemon_output = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(daemon_output):
+            code = ask("list", server.server_address, verbose=True, output=client_output, working_dir="calculator")
+        lines = client_output.getvalue().splitlines()
+        assert code == 0 and daemon_output.getvalue() == "", daemon_output.getvalue()
+        for expected in ("Called get_files_info", "Time to first output", "Tool cache", "Call memo", "Final response"):
+            assert any(line.startswith(expected) for line in lines), (expected, lines)
+        print(f"{len(lines)} lines sent to the client, none printed by the daemon")
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(root)
+
 if __name__ == "__main__":
     run_tests()
+    test_files_info_pages()
+    test_result_shaper()
+    test_index_sees_appends()
+    test_cassette_round_trip()
+    test_edit_file()
+    test_tool_cache_invalidation()
+    test_call_memo()
+    test_workspace_isolation()
+    test_daemon_output()
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 256
+
+# Tools that only change the file named by their file_path argument
+FILE_WRITING_TOOLS = ("write_file", "edit_file")
+
+# Tools whose result depends on more than their target's own mtime (a listing
+# shows each file's size and mtime, a search every file's text); they keep their own indexes
+SUBTREE_TOOLS = ("search_code", "get_files_info")
+
+# Result fields that differ between runs with the same outcome; progress checks ignore them
+VOLATILE_RESULT_KEYS = ("duration_s", "cached")
+
+
+class ToolCache:
+    """
+    LRU cache for results of read-only tools.
+
+    Entries are keyed on the tool name, its arguments and the resolved target
+    path together with that path's mtime and size, so an edit made outside the
+    agent simply misses. Directory listings and searches are left to the tree
+    and code indexes, since a file written in place changes neither its
+    directory's mtime nor size. Cached results are shared between callers and
+    must be treated as read-only.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Advanced by every mutating tool call, so results seen at one version hold for all of it
+        self.version = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, function_name: str, args: dict, working_directory: str):
+        """Build the cache key for a call, or None if it cannot be cached."""
+        if args.get("recursive") or function_name in SUBTREE_TOOLS:
+            # A directory's mtime says nothing about its files; the tree index keeps those cheap
+            return None
+        target = args.get("file_path") or args.get("directory") or "."
+        path = os.path.realpath(os.path.join(working_directory, str(target)))
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        canonical_args = json.dumps(args, sort_keys=True, default=str)
+        return (function_name, path, st.st_mtime_ns, st.st_size, canonical_args)
+
+    def get(self, key):
+        """Return the cached result for a key, or None on a miss."""
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, result) -> None:
+        """Store a result, evicting the least recently used entry when full."""
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_path(self, path: str) -> None:
+        """Drop entries for a path and for every directory that contains it."""
+        path = os.path.realpath(path)
+        affected = {path}
+        parent = os.path.dirname(path)
+        while parent not in affected:
+            affected.add(parent)
+            parent = os.path.dirname(parent)
+        with self._lock:
+            stale = [key for key in self._entries if key[1] in affected]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self) -> None:
+        """Drop every entry, e.g. after running code that may have changed the tree."""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def invalidate_for(self, function_name: str, args: dict, working_directory: str) -> None:
+        """Invalidate whatever a mutating tool call may have changed."""
+        with self._lock:
+            self.version += 1
+        if function_name in FILE_WRITING_TOOLS and args.get("file_path"):
+            self.invalidate_path(os.path.join(working_directory, str(args["file_path"])))
+        else:
+            # Running code (or an unknown tool) may touch anything under the working directory
+            self.clear()
+
+    def stats(self) -> str:
+        """One-line summary of the cache counters for verbose output."""
+        return (f"Tool cache: {self.hits} hits, {self.misses} misses, "
+                f"{self.invalidations} invalidated, {len(self._entries)} entries")
+
+
+def _without_volatile(value):
+    if isinstance(value, dict):
+        return {k: _without_volatile(v) for k, v in value.items() if k not in VOLATILE_RESULT_KEYS}
+    if isinstance(value, list):
+        return [_without_volatile(v) for v in value]
+    return value
+
+
+def _failed(result: dict) -> bool:
+    return bool(result.get("error")) or result.get("ok") is False
+
+
+class CallMemo:
+    """
+    Remembers the tool calls of one conversation to catch repeats.
+
+    A call is fingerprinted by its name, its canonicalized arguments and the
+    workspace version (see ToolCache.version). A read-only call whose
+    fingerprint was seen before is answered with the earlier result instead
+    of running again. Every call is also checked for progress: it made
+    progress if it succeeded and its result differs from the last result of
+    the same call, as with the first read of a file, a write, or a test run
+    after a fix. Files changed outside the agent's tools during the
+    conversation are not noticed.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.repeats = 0
+        self.progress = 0
+        self._results = {}
+        self._digests = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, call_key: tuple, version: int):
+        """Return the remembered result of a repeated read-only call, or None."""
+        with self._lock:
+            result = self._results.get((call_key, version))
+            if result is not None:
+                self.calls += 1
+                self.repeats += 1
+            return result
+
+    def record(self, call_key: tuple, version: int, result: dict, read_only: bool) -> bool:
+        """Remember a call that ran; return whether it made progress."""
+        digest = hashlib.sha256(json.dumps(_without_volatile(result), sort_keys=True,
+                                           default=str).encode()).hexdigest()
+        with self._lock:
+            self.calls += 1
+            if read_only:
+                self._results[(call_key, version)] = result
+            progressed = not _failed(result) and self._digests.get(call_key) != digest
+            self._digests[call_key] = digest
+            self.progress += progressed
+            return progressed
+
+    def stats(self) -> str:
+        return f"Call memo: {self.calls} calls, {self.repeats} repeats answered from memory, {self.progress} made progress"
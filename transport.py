@@ -0,0 +1,491 @@
+import asyncio
+import hashlib
+import json
+import re
+import sys
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from google import genai
+from google.genai import types
+
+# Transport modes selectable from the CLI
+LIVE = "live"
+RECORD = "record"
+REPLAY = "replay"
+
+DEFAULT_SERVER_PORT = 8765
+
+# Replayed text is streamed in pieces of this many characters
+STREAM_TEXT_CHUNK = 200
+
+# Names of cached contents held by LocalCacheClient rather than the provider
+LOCAL_CACHE_PREFIX = "cachedContents/local-"
+DEFAULT_CACHE_TTL_SECONDS = 3600
+
+# Rough size of a token, for the token count of locally cached contents
+CHARS_PER_TOKEN = 4
+
+USAGE_MESSAGE = """Gemini stand-in server
+
+Usage: python transport.py serve <cassette.jsonl> [--port=8765] [--latency=SECONDS]
+
+Serves each conversation's recorded responses in order to any client created with
+http_options base_url http://127.0.0.1:<port>, e.g. python main.py "..." --base-url=http://127.0.0.1:8765
+"""
+
+
+def _dump(value):
+    """Serialize SDK objects (or plain data) to JSON-compatible data."""
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json", exclude_none=True)
+    if isinstance(value, (list, tuple)):
+        return [_dump(item) for item in value]
+    return value
+
+
+def _is_plain_text(part: types.Part) -> bool:
+    return part.text is not None and part.model_dump(exclude_none=True).keys() == {"text"}
+
+
+def merge_chunks(chunks) -> types.GenerateContentResponse:
+    """Combine the chunks of a streamed response into the response generate_content would return."""
+    parts = []
+    role = "model"
+    finish_reason = None
+    usage_metadata = None
+    has_candidate = False
+    for chunk in chunks:
+        if chunk.usage_metadata is not None:
+            usage_metadata = chunk.usage_metadata
+        if not chunk.candidates:
+            continue
+        has_candidate = True
+        candidate = chunk.candidates[0]
+        finish_reason = candidate.finish_reason or finish_reason
+        if candidate.content is None:
+            continue
+        role = candidate.content.role or role
+        for part in candidate.content.parts or ():
+            # Text arrives in pieces; other parts such as function calls arrive whole
+            if parts and _is_plain_text(part) and _is_plain_text(parts[-1]):
+                parts[-1] = types.Part(text=parts[-1].text + part.text)
+            else:
+                parts.append(part)
+    candidates = [types.Candidate(content=types.Content(role=role, parts=parts), finish_reason=finish_reason)]
+    return types.GenerateContentResponse(candidates=candidates if has_candidate else None,
+                                         usage_metadata=usage_metadata)
+
+
+def split_response(response: dict) -> list[dict]:
+    """
+    Split a recorded response (JSON data) into stream chunks: text in pieces
+    of STREAM_TEXT_CHUNK characters, every other part on its own, and the
+    finish reason and usage on the last chunk.
+    """
+    candidates = response.get("candidates") or []
+    if not candidates:
+        return [response]
+    candidate = candidates[0]
+    content = candidate.get("content") or {}
+    role = content.get("role", "model")
+    pieces = []
+    for part in content.get("parts") or []:
+        if set(part) == {"text"}:
+            text = part["text"]
+            pieces.extend({"text": text[i:i + STREAM_TEXT_CHUNK]}
+                          for i in range(0, len(text), STREAM_TEXT_CHUNK))
+        else:
+            pieces.append(part)
+    chunks = [{"candidates": [{"content": {"role": role, "parts": [piece]}}]} for piece in pieces] or [
+        {"candidates": [{"content": {"role": role, "parts": []}}]}]
+    last = chunks[-1]
+    last["candidates"][0].update({key: value for key, value in candidate.items() if key != "content"})
+    last.update({key: value for key, value in response.items() if key != "candidates"})
+    return chunks
+
+
+def request_fingerprint(model: str, contents) -> str:
+    """Stable hash of a generate_content request, used to verify replays."""
+    payload = json.dumps({"model": model, "contents": _dump(contents)}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def conversation_key(contents) -> str | None:
+    """Hash of a request's first message, which every request of one conversation shares."""
+    items = contents if isinstance(contents, list) else [contents]
+    if not items:
+        return None
+    payload = json.dumps(_dump(items[0]), sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+class Cassette:
+    """A JSONL file of recorded generate_content exchanges."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, model: str, contents, response, chunks=None) -> None:
+        record = {
+            "model": model,
+            "fingerprint": request_fingerprint(model, contents),
+            "request": {"contents": _dump(contents)},
+            "response": _dump(response),
+        }
+        if chunks is not None:
+            record["chunks"] = _dump(chunks)
+        with self._lock, open(self.path, 'a') as file:
+            file.write(json.dumps(record) + "\n")
+
+    def load(self) -> list[dict]:
+        with open(self.path, 'r') as file:
+            return [json.loads(line) for line in file if line.strip()]
+
+
+class _RecordingModels:
+    def __init__(self, models, cassette: Cassette):
+        self._models = models
+        self._cassette = cassette
+
+    def generate_content(self, *, model, contents, config=None):
+        response = self._models.generate_content(model=model, contents=contents, config=config)
+        self._cassette.append(model, contents, response)
+        return response
+
+    def generate_content_stream(self, *, model, contents, config=None):
+        # Snapshot the request now; the caller may extend `contents` while consuming the stream
+        contents = list(contents) if isinstance(contents, list) else contents
+        chunks = []
+        for chunk in self._models.generate_content_stream(model=model, contents=contents, config=config):
+            chunks.append(chunk)
+            yield chunk
+        self._cassette.append(model, contents, merge_chunks(chunks), chunks)
+
+
+class _AsyncRecordingModels(_RecordingModels):
+    async def generate_content(self, *, model, contents, config=None):
+        response = await self._models.generate_content(model=model, contents=contents, config=config)
+        self._cassette.append(model, contents, response)
+        return response
+
+
+class RecordingClient:
+    """Wraps a real client and appends every generate_content exchange to a cassette."""
+
+    def __init__(self, client, cassette_path: str):
+        self.client = client
+        self.cassette = Cassette(cassette_path)
+        self.caches = client.caches
+        self.models = _RecordingModels(client.models, self.cassette)
+        self.aio = SimpleNamespace(models=_AsyncRecordingModels(client.aio.models, self.cassette),
+                                   caches=client.aio.caches)
+
+
+class ReplayExhausted(Exception):
+    """The model asked for more responses than the cassette holds."""
+
+
+class _Replay:
+    """
+    Shared state of a replay: the recorded exchanges, queued per conversation.
+
+    Each request is answered from the queue of the recorded conversation
+    that starts with the same message, so conversations run concurrently
+    (batch.py --concurrency) get their own responses whatever order their
+    requests arrive in. Records without a request (ReplayClient responses)
+    form one queue, used by requests of any conversation that was not recorded.
+    """
+
+    def __init__(self, records: list[dict], latency: float, strict: bool):
+        self.records = records
+        self.latency = latency
+        self.strict = strict
+        self.position = 0
+        self._queues = {}
+        for record in records:
+            request = record.get("request")
+            key = conversation_key(request["contents"]) if request else None
+            self._queues.setdefault(key, deque()).append(record)
+        self._lock = threading.Lock()
+
+    def next_record(self, model: str, contents) -> dict:
+        key = conversation_key(contents)
+        with self._lock:
+            if key not in self._queues and None not in self._queues:
+                raise ReplayExhausted(f"Request {self.position + 1} starts a conversation the cassette "
+                                      f"does not hold")
+            queue = self._queues[key if key in self._queues else None]
+            if not queue:
+                raise ReplayExhausted(f"Cassette exhausted for this conversation after {self.position} responses")
+            record = queue.popleft()
+            self.position += 1
+            position = self.position
+        if self.strict and record.get("fingerprint") != request_fingerprint(model, contents):
+            raise ReplayExhausted(f"Request {position} does not match the recorded request")
+        return record
+
+    def next_response(self, model: str, contents) -> types.GenerateContentResponse:
+        return types.GenerateContentResponse.model_validate(self.next_record(model, contents)["response"])
+
+    def next_chunks(self, model: str, contents) -> list[types.GenerateContentResponse]:
+        record = self.next_record(model, contents)
+        chunks = record.get("chunks") or split_response(record["response"])
+        return [types.GenerateContentResponse.model_validate(chunk) for chunk in chunks]
+
+
+class _ReplayModels:
+    def __init__(self, replay: _Replay):
+        self._replay = replay
+
+    def generate_content(self, *, model, contents, config=None):
+        if self._replay.latency:
+            time.sleep(self._replay.latency)
+        return self._replay.next_response(model, contents)
+
+    def generate_content_stream(self, *, model, contents, config=None):
+        # The latency models the time to the first chunk; the rest arrive back to back
+        if self._replay.latency:
+            time.sleep(self._replay.latency)
+        yield from self._replay.next_chunks(model, contents)
+
+
+class _AsyncReplayModels(_ReplayModels):
+    async def generate_content(self, *, model, contents, config=None):
+        if self._replay.latency:
+            await asyncio.sleep(self._replay.latency)
+        return self._replay.next_response(model, contents)
+
+
+class ReplayClient:
+    """
+    Serves responses from a cassette without network access, each
+    conversation's in the order it recorded them (see _Replay).
+
+    `latency` seconds are added to every call to model a real round-trip.
+    With `strict`, each request must match the recorded one exactly;
+    otherwise requests are not compared, since tool output such as absolute
+    paths and timestamps differs between machines.
+    """
+
+    def __init__(self, cassette_path: str = None, latency: float = 0.0, strict: bool = False,
+                 responses: list = None):
+        records = Cassette(cassette_path).load() if cassette_path else []
+        records += [{"response": _dump(response)} for response in responses or []]
+        self._replay = _Replay(records, latency, strict)
+        self.models = _ReplayModels(self._replay)
+        self.aio = SimpleNamespace(models=_AsyncReplayModels(self._replay))
+
+    @property
+    def remaining(self) -> int:
+        return len(self._replay.records) - self._replay.position
+
+
+class _LocalCaches:
+    """In-memory stand-in for client.caches, holding the prefix each cached content stands for."""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def create(self, *, model, config=None):
+        config = config if isinstance(config, types.CreateCachedContentConfig) else \
+            types.CreateCachedContentConfig.model_validate(config or {})
+        contents = list(config.contents or [])
+        payload = json.dumps([_dump(contents), _dump(config.system_instruction), _dump(config.tools)],
+                             sort_keys=True, default=str)
+        ttl = float(str(config.ttl).rstrip("s")) if config.ttl else DEFAULT_CACHE_TTL_SECONDS
+        now = time.time()
+        cached = types.CachedContent(
+            name=LOCAL_CACHE_PREFIX + hashlib.sha256(payload.encode()).hexdigest()[:16],
+            display_name=config.display_name,
+            model=model,
+            create_time=now,
+            expire_time=now + ttl,
+            usage_metadata=types.CachedContentUsageMetadata(total_token_count=len(payload) // CHARS_PER_TOKEN),
+        )
+        with self._lock:
+            self._entries[cached.name] = (cached, contents, config)
+        return cached
+
+    def get(self, *, name, config=None):
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry is None or entry[0].expire_time.timestamp() < time.time():
+            raise KeyError(f"Cached content {name} not found")
+        return entry[0]
+
+    def delete(self, *, name, config=None):
+        with self._lock:
+            self._entries.pop(name, None)
+
+    def expand(self, contents, config):
+        """Turn a request that refers to a cached content into the full request it stands for."""
+        name = getattr(config, "cached_content", None)
+        if not name or not name.startswith(LOCAL_CACHE_PREFIX):
+            return contents, config, 0
+        self.get(name=name)
+        with self._lock:
+            cached, prefix, cached_config = self._entries[name]
+        contents = prefix + (list(contents) if isinstance(contents, list) else [contents])
+        config = config.model_copy(update={
+            "cached_content": None,
+            "system_instruction": cached_config.system_instruction,
+            "tools": cached_config.tools,
+            "tool_config": cached_config.tool_config,
+        })
+        return contents, config, cached.usage_metadata.total_token_count
+
+
+def _with_cached_tokens(response, cached_tokens: int):
+    """Report the cached part of the prompt in the usage, as the provider does."""
+    usage = response.usage_metadata
+    if cached_tokens and usage is not None:
+        # The estimate is rough; the cached part can never exceed the whole prompt
+        usage.cached_content_token_count = min(cached_tokens, usage.prompt_token_count or cached_tokens)
+    return response
+
+
+class _LocalCachingModels:
+    def __init__(self, models, caches: _LocalCaches):
+        self._models = models
+        self._caches = caches
+
+    def generate_content(self, *, model, contents, config=None):
+        contents, config, cached_tokens = self._caches.expand(contents, config)
+        return _with_cached_tokens(self._models.generate_content(model=model, contents=contents, config=config),
+                                   cached_tokens)
+
+    def generate_content_stream(self, *, model, contents, config=None):
+        contents, config, cached_tokens = self._caches.expand(contents, config)
+        for chunk in self._models.generate_content_stream(model=model, contents=contents, config=config):
+            yield _with_cached_tokens(chunk, cached_tokens)
+
+
+class _AsyncLocalCachingModels(_LocalCachingModels):
+    async def generate_content(self, *, model, contents, config=None):
+        contents, config, cached_tokens = self._caches.expand(contents, config)
+        response = await self._models.generate_content(model=model, contents=contents, config=config)
+        return _with_cached_tokens(response, cached_tokens)
+
+
+class LocalCacheClient:
+    """
+    Wraps a client with a local stand-in for the provider's context caching.
+
+    Cached contents live in memory and requests naming one are expanded to
+    the full request before they reach the wrapped client, so the model sees
+    exactly what it would without caching. Usage reports the cached part as
+    cached_content_token_count, like the provider, which makes the savings
+    of prefix caching measurable against replays and the stand-in server.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.caches = _LocalCaches()
+        self.models = _LocalCachingModels(client.models, self.caches)
+        self.aio = SimpleNamespace(models=_AsyncLocalCachingModels(client.aio.models, self.caches),
+                                   caches=self.caches)
+
+
+def create_client(api_key: str | None, mode: str = LIVE, cassette: str | None = None,
+                  latency: float = 0.0, base_url: str | None = None):
+    """Build the client used by AIAssistant for the selected transport."""
+    if mode == REPLAY:
+        return ReplayClient(cassette, latency)
+
+    http_options = types.HttpOptions(base_url=base_url) if base_url else None
+    client = genai.Client(api_key=api_key, http_options=http_options)
+    if mode == RECORD:
+        return RecordingClient(client, cassette)
+    return client
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """Answers Gemini REST generateContent calls from a cassette."""
+
+    path_pattern = re.compile(r"^/[^/]+/models/([^:/]+):(generateContent|streamGenerateContent)")
+
+    def do_POST(self):
+        match = self.path_pattern.match(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) or b"{}"
+        if not match:
+            self._send_json(404, {"error": {"code": 404, "message": f"Unknown path {self.path}"}})
+            return
+
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        try:
+            contents = [types.Content.model_validate(content) for content in json.loads(body).get("contents", [])]
+            record = server.replay.next_record(match.group(1), contents)
+        except (ReplayExhausted, ValueError) as e:
+            self._send_json(500, {"error": {"code": 500, "message": str(e), "status": "INTERNAL"}})
+            return
+
+        if match.group(2) == "streamGenerateContent":
+            chunks = record.get("chunks") or split_response(record["response"])
+            data = b"".join(
+                f"data: {json.dumps(self._api_body(chunk))}\r\n\r\n".encode() for chunk in chunks
+            )
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self._send_json(200, self._api_body(record["response"]))
+
+    @staticmethod
+    def _api_body(response: dict) -> dict:
+        """Convert recorded response data to the REST API's camelCase JSON."""
+        response = types.GenerateContentResponse.model_validate(response)
+        return response.model_dump(mode="json", exclude_none=True, by_alias=True)
+
+    def _send_json(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stand_in_server(cassette_path: str, port: int = DEFAULT_SERVER_PORT, latency: float = 0.0):
+    """Start a local Gemini stand-in on a background thread and return the server."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), _StandInHandler)
+    server.replay = _Replay(Cassette(cassette_path).load(), latency, False)
+    server.latency = latency
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    """Run the stand-in server in the foreground."""
+    from main import get_flag_value
+
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if len(args) != 2 or args[0] != "serve":
+        print(USAGE_MESSAGE)
+        sys.exit(1)
+
+    port = int(get_flag_value("--port", str(DEFAULT_SERVER_PORT)))
+    latency = float(get_flag_value("--latency", "0"))
+    server = start_stand_in_server(args[1], port, latency)
+    print(f"Serving {len(server.replay.records)} recorded responses on http://127.0.0.1:{port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import os
+import threading
+
+from functions.run_python import run_limits
+from functions.tree_index import get_tree_index
+from result_shaper import DEFAULT_BYTE_BUDGET, ResultShaper
+from tool_cache import FILE_WRITING_TOOLS, ToolCache
+
+DEFAULT_WORKING_DIR = "./calculator"
+
+_tool_caches = {}
+_tool_caches_lock = threading.Lock()
+
+
+def get_tool_cache(root: str) -> ToolCache:
+    """Return the tool cache shared by every workspace on a directory, creating it on first use."""
+    with _tool_caches_lock:
+        cache = _tool_caches.get(root)
+        if cache is None:
+            cache = _tool_caches[root] = ToolCache()
+        return cache
+
+
+class Workspace:
+    """
+    What one session's tool calls run against: a working directory, the
+    caches for it and the limits the tools run under.
+
+    Workspaces hold no process-wide state, so one process can serve many
+    sessions on different checkouts at once. Caches describing a
+    directory's contents (the tool cache here, the tree and code indexes
+    kept by the tools) are shared by all workspaces on the same directory,
+    so a write made through one session is seen by the others. Result
+    shaping and its statistics are per workspace.
+    """
+
+    def __init__(self, working_directory: str = DEFAULT_WORKING_DIR, byte_budget: int = DEFAULT_BYTE_BUDGET,
+                 limits: dict | None = None):
+        if not os.path.isdir(working_directory):
+            raise ValueError(f"Working directory {working_directory!r} is not a directory")
+        # As given, for the prompt; tools get the resolved path
+        self.working_directory = working_directory
+        self.root = os.path.realpath(working_directory)
+        self.tool_cache = get_tool_cache(self.root)
+        self.result_shaper = ResultShaper(byte_budget)
+        self.limits = {**run_limits(), **(limits or {})}
+
+    def invalidate_after(self, function_name: str, args: dict) -> None:
+        """Drop cached tool results and index entries a mutating call may have changed."""
+        self.tool_cache.invalidate_for(function_name, args, self.root)
+        index = get_tree_index(self.root)
+        if function_name in FILE_WRITING_TOOLS and args.get("file_path"):
+            index.invalidate(str(args["file_path"]))
+        else:
+            index.invalidate()
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_workspace() -> Workspace:
+    """The workspace of sessions that do not choose a working directory."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Workspace()
+        return _default